@@ -0,0 +1,240 @@
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from api_utils import (
+    ARROW_STREAM_MIME, get_country_data_by_iso3, get_country_info_api, get_country_info_ttl, get_db_countries,
+    get_db_countries_arrow, get_db_countries_json,
+)
+from cache_utils import LRUCache, MISSING
+from database_manager import db_manager, DatabaseManager
+
+try:
+    import brotli  # Tùy chọn: nén br khi thư viện có sẵn
+except ImportError:
+    brotli = None
+
+# Chỉ nén phản hồi lớn hơn ngưỡng này (byte)
+MIN_COMPRESS_SIZE = 512
+# Phản hồi dựng từ lỗi / dữ liệu cũ của REST Countries chỉ được cache trong thời gian ngắn (giây)
+RETRY_RESPONSE_TTL = 30.0
+
+class PreparedResponse:
+    """Phản hồi đã dựng sẵn: body gốc, các bản nén và ETag (tính một lần cho mỗi phiên bản dữ liệu)"""
+
+    def __init__(self, body: bytes, status: int = 200, content_type: str = "application/json; charset=utf-8",
+                 cache_ttl: Optional[float] = None):
+        self.status = status
+        self.content_type = content_type
+        self.cache_ttl = cache_ttl  # Thời gian sống trong cache của CountryInfoApi (None = tới khi dữ liệu đổi)
+        self.bodies = {'identity': body}
+        # ETag yếu: cùng một nội dung dù được nén theo cách nào
+        self.etag = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.bodies['gzip'] = gzip.compress(body, compresslevel=6)
+            if brotli is not None:
+                self.bodies['br'] = brotli.compress(body, quality=5)
+
+    def choose_encoding(self, accept_encoding: str) -> str:
+        """Chọn cách nén theo Accept-Encoding của client (ưu tiên br, rồi gzip)"""
+        accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',') if part.strip()}
+        for encoding in ('br', 'gzip'):
+            if encoding in self.bodies and encoding in accepted:
+                return encoding
+        return 'identity'
+
+def json_response(data: Any, status: int = 200, cache_ttl: Optional[float] = None) -> PreparedResponse:
+    return PreparedResponse(json.dumps(data, ensure_ascii=False).encode("utf-8"), status, cache_ttl=cache_ttl)
+
+class CountryInfoApi:
+    """Các endpoint /country_info dựng từ DatabaseManager, phản hồi được cache theo phiên bản dữ liệu"""
+
+    def __init__(self, db: Optional[DatabaseManager] = None, cache_size: int = 1024):
+        self.db = db or db_manager
+        self.responses = LRUCache(cache_size)  # (data_version, route, tham số) -> PreparedResponse
+        self.started_at = time.time()
+        self.routes: Dict[str, Callable[..., PreparedResponse]] = {
+            'country_info_map': self.country_info_map,
+            'country_detail': self.country_detail,
+            'country_indicators': self.country_indicators,
+        }
+
+    # ===== ĐỊNH TUYẾN =====
+    @staticmethod
+    def match(url: str, accept: str = "") -> Optional[Tuple[str, Tuple[Any, ...]]]:
+        """Ánh xạ URL (và header Accept) sang (route, tham số)"""
+        split = urlsplit(url)
+        parts = [part for part in split.path.split('/') if part]
+        if parts == ['country_info', 'map']:
+            # ?indicators=NY.GDP.MKTP.CD,SP.POP.TOTL: chỉ trả về các chỉ số này
+            requested = ','.join(parse_qs(split.query).get('indicators', []))
+            indicators = tuple(dict.fromkeys(code.strip() for code in requested.split(',') if code.strip())) or None
+            output = 'arrow' if ARROW_STREAM_MIME in accept else 'json'
+            return 'country_info_map', (output, indicators)
+        if len(parts) == 3 and parts[:2] == ['country_info', 'map']:
+            return 'country_indicators', (parts[2].upper(),)
+        if len(parts) == 2 and parts[0] == 'countries_info':
+            return 'country_detail', (parts[1].upper(),)
+        if parts == ['health']:
+            return 'health', ()
+        return None
+
+    def get_response(self, route: str, args: Tuple[Any, ...]) -> PreparedResponse:
+        """Lấy phản hồi dựng sẵn cho phiên bản dữ liệu hiện tại, dựng mới nếu chưa có hoặc đã hết cache_ttl"""
+        if route == 'health':
+            return self.health()
+        key = (self.db.get_data_version(), route, args)
+        response = self.responses.get(key)
+        if response is MISSING:
+            response = self.routes[route](*args)
+            self.responses.set(key, response, response.cache_ttl)
+        return response
+
+    def warm_up(self):
+        """Dựng sẵn payload bản đồ (gọi khi khởi động để request đầu tiên không phải chờ)"""
+        self.get_response('country_info_map', ('json', None))
+        self.get_response('country_info_map', ('arrow', None))
+
+    # ===== ENDPOINT =====
+    def country_info_map(self, output: str, indicators: Optional[Tuple[str, ...]]) -> PreparedResponse:
+        """Bản đồ quốc gia: JSON (mặc định) hoặc Arrow IPC dạng cột khi client gửi Accept tương ứng"""
+        if output == 'arrow':
+            return PreparedResponse(get_db_countries_arrow(indicators, db=self.db), content_type=ARROW_STREAM_MIME)
+        if indicators is None:
+            return PreparedResponse(get_db_countries_json(db=self.db).encode("utf-8"))
+        return json_response([
+            {**country, "indicator": {code: country["indicator"][code] for code in indicators
+                                      if code in country["indicator"]}}
+            for country in get_db_countries(db=self.db)
+        ])
+
+    def country_detail(self, iso_code: str) -> PreparedResponse:
+        """Thông tin quốc gia: REST Countries (có cache) bổ sung bằng dữ liệu trong bảng countries
+
+        Phản hồi sống trong cache không lâu hơn mục api_cache tương ứng; phản hồi dựng từ lỗi hoặc
+        từ mục đã cũ (đang làm mới trong nền) chỉ sống RETRY_RESPONSE_TTL giây
+        """
+        country = self.db.get_country_by_code(iso_code)
+        info = get_country_info_api(iso_code)
+        if "error" in info:
+            if not country:
+                return json_response({"error": info["error"]}, 404, cache_ttl=RETRY_RESPONSE_TTL)
+            info = {
+                "code": iso_code, "common": country["name"], "official": country["name"],
+                "currencies": {}, "capital": "N/A", "region": "N/A", "subregion": "N/A",
+                "languages": {}, "borders": [], "area": 0.0, "income_level": "N/A",
+                "latitude": 0.0, "longitude": 0.0, "population": 0, "timezones": ["N/A"],
+            }
+            cache_ttl = RETRY_RESPONSE_TTL
+        else:
+            remaining = get_country_info_ttl(iso_code)
+            cache_ttl = remaining if remaining is not None and remaining > 0 else RETRY_RESPONSE_TTL
+        if country:
+            # REST Countries không có mức thu nhập, lấy từ bảng countries
+            info["income_level"] = country.get("income_level") or info["income_level"]
+            if country.get("region"):
+                info["region"] = info["region"] if info["region"] != "N/A" else country["region"]
+        return json_response(info, cache_ttl=cache_ttl)
+
+    def country_indicators(self, iso_code: str) -> PreparedResponse:
+        data = get_country_data_by_iso3(iso_code, db=self.db)
+        return json_response(data, 200 if data["data"] else 404)
+
+    def health(self) -> PreparedResponse:
+        ok = self.db.test_connection()
+        return json_response({
+            "status": "ok" if ok else "error",
+            "data_version": self.db.get_data_version(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "cached_responses": len(self.responses),
+        }, 200 if ok else 503)
+
+def make_handler(api: CountryInfoApi):
+    class CountryInfoHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Giữ kết nối (keep-alive) giữa các request
+        server_version = "CountryInfoApi/1.0"
+        # Header và body được gửi chung một lần ghi, tránh trễ do Nagle / delayed ACK
+        wbufsize = 64 * 1024
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass  # Không in log cho từng request
+
+        def _send(self, response: PreparedResponse, include_body: bool = True):
+            if response.etag in {tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")}:
+                self.send_response(304)
+                self.send_header("ETag", response.etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            encoding = response.choose_encoding(self.headers.get("Accept-Encoding", ""))
+            body = response.bodies[encoding]
+            self.send_response(response.status)
+            self.send_header("Content-Type", response.content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", response.etag)
+            self.send_header("Vary", "Accept, Accept-Encoding")
+            self.send_header("Cache-Control", "no-cache")  # Luôn kiểm tra lại bằng ETag
+            if encoding != 'identity':
+                self.send_header("Content-Encoding", encoding)
+            self.end_headers()
+            if include_body:
+                self.wfile.write(body)
+
+        def _handle(self, include_body: bool):
+            matched = api.match(self.path, self.headers.get("Accept", ""))
+            if matched is None:
+                self._send(json_response({"error": "Khong tim thay endpoint"}, 404), include_body)
+                return
+            try:
+                response = api.get_response(*matched)
+            except Exception as e:
+                print(f"Loi xu ly {self.path}: {e}")
+                response = json_response({"error": "Loi server"}, 500)
+            self._send(response, include_body)
+
+        def do_GET(self):
+            self._handle(include_body=True)
+
+        def do_HEAD(self):
+            self._handle(include_body=False)
+
+    return CountryInfoHandler
+
+def create_server(host: str = "127.0.0.1", port: int = 5000, db: Optional[DatabaseManager] = None,
+                  warm_up: bool = True) -> ThreadingHTTPServer:
+    """Tạo server đa luồng (mỗi kết nối một thread); port=0 để hệ điều hành chọn cổng trống"""
+    api = CountryInfoApi(db)
+    if warm_up:
+        api.warm_up()
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    server.api = api
+    return server
+
+def start_background_server(host: str = "127.0.0.1", port: int = 0,
+                            db: Optional[DatabaseManager] = None) -> ThreadingHTTPServer:
+    """Chạy server trong thread nền (dùng khi kiểm thử); dừng bằng server.shutdown()"""
+    server = create_server(host, port, db)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    # python api_server.py --port 5000
+    parser = argparse.ArgumentParser(description="API /country_info cho cac trang Streamlit")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    args = parser.parse_args()
+    server = create_server(args.host, args.port)
+    print(f"API dang chay tai http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -1,7 +1,20 @@
 import requests
-import sqlite3
 import pandas as pd
+import pyarrow as pa
 import json
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from database_manager import db_manager, LazyDatabaseManager
+from cache_utils import MISSING
+from http_client import HttpClient
+from response_cache import LazyPersistentCache, PersistentCache
+
+# Client HTTP dùng chung cho REST Countries và API nội bộ (giữ kết nối giữa các lần rerun)
+http_client = HttpClient(headers={"User-Agent": "Mozilla/5.0"})
+LOCAL_API_BASE_URL = "http://127.0.0.1:5000"
+REST_COUNTRIES_BASE_URL = "https://restcountries.com/v3.1"
 
 # Danh sách mã ISO3 hợp lệ (một phần, dựa trên tiêu chuẩn ISO 3166-1 alpha-3)
 valid_iso3_codes ={'DZA', 'BEL', 'GNB', 'HUN', 'NLD', 'BWA', 'BLZ', 'HKG','FIN', 'MLT', 'ARM', 'MNE', 'MNG', 'AUS',
@@ -40,36 +53,94 @@ indicator_mapping = {
     "inflation_rate": "Tỷ lệ lạm phát (%)"
 }
 
+# Mã chỉ số World Bank của các cột trên bản đồ (chỉ lấy các cột này từ /country_info/map)
+map_indicator_codes = {
+    "gdp_billion": "NY.GDP.MKTP.CD",
+    "population": "SP.POP.TOTL",
+    "gdp_per_capita": "NY.GDP.PCAP.CD",
+    "unemployment_rate": "SL.UEM.TOTL.ZS",
+    "inflation_rate": "FP.CPI.TOTL.ZG"
+}
+
+# Cache REST Countries trên đĩa (api_cache.db), có thể nạp sẵn từ snapshot restcountries_seed.json
+COUNTRY_CACHE_TTL = 7 * 24 * 3600  # Thông tin quốc gia hầu như không đổi
+# File cache chỉ được mở (và tạo) ở lần dùng đầu tiên
+api_cache = LazyPersistentCache(
+    lambda: PersistentCache("api_cache.db", default_ttl=COUNTRY_CACHE_TTL, seed_path="restcountries_seed.json")
+)
+
+def set_offline_mode(enabled=True):
+    """Chế độ offline: get_country_data / get_country_info_api chỉ đọc từ cache, không gọi API"""
+    api_cache.get_instance().offline = enabled
+
+def _fetch_country_data():
+    url = REST_COUNTRIES_BASE_URL + "/all"
+    data = http_client.get_json(url, params={"fields": "name,latlng,cca3"}, endpoint="restcountries/all")
+    records = []
+    for country in data:
+        if "name" in country and "latlng" in country:
+            name = country["name"]["common"]
+            lat, lon = country["latlng"]
+            code = country["cca3"]
+            records.append({
+                "country": name,
+                "latitude": lat,
+                "longitude": lon,
+                "code": code
+            })
+    return records
+
 def get_country_data():
     """
     Lấy dữ liệu quốc gia (name, latlng, cca3) từ REST Countries API.
     Returns: List of dictionaries with country data or empty list if failed.
     """
     try:
-        url = "https://restcountries.com/v3.1/all?fields=name,latlng,cca3"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            records = []
-            for country in data:
-                if "name" in country and "latlng" in country:
-                    name = country["name"]["common"]
-                    lat, lon = country["latlng"]
-                    code = country["cca3"]
-                    records.append({
-                        "country": name,
-                        "latitude": lat,
-                        "longitude": lon,
-                        "code": code
-                    })
-            return records
-        else:
-            return []
+        records = api_cache.get_or_fetch("restcountries/all", _fetch_country_data)
+        return [] if records is MISSING else records
+    except requests.exceptions.HTTPError:
+        return []
     except Exception as e:
         print(f"Error fetching country data: {str(e)}")
         return []
 
+def _normalize_country_info(country):
+    """Chuyển một bản ghi REST Countries sang dạng dict của get_country_info_api"""
+    return {
+        "code": country.get("cca3", "N/A"),
+        "common": country.get("name", {}).get("common", "N/A"),
+        "official": country.get("name", {}).get("official", "N/A"),
+        "currencies": country.get("currencies", {}),
+        "capital": country.get("capital", ["N/A"])[0],
+        "region": country.get("region", "N/A"),
+        "subregion": country.get("subregion", "N/A"),
+        "languages": country.get("languages", {}),
+        "borders": country.get("borders", []),
+        "area": country.get("area", 0.0),
+        "income_level": "N/A",  # REST Countries không cung cấp income_level, để mặc định
+        "latitude": country.get("latlng", [0.0, 0.0])[0],
+        "longitude": country.get("latlng", [0.0, 0.0])[1],
+        "population": country.get("population", 0),
+        "timezones": country.get("timezones", ["N/A"])
+    }
+
+COUNTRY_INFO_FIELDS = "name,cca3,capital,region,subregion,languages,currencies,borders,area,population,latlng,timezones"
+
+def _country_code(code):
+    """Mã quốc gia chuẩn hóa (bỏ khoảng trắng, chữ hoa), dùng chung cho key cache và request"""
+    return code.strip().upper()
+
+def _country_cache_key(code):
+    return f"restcountries/alpha/{_country_code(code)}"
+
+def _fetch_country_info(country_code):
+    url = REST_COUNTRIES_BASE_URL + "/alpha"
+    params = {"codes": country_code, "fields": COUNTRY_INFO_FIELDS}
+    data = http_client.get_json(url, params=params, endpoint="restcountries/alpha")
+    if not data:
+        raise LookupError("Không có dữ liệu")
+    return _normalize_country_info(data[0])
+
 def get_country_info_api(country_code):
     """
     Lấy thông tin chi tiết của quốc gia theo mã ISO3 từ REST Countries API.
@@ -77,38 +148,115 @@ def get_country_info_api(country_code):
         country_code (str): Mã ISO3 của quốc gia (e.g., 'VNM').
     Returns: Dictionary with country details or error message.
     """
+    country_code = _country_code(country_code)
     try:
-        url = f"https://restcountries.com/v3.1/alpha?codes={country_code}&fields=name,cca3,capital,region,subregion,languages,currencies,borders,area,population,latlng,timezones"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            if data:
-                country = data[0]
-                return {
-                    "code": country.get("cca3", "N/A"),
-                    "common": country.get("name", {}).get("common", "N/A"),
-                    "official": country.get("name", {}).get("official", "N/A"),
-                    "currencies": country.get("currencies", {}),
-                    "capital": country.get("capital", ["N/A"])[0],
-                    "region": country.get("region", "N/A"),
-                    "subregion": country.get("subregion", "N/A"),
-                    "languages": country.get("languages", {}),
-                    "borders": country.get("borders", []),
-                    "area": country.get("area", 0.0),
-                    "income_level": "N/A",  # REST Countries không cung cấp income_level, để mặc định
-                    "latitude": country.get("latlng", [0.0, 0.0])[0],
-                    "longitude": country.get("latlng", [0.0, 0.0])[1],
-                    "population": country.get("population", 0),
-                    "timezones": country.get("timezones", ["N/A"])
-                }
-            return {"error": "Không có dữ liệu"}
-        else:
-            return {"error": f"Lỗi API: {response.status_code}"}
+        info = api_cache.get_or_fetch(_country_cache_key(country_code),
+                                      lambda: _fetch_country_info(country_code))
+        if info is MISSING:
+            return {"error": "Không có dữ liệu trong cache (chế độ offline)"}
+        return info
+    except requests.exceptions.HTTPError as e:
+        return {"error": f"Lỗi API: {e.response.status_code}"}
+    except LookupError:
+        return {"error": "Không có dữ liệu"}
     except Exception as e:
         return {"error": f"Lỗi: {str(e)}"}
     
 
+def get_country_info_ttl(country_code):
+    """Số giây thông tin quốc gia trong api_cache còn hạn (<= 0: đã cũ, đang làm mới; None: chưa có trong cache)"""
+    return api_cache.get_ttl(_country_cache_key(country_code))
+
+# Độ dài URL tối đa an toàn cho một request alpha?codes=
+MAX_URL_LENGTH = 2000
+MAX_FETCH_WORKERS = 4
+
+def _split_code_batches(codes):
+    """Chia danh sách mã thành các lô sao cho URL alpha?codes=...&fields=... không vượt MAX_URL_LENGTH"""
+    base_length = len(f"{REST_COUNTRIES_BASE_URL}/alpha?codes=&fields={quote(COUNTRY_INFO_FIELDS)}")
+    batches, batch, length = [], [], base_length
+    for code in codes:
+        code_length = len(quote(code)) + (3 if batch else 0)  # dấu phẩy được mã hóa thành %2C
+        if batch and length + code_length > MAX_URL_LENGTH:
+            batches.append(batch)
+            batch, length = [], base_length
+            code_length = len(quote(code))
+        batch.append(code)
+        length += code_length
+    if batch:
+        batches.append(batch)
+    return batches
+
+def _fetch_countries_batch(batch):
+    """Lấy một lô mã, trả về (kết quả theo mã, lỗi theo mã)"""
+    try:
+        data = http_client.get_json(REST_COUNTRIES_BASE_URL + "/alpha",
+                                    params={"codes": ",".join(batch), "fields": COUNTRY_INFO_FIELDS},
+                                    endpoint="restcountries/alpha")
+    except requests.exceptions.HTTPError as e:
+        status = e.response.status_code
+        # 404: không mã nào trong lô tồn tại
+        message = "Không có dữ liệu" if status == 404 else f"Lỗi API: {status}"
+        return {}, {code: message for code in batch}
+    except Exception as e:
+        return {}, {code: f"Lỗi: {str(e)}" for code in batch}
+
+    by_code = {country.get("cca3", "").upper(): country for country in data or []}
+    results, errors = {}, {}
+    for code in batch:
+        country = by_code.get(code.upper())
+        if country is None:
+            errors[code] = "Không có dữ liệu"
+        else:
+            results[code] = _normalize_country_info(country)
+    return results, errors
+
+def _fetch_countries(codes):
+    """Lấy nhiều mã theo lô song song và lưu kết quả vào api_cache"""
+    results, errors = {}, {}
+    batches = _split_code_batches(codes)
+    if not batches:
+        return results, errors
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(batches))) as executor:
+        for batch_results, batch_errors in executor.map(_fetch_countries_batch, batches):
+            results.update(batch_results)
+            errors.update(batch_errors)
+    for code, info in results.items():
+        api_cache.set(_country_cache_key(code), info)
+    return results, errors
+
+def get_countries_info_api(codes):
+    """
+    Lấy thông tin chi tiết của nhiều quốc gia: đọc cache trước, các mã còn thiếu được lấy theo lô
+    (mỗi lô một request alpha?codes=A,B,C) song song.
+    Args:
+        codes (list): Danh sách mã ISO3.
+    Returns: {"data": {mã: dict như get_country_info_api}, "errors": {mã: thông báo lỗi}}
+    """
+    codes = list(dict.fromkeys(_country_code(code) for code in codes if code and code.strip()))
+    data, missing, stale = {}, [], []
+    for code in codes:
+        info, fresh = api_cache.get_entry(_country_cache_key(code))
+        if info is MISSING:
+            missing.append(code)
+        else:
+            data[code] = info
+            if not fresh:
+                stale.append(code)
+
+    if api_cache.offline:
+        errors = {code: "Không có dữ liệu trong cache (chế độ offline)" for code in missing}
+        return {"data": data, "errors": errors}
+
+    # Mục hết hạn: trả về bản cũ, làm mới ở nền (mã đang được làm mới bởi lần gọi khác thì bỏ qua)
+    if stale:
+        stale_codes = {_country_cache_key(code): code for code in stale}
+        api_cache.refresh_many_in_background(list(stale_codes),
+                                             lambda keys: _fetch_countries([stale_codes[key] for key in keys]))
+    fetched, errors = _fetch_countries(missing)
+    data.update(fetched)
+    return {"data": data, "errors": errors}
+
 def get_sample_country_info_api(country_code):
     return {
         "code": "VNM",
@@ -135,114 +283,267 @@ def get_sample_country_info_api(country_code):
         "timezones": ["UTC+7"]
     }
 
-def get_db_countries():
-    # Kết nối đến database
-    conn = sqlite3.connect("worldbank.db")
-    countries = pd.read_sql("SELECT * FROM countries JOIN country_data ON countries.iso2_code = country_data.country_code", conn)
-    
-    # Giữ dòng có year lớn nhất cho mỗi (iso2_code, indicator_code)
-    idx = countries.groupby(['iso2_code', 'indicator_code'])['year'].idxmax()
-    countries = countries.loc[idx][["iso_code", "iso2_code", "name", "indicator_code", "value"]]
-    
-    # Tạo dict mapping iso_code -> {indicator_code: value}, làm tròn đến 2 chữ số thập phân
-    indicator_map = countries.groupby('iso_code').apply(
-    lambda g: {k: (None if pd.isna(v) else round(float(v), 2)) for k, v in zip(g['indicator_code'], g['value'])}
-    ).to_dict()
-
-    # Tạo json_data
-    json_data = (
-    countries[["iso_code", "iso2_code", "name"]]
-    .drop_duplicates()
-    .set_index("iso_code")
-    .assign(indicator=lambda df: df.index.map(lambda iso: indicator_map.get(iso, {})))
-    .reset_index()
-    .to_dict(orient="records")
-    )
-    conn.close()
-    return json_data
-
-
-def get_country_data_by_iso3(iso3_code: str):
-    conn = sqlite3.connect("worldbank.db")
-    query = """
-    SELECT 
-        countries.iso_code,
-        countries.name AS country_name,
-        country_data.indicator_code,
-        indicators.name AS indicator_name,
-        country_data.year,
-        country_data.value,
-        country_data.last_updated
-    FROM country_data
-    JOIN countries ON countries.iso2_code = country_data.country_code
-    LEFT JOIN indicators ON indicators.code = country_data.indicator_code
-    WHERE countries.iso_code = ?
+# Payload get_db_countries tính sẵn cho từng DatabaseManager, dùng lại cho tới khi dữ liệu database thay đổi
+_db_countries_cache = weakref.WeakKeyDictionary()  # DatabaseManager -> {'data_version', 'frame', 'data', 'json'}
+_db_countries_lock = threading.Lock()
+
+def _resolve_db(db=None):
+    """DatabaseManager thật: db truyền vào, hoặc instance mặc định đứng sau db_manager"""
+    db = db or db_manager
+    return db.get_instance() if isinstance(db, LazyDatabaseManager) else db
+
+# Cột khóa của bảng rộng get_db_countries_frame, các cột còn lại là mã chỉ số
+DB_COUNTRY_KEY_COLUMNS = ["iso_code", "iso2_code", "name"]
+DB_COUNTRIES_SCHEMA = pa.schema([(column, pa.string()) for column in DB_COUNTRY_KEY_COLUMNS] +
+                                [('indicator_code', pa.string()), ('value', pa.float64())])
+# Content-Type của payload dạng cột (Arrow IPC stream) cho /country_info/map
+ARROW_STREAM_MIME = "application/vnd.apache.arrow.stream"
+
+def _build_db_countries_frame(db):
+    # country_latest giữ sẵn dòng mới nhất (ROW_NUMBER theo năm) cho mỗi (country_code, indicator_code)
+    countries = db.execute_query_frame("""
+    SELECT countries.iso_code, countries.iso2_code, countries.name,
+           country_latest.indicator_code, country_latest.value
+    FROM countries
+    JOIN country_latest ON countries.iso_code = country_latest.country_code
+    """, schema=DB_COUNTRIES_SCHEMA)
+    if countries.empty:
+        return pd.DataFrame(columns=DB_COUNTRY_KEY_COLUMNS)
+
+    # Pivot theo iso_code: mỗi quốc gia một dòng, mỗi chỉ số một cột, làm tròn đến 2 chữ số thập phân
+    # (iso2_code / name có thể NULL, ví dụ dữ liệu nạp từ CSV, nên ghép lại sau khi pivot)
+    wide = countries.pivot_table(
+        index="iso_code", columns="indicator_code", values="value", aggfunc="first"
+    ).round(2)
+    wide.columns.name = None
+    keys = countries[DB_COUNTRY_KEY_COLUMNS].drop_duplicates("iso_code")
+    return keys.merge(wide, left_on="iso_code", right_index=True).sort_values("iso_code", ignore_index=True)
+
+def _frame_to_db_countries(frame):
+    keys = frame[DB_COUNTRY_KEY_COLUMNS].astype(object).where(frame[DB_COUNTRY_KEY_COLUMNS].notna(), None)
+    keys = keys.to_dict(orient="records")
+    codes = [column for column in frame.columns if column not in DB_COUNTRY_KEY_COLUMNS]
+    # Bỏ các ô NaN: quốc gia chỉ có các chỉ số đã có dữ liệu
+    return [
+        {**key, "indicator": {code: value for code, value in zip(codes, values) if value == value}}
+        for key, values in zip(keys, frame[codes].to_numpy(dtype=float).tolist())
+    ]
+
+def _db_countries_to_frame(data):
+    """Chuyển danh sách dạng get_db_countries về bảng rộng (mỗi chỉ số một cột)"""
+    keys = pd.DataFrame([{column: country.get(column) for column in DB_COUNTRY_KEY_COLUMNS} for country in data],
+                        columns=DB_COUNTRY_KEY_COLUMNS)
+    indicators = pd.DataFrame([country.get("indicator", {}) for country in data], dtype=float)
+    return pd.concat([keys, indicators], axis=1)
+
+def _db_countries_payload(db=None):
+    """Lấy cache (frame, data, json) của get_db_countries, tính lại khi phiên bản dữ liệu thay đổi"""
+    db = _resolve_db(db)
+    version = db.get_data_version()
+    cache = _db_countries_cache.get(db)
+    if cache is not None and cache['data_version'] == version:
+        return cache
+    with _db_countries_lock:
+        cache = _db_countries_cache.get(db)
+        if cache is None or cache['data_version'] != version:
+            frame = _build_db_countries_frame(db)
+            data = _frame_to_db_countries(frame)
+            cache = {'data_version': version, 'frame': frame, 'data': data,
+                     'json': json.dumps(data, ensure_ascii=False)}
+            _db_countries_cache[db] = cache
+        return cache
+
+def get_db_countries(db=None):
+    """Danh sách quốc gia kèm giá trị mới nhất của từng chỉ số (cache theo phiên bản dữ liệu)"""
+    return _db_countries_payload(db)['data']
+
+def get_db_countries_json(db=None):
+    """Payload JSON của get_db_countries, tính sẵn một lần cho mỗi phiên bản dữ liệu"""
+    return _db_countries_payload(db)['json']
+
+def get_db_countries_frame(indicators=None, db=None):
+    """
+    Bảng rộng của get_db_countries: iso_code, iso2_code, name và một cột cho mỗi chỉ số (NaN nếu không có).
+    Args:
+        indicators (list): Chỉ giữ các cột chỉ số này, theo đúng thứ tự (None = tất cả).
+        db (DatabaseManager): Database nguồn (None = db_manager).
     """
-    df = pd.read_sql(query, conn, params=(iso3_code,))
-    conn.close()
+    frame = _db_countries_payload(db)['frame']
+    if indicators is None:
+        return frame.copy()
+    return frame.reindex(columns=DB_COUNTRY_KEY_COLUMNS + list(indicators))
 
-    if df.empty:
-        return {
-            "country_code": iso3_code,
-            "country_name": None,
-            "data": {}
-        }
+def get_db_countries_arrow(indicators=None, db=None):
+    """Payload Arrow IPC stream (dạng cột) của get_db_countries_frame"""
+    frame = get_db_countries_frame(indicators, db)
+    codes = frame.columns[len(DB_COUNTRY_KEY_COLUMNS):]
+    schema = pa.schema([(column, pa.string()) for column in DB_COUNTRY_KEY_COLUMNS] +
+                       [(code, pa.float64()) for code in codes])
+    table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
 
-    data_dict = {}
-    for indicator, group in df.groupby("indicator_code"):
-        indicator_name = group["indicator_name"].iloc[0]  # lấy tên đầy đủ từ bảng indicators
-        data_dict[indicator] = {
-            "indicator_code": indicator,
-            "indicator_name": indicator_name,
-            "data": [
-                {"year": int(row["year"]), "value": float(row["value"])}
-                for _, row in group.iterrows()
-            ]
+
+# Số mã tối đa trong một mệnh đề IN (giới hạn biến của SQLite)
+MAX_CODES_PER_QUERY = 500
+# Cột của DataFrame dạng dài do get_countries_data_by_iso3(as_frame=True) trả về
+COUNTRY_DATA_FRAME_SCHEMA = pa.schema([
+    ('iso_code', pa.string()),
+    ('country_name', pa.string()),
+    ('indicator_code', pa.string()),
+    ('indicator_name', pa.string()),
+    ('year', pa.int64()),
+    ('value', pa.float64()),
+    ('last_updated', pa.string()),
+])
+
+def get_countries_data_by_iso3(codes, indicators=None, year_range=None, as_frame=False, db=None):
+    """
+    Lấy dữ liệu của nhiều quốc gia theo mã ISO3 trong một query.
+    Args:
+        codes (list): Danh sách mã ISO3.
+        indicators (list): Chỉ lấy các mã chỉ số này (None = tất cả).
+        year_range (tuple): (năm đầu, năm cuối), None ở một đầu nghĩa là không giới hạn.
+        as_frame (bool): True trả về DataFrame dạng dài (iso_code, country_name, indicator_code,
+            indicator_name, year, value, last_updated).
+        db (DatabaseManager): Database nguồn (None = db_manager).
+    Returns: DataFrame, hoặc dict iso3 -> cùng dạng với get_country_data_by_iso3.
+    """
+    db = _resolve_db(db)
+    codes = list(dict.fromkeys(codes))
+    conditions = []
+    filter_params = []
+    if indicators is not None:
+        conditions.append(f"country_data.indicator_code IN ({','.join('?' for _ in indicators)})")
+        filter_params.extend(indicators)
+    if year_range is not None:
+        start_year, end_year = year_range
+        if start_year is not None:
+            conditions.append("country_data.year >= ?")
+            filter_params.append(start_year)
+        if end_year is not None:
+            conditions.append("country_data.year <= ?")
+            filter_params.append(end_year)
+
+    frames = []
+    if indicators is None or indicators:
+        for offset in range(0, len(codes), MAX_CODES_PER_QUERY):
+            chunk = codes[offset:offset + MAX_CODES_PER_QUERY]
+            query = f"""
+            SELECT 
+                countries.iso_code,
+                countries.name AS country_name,
+                country_data.indicator_code,
+                indicators.name AS indicator_name,
+                country_data.year,
+                country_data.value,
+                country_data.last_updated
+            FROM country_data
+            JOIN countries ON countries.iso_code = country_data.country_code
+            LEFT JOIN indicators ON indicators.code = country_data.indicator_code
+            WHERE countries.iso_code IN ({','.join('?' for _ in chunk)})
+            {''.join(' AND ' + condition for condition in conditions)}
+            ORDER BY countries.iso_code, country_data.indicator_code, country_data.year
+            """
+            frames.append(db.execute_query_frame(query, tuple(chunk) + tuple(filter_params),
+                                                         schema=COUNTRY_DATA_FRAME_SCHEMA))
+
+    frames = [frame for frame in frames if not frame.empty]
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+        df["year"] = df["year"].astype(int)
+        df["value"] = df["value"].astype(float)
+    else:
+        df = pd.DataFrame(columns=COUNTRY_DATA_FRAME_SCHEMA.names)
+    if as_frame:
+        return df
+
+    result = {code: {"country_code": code, "country_name": None, "data": {}} for code in codes}
+    if df.empty:
+        return result
+    # NULL thành None (không phải NaN), cùng dạng với get_country_data_by_iso3
+    points = [{"year": year, "value": None if value != value else value}
+              for year, value in zip(df["year"].tolist(), df["value"].tolist())]
+    # Điểm bắt đầu của mỗi chuỗi (iso_code, indicator_code) trên dữ liệu đã sắp xếp
+    series = df[["iso_code", "indicator_code"]]
+    starts = (series != series.shift()).any(axis=1).to_numpy().nonzero()[0].tolist()
+    ends = starts[1:] + [len(df)]
+    iso_codes = df["iso_code"].tolist()
+    indicator_codes = df["indicator_code"].tolist()
+    indicator_names = df["indicator_name"].tolist()
+    country_names = df["country_name"].tolist()
+    for begin, end in zip(starts, ends):
+        entry = result[iso_codes[begin]]
+        entry["country_name"] = country_names[begin]
+        entry["data"][indicator_codes[begin]] = {
+            "indicator_code": indicator_codes[begin],
+            "indicator_name": indicator_names[begin],  # lấy tên đầy đủ từ bảng indicators
+            "data": points[begin:end]
         }
+    return result
 
-    result = {
+def get_country_data_by_iso3(iso3_code: str, db=None):
+    """Dữ liệu mọi chỉ số của một quốc gia, đọc từ chuỗi đóng gói country_series (năm tăng dần)"""
+    db = _resolve_db(db)
+    series = db.get_country_series(iso3_code)
+    country = db.get_country_by_code(iso3_code) if series else None
+    if not country:
+        return {"country_code": iso3_code, "country_name": None, "data": {}}
+    return {
         "country_code": iso3_code,
-        "country_name": df["country_name"].iloc[0],
-        "data": data_dict
+        "country_name": country["name"],
+        "data": {
+            indicator_code: {
+                "indicator_code": indicator_code,
+                "indicator_name": entry["indicator_name"],  # lấy tên đầy đủ từ bảng indicators
+                "data": entry["data"][::-1],
+            }
+            for indicator_code, entry in series.items()
+        },
     }
 
-    return result
-
-def get_country_info_map():
-    url = "http://127.0.0.1:5000/country_info/map"
+def _get_local_api(path, endpoint):
+    """GET tới API nội bộ (localhost:5000), trả về {} khi lỗi"""
     try:
-        # Gửi yêu cầu GET tới API
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Báo lỗi nếu status_code != 200
-
-        data = response.json()
-        # Trả về JSON
-        return data
+        return http_client.get_json(LOCAL_API_BASE_URL + path, timeout=10, endpoint=endpoint)
     except requests.exceptions.RequestException as e:
+        print(f"Loi lay {path}: {e}")
         return {}
+
+def _decode_map_frame(response):
+    if response.headers.get("Content-Type", "").startswith(ARROW_STREAM_MIME):
+        return pa.ipc.open_stream(response.content).read_pandas()
+    return _db_countries_to_frame(response.json())  # Server chỉ trả JSON
+
+def get_country_info_map(indicators=None):
+    """
+    Bảng quốc gia từ /country_info/map (Arrow IPC): iso_code, iso2_code, name và một cột mỗi chỉ số.
+    Args:
+        indicators (list): Chỉ lấy các mã chỉ số này (None = tất cả); cột thiếu dữ liệu là NaN.
+    Returns: DataFrame, rỗng khi lỗi.
+    """
+    params = {"indicators": ",".join(indicators)} if indicators else None
+    try:
+        frame = http_client.get_decoded(
+            LOCAL_API_BASE_URL + "/country_info/map", _decode_map_frame, params=params,
+            headers={"Accept": ARROW_STREAM_MIME}, timeout=10, endpoint="/country_info/map"
+        )
+    except (requests.exceptions.RequestException, pa.ArrowInvalid, ValueError) as e:
+        print(f"Loi lay /country_info/map: {e}")
+        return pd.DataFrame(columns=DB_COUNTRY_KEY_COLUMNS + list(indicators or []))
+    if indicators is not None:
+        return frame.reindex(columns=DB_COUNTRY_KEY_COLUMNS + list(indicators))
+    # Không trả về đúng đối tượng giữ trong cache ETag của http_client: người gọi có thể sửa frame
+    return frame.copy()
     
 def get_country_info_detail(iso_code):
-    url = "http://127.0.0.1:5000/countries_info/"+iso_code
-    try:
-        # Gửi yêu cầu GET tới API
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Báo lỗi nếu status_code != 200
-
-        data = response.json()
-        # Trả về JSON
-        return data
-    except requests.exceptions.RequestException as e:
-        return {}
+    return _get_local_api("/countries_info/" + iso_code, "/countries_info/<iso>")
     
 def get_country_indicator_info(iso_code):
-    url = "http://127.0.0.1:5000/country_info/map/"+iso_code
-    try:
-        # Gửi yêu cầu GET tới API
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Báo lỗi nếu status_code != 200
+    return _get_local_api("/country_info/map/" + iso_code, "/country_info/map/<iso>")
 
-        data = response.json()
-        # Trả về JSON
-        return data
-    except requests.exceptions.RequestException as e:
-        return {}
\ No newline at end of file
+def get_http_metrics():
+    """Độ trễ p50/p95/p99, số lần gọi và lỗi theo từng endpoint của http_client"""
+    return http_client.get_metrics_snapshot()
@@ -0,0 +1,75 @@
+import csv
+import json
+import sys
+from typing import Any, IO, Optional, Tuple, Union
+from database_manager import db_manager, DatabaseManager
+
+# Toàn bộ dữ liệu country_data kèm tên quốc gia / chỉ số
+COUNTRY_DATA_EXPORT_SQL = """
+SELECT 
+    cd.country_code,
+    c.name as country_name,
+    cd.indicator_code,
+    i.name as indicator_name,
+    i.category,
+    cd.year,
+    cd.value,
+    cd.last_updated
+FROM country_data cd
+JOIN countries c ON cd.country_code = c.iso_code
+JOIN indicators i ON cd.indicator_code = i.code
+ORDER BY cd.country_code, cd.indicator_code, cd.year;
+"""
+
+def _open_output(destination: Union[str, IO[str]]):
+    """Mở file đích nếu là đường dẫn, giữ nguyên nếu đã là file object"""
+    if isinstance(destination, str):
+        return open(destination, "w", encoding="utf-8", newline=""), True
+    return destination, False
+
+def export_query_csv(destination: Union[str, IO[str]], sql: str = COUNTRY_DATA_EXPORT_SQL,
+                     params: Optional[Tuple] = None, db: Optional[DatabaseManager] = None,
+                     batch_size: int = 5000) -> int:
+    """Ghi kết quả query ra CSV theo luồng, trả về số dòng đã ghi"""
+    db = db or db_manager
+    output, should_close = _open_output(destination)
+    count = 0
+    try:
+        writer = None
+        for row in db.execute_query_iter(sql, params, batch_size):
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(row.keys()))
+                writer.writeheader()
+            writer.writerow(row)
+            count += 1
+    finally:
+        if should_close:
+            output.close()
+    return count
+
+def export_query_ndjson(destination: Union[str, IO[str]], sql: str = COUNTRY_DATA_EXPORT_SQL,
+                        params: Optional[Tuple] = None, db: Optional[DatabaseManager] = None,
+                        batch_size: int = 5000) -> int:
+    """Ghi kết quả query ra NDJSON (mỗi dòng một object JSON) theo luồng, trả về số dòng đã ghi"""
+    db = db or db_manager
+    output, should_close = _open_output(destination)
+    count = 0
+    try:
+        for row in db.execute_query_iter(sql, params, batch_size):
+            output.write(json.dumps(row, ensure_ascii=False))
+            output.write("\n")
+            count += 1
+    finally:
+        if should_close:
+            output.close()
+    return count
+
+if __name__ == "__main__":
+    # python data_export.py csv country_data.csv
+    # python data_export.py ndjson country_data.ndjson
+    if len(sys.argv) != 3 or sys.argv[1] not in ("csv", "ndjson"):
+        print("Cach dung: python data_export.py [csv | ndjson] OUTPUT_FILE")
+        sys.exit(1)
+    exporter = export_query_csv if sys.argv[1] == "csv" else export_query_ndjson
+    total = exporter(sys.argv[2])
+    print(f"Da xuat {total} dong ra {sys.argv[2]}")
@@ -1,111 +1,110 @@
+import copy
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache_utils import LRUCache, MISSING
 from database_manager import db_manager
+from indicator_cube import CubeHolder
+from parquet_store import ParquetAnalytics, export_parquet
 import pandas as pd
 
+# Số bản tóm tắt quốc gia giữ trong cache (đủ cho toàn bộ bảng countries)
+SUMMARY_CACHE_SIZE = 512
+
 class DataProcessor:
-    def __init__(self):
+    def __init__(self, use_cube: bool = False, summary_cache_size: int = SUMMARY_CACHE_SIZE):
         self.db = db_manager
+        # IndicatorCube (NumPy) phục vụ các truy vấn đọc nóng thay cho SQLite khi được bật
+        self.use_cube = use_cube
+        self.cube_holder = CubeHolder(self.db)
+        # Bản xuất Parquet dùng cho truy vấn so sánh / top-N (None = tắt)
+        self.parquet: ParquetAnalytics = None
+        self._parquet_warned_version = None
+        # Bản tóm tắt quốc gia: (country_code, data_version) -> summary; dữ liệu đổi thì key cũ tự hết dùng
+        self.summary_cache = LRUCache(summary_cache_size)
+        self._warm_up_thread = None
     
-    def get_country_data_summary(self, country_code):
-        """Tổng hợp dữ liệu của một quốc gia"""
-        print(f"Thu thap du lieu cho {country_code}...")
-        
-        # Lấy thông tin quốc gia
-        country_info = self.db.get_country_by_code(country_code)
-        if not country_info:
-            return None
-        
-        # Lấy tất cả indicators
-        all_indicators = self.db.get_all_indicators()
-        
-        # Lấy dữ liệu mới nhất cho các chỉ số quan trọng
-        economic_data = self._get_economic_data(country_code)
-        population_data = self._get_population_data(country_code)
-        environment_data = self._get_environment_data(country_code)
-        social_data = self._get_social_data(country_code)
-        
-        summary = {
-            "country_info": country_info,
-            "total_indicators": len(all_indicators),
-            "economic_indicators": economic_data,
-            "population_indicators": population_data,
-            "environment_indicators": environment_data,
-            "social_indicators": social_data,
-            "available_years": self.db.get_available_years()
-        }
-        
-        return summary
-    
-    def _get_economic_data(self, country_code):
-        """Lấy dữ liệu kinh tế"""
-        economic_indicators = [
+    # Các chỉ số quan trọng theo từng nhóm dùng cho bản tóm tắt quốc gia
+    SUMMARY_INDICATORS = {
+        "economic_indicators": [
             'NY.GDP.MKTP.CD',  # GDP
             'NY.GDP.PCAP.CD',  # GDP per capita
             'FP.CPI.TOTL.ZG',  # Inflation
             'SL.UEM.TOTL.ZS',  # Unemployment
             'NE.EXP.GNFS.CD',  # Exports
             'NE.IMP.GNFS.CD'   # Imports
-        ]
-        
-        economic_data = []
-        for indicator_code in economic_indicators:
-            data = self.db.get_latest_country_data(country_code, indicator_code)
-            if data:
-                economic_data.append(data)
-        
-        return economic_data
-    
-    def _get_population_data(self, country_code):
-        """Lấy dữ liệu dân số"""
-        population_indicators = [
+        ],
+        "population_indicators": [
             'SP.POP.TOTL',      # Total population
             'SP.POP.GROW',      # Population growth
             'SP.DYN.LE00.IN',   # Life expectancy
             'SP.DYN.CBRT.IN',   # Birth rate
             'SP.DYN.CDRT.IN'    # Death rate
-        ]
-        
-        population_data = []
-        for indicator_code in population_indicators:
-            data = self.db.get_latest_country_data(country_code, indicator_code)
-            if data:
-                population_data.append(data)
-        
-        return population_data
-    
-    def _get_environment_data(self, country_code):
-        """Lấy dữ liệu môi trường"""
-        environment_indicators = [
+        ],
+        "environment_indicators": [
             'EN.ATM.CO2E.PC',   # CO2 emissions per capita
             'AG.LND.FRST.ZS',   # Forest area
             'ER.H2O.FWTL.ZS',   # Renewable water resources
             'EG.USE.ELEC.KH.PC' # Electric power consumption
-        ]
-        
-        environment_data = []
-        for indicator_code in environment_indicators:
-            data = self.db.get_latest_country_data(country_code, indicator_code)
-            if data:
-                environment_data.append(data)
-        
-        return environment_data
-    
-    def _get_social_data(self, country_code):
-        """Lấy dữ liệu xã hội"""
-        social_indicators = [
+        ],
+        "social_indicators": [
             'SE.XPD.TOTL.GD.ZS', # Education expenditure
             'SH.XPD.CHEX.GD.ZS', # Health expenditure
             'SE.ADT.LITR.ZS',    # Literacy rate
             'SH.STA.MMRT',       # Maternal mortality
             'SH.DYN.MORT'        # Mortality rate
-        ]
+        ],
+    }
+    
+    def get_country_data_summary(self, country_code):
+        """Tổng hợp dữ liệu của một quốc gia (cache theo phiên bản dữ liệu); None nếu không có quốc gia
+
+        Mỗi lần gọi nhận một bản sao riêng, sửa dict trả về không ảnh hưởng bản trong cache.
+        """
+        summary = self._cached_summary(country_code)
+        return copy.deepcopy(summary) if summary is not None else None
+    
+    def _cached_summary(self, country_code):
+        """Bản tóm tắt trong cache (dùng chung, không được sửa); mã không tồn tại không được cache"""
+        key = (country_code, self.db.get_data_version())
+        summary = self.summary_cache.get(key)
+        if summary is MISSING:
+            summary = self._build_country_data_summary(country_code)
+            if summary is not None:
+                self.summary_cache.set(key, summary)
+        return summary
+    
+    def _build_country_data_summary(self, country_code):
+        print(f"Thu thap du lieu cho {country_code}...")
+        
+        # Lấy thông tin quốc gia
+        country_info = self.db.get_country_by_code(country_code)
+        if not country_info:
+            return None
+        
+        # Lấy tất cả indicators
+        all_indicators = self.db.get_all_indicators()
+        
+        summary = {
+            "country_info": country_info,
+            "total_indicators": len(all_indicators),
+        }
+        # Lấy dữ liệu mới nhất cho các chỉ số quan trọng (một query cho tất cả các nhóm)
+        summary.update(self._get_summary_indicator_data(country_code))
+        summary["available_years"] = self.db.get_available_years()
         
-        social_data = []
-        for indicator_code in social_indicators:
-            data = self.db.get_latest_country_data(country_code, indicator_code)
-            if data:
-                social_data.append(data)
+        return summary
+    
+    def _get_summary_indicator_data(self, country_code):
+        """Lấy dữ liệu mới nhất của các chỉ số quan trọng, chia theo nhóm"""
+        all_codes = [code for codes in self.SUMMARY_INDICATORS.values() for code in codes]
+        rows = self.db.get_latest_values_bulk(country_code, all_codes)
+        latest_by_code = {row['indicator_code']: row for row in rows}
         
-        return social_data
+        # Giữ nguyên thứ tự chỉ số trong từng nhóm
+        return {
+            group: [latest_by_code[code] for code in codes if code in latest_by_code]
+            for group, codes in self.SUMMARY_INDICATORS.items()
+        }
     
     def format_data_for_ai(self, country_summary):
         """Định dạng dữ liệu cho AI dễ xử lý"""
@@ -204,21 +203,93 @@ class DataProcessor:
             print(f"  ... va {len(countries) - 15} quoc gia khac")
         print("="*60)
     
+    def invalidate_summaries(self, country_codes=None):
+        """Xóa bản tóm tắt đã cache của các quốc gia (None = tất cả), ví dụ sau khi sửa dữ liệu ngoài database"""
+        if country_codes is None:
+            self.summary_cache.clear()
+            return
+        version = self.db.get_data_version()
+        for country_code in country_codes:
+            self.summary_cache.pop((country_code, version))
+    
+    def get_summary_cache_stats(self):
+        """Thống kê hit/miss của cache bản tóm tắt"""
+        return self.summary_cache.stats()
+    
+    def _warm_summary(self, country_code):
+        try:
+            self._cached_summary(country_code)
+        except Exception as e:
+            print(f"Loi tinh truoc tom tat {country_code}: {e}")
+    
+    def warm_up_summaries(self, workers=4, background=True):
+        """Tính sẵn bản tóm tắt cho mọi quốc gia trong bảng countries bằng thread pool
+        
+        background=True chạy trong thread nền và trả về thread đó (bỏ qua nếu lần warm-up trước chưa xong).
+        """
+        if self._warm_up_thread is not None and self._warm_up_thread.is_alive():
+            return self._warm_up_thread
+        country_codes = [country['iso_code'] for country in self.db.get_all_countries()]
+        
+        def run():
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(self._warm_summary, country_codes))
+        
+        if not background:
+            run()
+            return None
+        self._warm_up_thread = threading.Thread(target=run, name="summary-warm-up", daemon=True)
+        self._warm_up_thread.start()
+        return self._warm_up_thread
+    
+    def enable_cube(self, enabled=True):
+        """Bật / tắt việc phục vụ truy vấn đọc từ IndicatorCube"""
+        self.use_cube = enabled
+        if not enabled:
+            self.cube_holder.invalidate()
+    
+    def enable_parquet(self, root="parquet", export=False):
+        """Trả lời truy vấn so sánh / top-N từ thư mục Parquet (parquet_store.export_parquet); None để tắt
+
+        export=True: xuất lại từ database của DataProcessor trước khi mở. Bản xuất chỉ được dùng khi
+        write_counter ghi trong _manifest.json khớp với bộ đếm lần ghi hiện tại của database.
+        """
+        if root and export:
+            export_parquet(root, self.db)
+        self.parquet = ParquetAnalytics(root) if root else None
+        self._parquet_warned_version = None
+    
+    def _reader(self):
+        """Nguồn đọc dữ liệu: IndicatorCube nếu được bật, ngược lại là database"""
+        return self.cube_holder.get() if self.use_cube else self.db
+    
+    def _analytics_reader(self):
+        """Nguồn đọc cho truy vấn quét nhiều dòng: Parquet nếu được bật và cùng phiên bản dữ liệu, ngược lại như _reader"""
+        if self.parquet is not None:
+            self.parquet.check_refresh()
+            version = self.db.get_write_counter()
+            if version is not None and self.parquet.write_counter == version:
+                return self.parquet
+            if self._parquet_warned_version != version:
+                self._parquet_warned_version = version
+                print(f"Canh bao: ban Parquet '{self.parquet.root}' khong khop du lieu hien tai, doc tu database")
+        return self._reader()
+    
     def get_comparison_data(self, country_codes, indicator_code, year=None):
         """Lấy dữ liệu so sánh nhiều quốc gia"""
-        return self.db.get_multiple_countries_data(country_codes, indicator_code, year)
+        return self._analytics_reader().get_multiple_countries_data(country_codes, indicator_code, year)
     
     def get_indicator_trend(self, country_code, indicator_code, years_back=10):
         """Lấy xu hướng của chỉ số qua các năm"""
-        return self.db.get_indicator_trend(country_code, indicator_code, years_back)
+        return self._reader().get_indicator_trend(country_code, indicator_code, years_back)
     
     def get_top_countries(self, indicator_code, limit=10, year=None):
         """Lấy top countries theo chỉ số"""
-        return self.db.get_top_countries_by_indicator(indicator_code, limit, year)
+        return self._analytics_reader().get_top_countries_by_indicator(indicator_code, limit, year)
     
     def get_latest_map_data(self, indicator_code):
         """Lấy dữ liệu cho bản đồ"""
-        return self.db.get_latest_data_all_countries(indicator_code)
+        return self._reader().get_latest_data_all_countries(indicator_code)
 
 # Singleton instance
 data_processor = DataProcessor()
\ No newline at end of file
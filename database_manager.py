@@ -1,46 +1,776 @@
 import sqlite3
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Tuple, Any, Union, Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+import itertools
 import os
+import queue
+import tempfile
+import threading
+import sys
+import time
+import pandas as pd
+import pyarrow as pa
+import json
+from cache_utils import LRUCache, MISSING
+from query_metrics import QueryMetrics, instrument_public_methods
+from db_snapshot import resolve_snapshot_pointer
+from db_schema import (
+    apply_migrations, bump_write_counter, compute_db_metadata, db_metadata_is_stale, decode_year_bitmap, dedupe_country_data,
+    find_country_data_duplicates, get_schema_version, latest_schema_version, rebuild_country_latest, rebuild_country_series, refresh_country_series,
+    read_write_counter, refresh_db_metadata, repair_derived_tables, unpack_series,
+)
 
+# Các câu lệnh chỉ đọc, được chạy trên pool kết nối đọc
+READ_ONLY_PREFIXES = ('SELECT', 'WITH', 'EXPLAIN')
+
+# Mặc định cho chế độ serving: mmap 256 MB, page cache 64 MB mỗi kết nối (giá trị âm = KiB)
+SERVING_MMAP_SIZE = 256 * 1024 * 1024
+SERVING_PAGE_CACHE_SIZE = -64 * 1024
+
+# Giới hạn mặc định khi nạp toàn bộ database vào bộ nhớ (chế độ in_memory)
+DEFAULT_MEMORY_LIMIT_MB = 1024
+
+# Tên database memdb dùng chung trong tiến trình: mỗi lần nạp một tên mới (lần nạp cũ còn query đang chạy)
+_MEMDB_NAMES = itertools.count(1)
+
+def _column_arrow_type(values: List[Any]) -> Optional[pa.DataType]:
+    """Kiểu Arrow của một cột (pa.null() nếu toàn NULL, None nếu lẫn nhiều kiểu: để Arrow tự suy ra)"""
+    kinds = {type(value) for value in values if value is not None}
+    if not kinds:
+        return pa.null()
+    if kinds <= {int}:
+        return pa.int64()
+    if kinds <= {int, float}:
+        return pa.float64()
+    if kinds == {str}:
+        return pa.string()
+    if kinds == {bytes}:
+        return pa.binary()
+    return None
+
+def _rows_to_batch(names: List[str], rows: List[Tuple], types: List[Optional[pa.DataType]],
+                   strict: bool) -> pa.RecordBatch:
+    """Dựng RecordBatch từ các dòng tuple theo từng cột; types được cập nhật tại chỗ với kiểu vừa suy ra"""
+    arrays = []
+    for index, column in enumerate(zip(*rows)):
+        column_type = types[index]
+        if strict:
+            arrays.append(pa.array(column, type=column_type))
+            continue
+        if column_type is None or pa.types.is_null(column_type):
+            column_type = _column_arrow_type(column)
+        try:
+            array = pa.array(column, type=column_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError, OverflowError):
+            # SQLite không ràng buộc kiểu cột: lô này khác kiểu đã suy ra, suy ra lại cho cột
+            column_type = _column_arrow_type(column)
+            array = pa.array(column, type=column_type)
+        if column_type is not None and not pa.types.is_null(column_type):
+            types[index] = column_type
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, names=names)
+
+class ConnectionPool:
+    """Pool kết nối SQLite chỉ đọc, mỗi query mượn một kết nối rồi trả lại"""
+    
+    def __init__(self, connect: Callable[[], sqlite3.Connection], size: int = 4, timeout: Optional[float] = 30.0):
+        if size < 1:
+            raise ValueError("pool_size phai lon hon 0")
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._retired = False  # Pool đã được thay thế: kết nối trả về sẽ bị đóng
+    
+    def _acquire(self) -> sqlite3.Connection:
+        """Lấy kết nối rảnh, tạo mới nếu pool chưa đầy, ngược lại chờ kết nối được trả về"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Het thoi gian cho ket noi trong pool (size={self.size})")
+    
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Mượn một kết nối trong phạm vi khối with"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if self._retired:
+                conn.close()
+            else:
+                self._idle.put(conn)
+    
+    def close_all(self):
+        """Đóng tất cả kết nối đang rảnh trong pool"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+    
+    def retire(self):
+        """Ngừng dùng pool: đóng kết nối rảnh, kết nối đang mượn sẽ bị đóng khi được trả về"""
+        self._retired = True
+        self.close_all()
+
+# Các method không cần đo thời gian (tiện ích nội bộ, thống kê)
+UNTIMED_METHODS = (
+    'get_data_version', 'clear_cache', 'get_cache_stats',
+    'get_metrics_snapshot', 'reset_metrics', 'dump_metrics',
+    'explain_builtin_queries', 'print_query_plans', 'close_connection',
+    'write_transaction',
+)
+
+@instrument_public_methods(exclude=UNTIMED_METHODS)
 class DatabaseManager:
-    def __init__(self, db_path: str = "worldbank.db"):
+    def __init__(self, db_path: str = "worldbank.db", pool_size: int = 4, auto_migrate: Optional[bool] = None,
+                 cache_size: int = 0, cache_ttl: Optional[float] = 300.0,
+                 enable_metrics: bool = True, slow_query_ms: Optional[float] = None,
+                 serving: bool = False, mmap_size: Optional[int] = None, page_cache_size: Optional[int] = None,
+                 in_memory: bool = False, memory_limit_mb: Optional[float] = DEFAULT_MEMORY_LIMIT_MB,
+                 snapshot_pointer: Optional[str] = None, packed_series: bool = False):
         # Nếu không có đường dẫn khác được cung cấp, sử dụng worldbank.db làm mặc định
         self.db_path = db_path
-        self.conn = None
+        self.pool_size = pool_size
+        # Đọc chuỗi theo năm (get_country_data, get_indicator_trend) từ country_series thay vì country_data
+        self.packed_series = packed_series
+        
+        # Đọc snapshot bất biến do db_snapshot công bố; mở lại khi file con trỏ đổi
+        self.snapshot_pointer = snapshot_pointer
+        self._pointer_stamp = None
+        if snapshot_pointer:
+            self._pointer_stamp = self._stat_pointer()
+            self.db_path = resolve_snapshot_pointer(snapshot_pointer)
+            serving = True
+        
+        # Chế độ serving: chỉ đọc, mở file với immutable=1 (không khóa, không kiểm tra thay đổi)
+        self.serving = serving
+        self.mmap_size = SERVING_MMAP_SIZE if serving and mmap_size is None else mmap_size
+        self.page_cache_size = SERVING_PAGE_CACHE_SIZE if serving and page_cache_size is None else page_cache_size
+        
+        # Chế độ in_memory: một bản sao của file trong RAM (VFS memdb), mọi kết nối đọc mở chung bản này
+        self.in_memory = in_memory
+        self.memory_limit_mb = memory_limit_mb  # None = không giới hạn
+        self._write_counter = None  # (data_version, bộ đếm lần ghi trong db_metadata) đọc gần nhất
+        self._memory_anchor = None  # Kết nối giữ bản sao memdb đang phục vụ (None = đọc từ đĩa)
+        self._reload_lock = threading.Lock()
+        self.conn = None  # Kết nối ghi duy nhất
+        self.pool = None  # Pool kết nối chỉ đọc
+        self._write_lock = threading.Lock()
+        # Không có pool (:memory:): các lần đọc dùng chung kết nối ghi, khóa riêng để đọc dở không chặn ghi
+        self._read_lock = threading.RLock()
+        self._local = threading.local()  # Trạng thái riêng từng thread (vd: chế độ EXPLAIN)
+        
+        # Cache kết quả query chỉ đọc (tắt khi cache_size = 0)
+        self.cache = LRUCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._data_version = 0  # Tăng mỗi khi phát hiện dữ liệu thay đổi
+        self._version_conn = None  # Kết nối riêng để đọc PRAGMA data_version
+        self._last_pragma_version = None
+        self._version_lock = threading.Lock()
+        
+        # Thống kê thời gian từng method và log query chậm (slow_query_ms = None để tắt log)
+        self.metrics = QueryMetrics(slow_query_ms=slow_query_ms) if enable_metrics else None
         self._init_connection()
+        if not self.read_only:
+            self._auto_migrate(auto_migrate)
+    
+    @property
+    def read_only(self) -> bool:
+        """Instance không có kết nối ghi (serving / in_memory)"""
+        return self.serving or self.in_memory
     
     def _init_connection(self):
         """Khởi tạo kết nối database"""
+        if self.read_only:
+            self._init_read_only_connection()
+            return
         try:
             # Kiểm tra xem file database có tồn tại không
-            if not os.path.exists(self.db_path):
+            if self.db_path != ":memory:" and not os.path.exists(self.db_path):
                 print(f"Canh bao: File database '{self.db_path}' khong ton tai. Se tao database moi khi co truy van.")
             
             self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
             self.conn.row_factory = sqlite3.Row  # Để trả về dict-like objects
+            
+            # Database trong bộ nhớ không chia sẻ được giữa các kết nối, chỉ dùng kết nối ghi
+            if self.db_path != ":memory:":
+                # WAL cho phép nhiều kết nối đọc song song với một kết nối ghi
+                self.conn.execute("PRAGMA journal_mode=WAL;")
+                self.pool = ConnectionPool(self._connect_reader, self.pool_size)
+                self._version_conn = self._connect_reader()
             print(f"Da ket noi den database: {self.db_path}")
         except Exception as e:
             print(f"Loi ket noi database: {e}")
             raise
     
+    def _init_read_only_connection(self):
+        """Chế độ serving / in_memory: không có kết nối ghi, chỉ pool kết nối đọc"""
+        if self.db_path == ":memory:":
+            raise ValueError("Che do serving / in_memory can file database, khong dung duoc voi :memory:")
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f"Khong tim thay file database: {self.db_path}")
+        
+        if self.in_memory and self._fits_in_memory():
+            self._memory_anchor = self._load_memory_copy()
+            print(f"Da nap database vao bo nho: {self.db_path}")
+        elif self.serving:
+            # immutable=1 bỏ qua file -wal: các thay đổi chưa checkpoint sẽ không được đọc
+            wal_path = self.db_path + "-wal"
+            if os.path.exists(wal_path) and os.path.getsize(wal_path) > 0:
+                print(f"Canh bao: '{wal_path}' chua duoc checkpoint, che do serving se khong doc cac thay doi trong do")
+        self.pool = ConnectionPool(self._connect_reader, self.pool_size)
+        # Bản sao trong RAM chỉ đổi khi nạp lại (đã tăng phiên bản), không cần đọc PRAGMA data_version
+        self._version_conn = None if self._memory_anchor is not None else self._connect_reader()
+        print(f"Da ket noi den database (chi doc): {self.db_path}")
+    
+    def _database_size_mb(self) -> float:
+        """Dung lượng file database (kể cả -wal) theo MB"""
+        size = os.path.getsize(self.db_path)
+        wal_path = self.db_path + "-wal"
+        if os.path.exists(wal_path):
+            size += os.path.getsize(wal_path)
+        return size / (1024 * 1024)
+    
+    def _fits_in_memory(self) -> bool:
+        """Kiểm tra giới hạn bộ nhớ cho bản sao dùng chung; vượt thì dùng file trên đĩa"""
+        size_mb = self._database_size_mb()
+        if self.memory_limit_mb is not None and size_mb > self.memory_limit_mb:
+            print(f"Canh bao: database ({size_mb:.1f} MB) vuot gioi han {self.memory_limit_mb} MB, doc tu file tren dia")
+            return False
+        return True
+    
+    def _load_memory_copy(self) -> sqlite3.Connection:
+        """Chép file database vào một database memdb có tên, trả về kết nối giữ bản sao đó
+
+        Các kết nối đọc mở cùng tên với mode=ro nên chỉ có một bản trong RAM; bản sao tồn tại
+        tới khi kết nối cuối cùng tới nó đóng
+        """
+        source = sqlite3.connect(Path(self.db_path).absolute().as_uri() + "?mode=ro", uri=True)
+        anchor = sqlite3.connect(f"file:/worldbank_{os.getpid()}_{next(_MEMDB_NAMES)}?vfs=memdb",
+                                 uri=True, check_same_thread=False)
+        try:
+            # memdb không mở được file ở chế độ WAL: chuyển bản backup tạm trên đĩa về rollback journal trước
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                copy = sqlite3.connect(os.path.join(tmp_dir, "copy.db"))
+                try:
+                    source.backup(copy)
+                    copy.execute("PRAGMA journal_mode=DELETE;")
+                    copy.backup(anchor)
+                finally:
+                    copy.close()
+        except Exception:
+            anchor.close()
+            raise
+        finally:
+            source.close()
+        return anchor
+    
+    def _swap_readers(self, memory_anchor: Optional[sqlite3.Connection]):
+        """Thay pool kết nối đọc bằng pool mới (gọi khi giữ _reload_lock); pool cũ đóng dần khi trả kết nối"""
+        old_pool, old_version_conn, old_anchor = self.pool, self._version_conn, self._memory_anchor
+        self._memory_anchor = memory_anchor
+        self.pool = ConnectionPool(self._connect_reader, self.pool_size)
+        with self._version_lock:
+            self._version_conn = None if memory_anchor is not None else self._connect_reader()
+            self._last_pragma_version = None
+        self._bump_data_version()
+        
+        old_pool.retire()
+        if old_version_conn is not None:
+            old_version_conn.close()
+        if old_anchor is not None:
+            # Kết nối đọc cũ còn mở vẫn giữ bản sao cũ cho tới khi được trả về pool
+            old_anchor.close()
+    
+    def reload_memory_copy(self) -> bool:
+        """Nạp lại bản sao trong RAM từ file; query đang chạy tiếp tục trên bản cũ, query sau dùng bản mới"""
+        if not self.in_memory:
+            return False
+        with self._reload_lock:
+            try:
+                if not self._fits_in_memory():
+                    return False
+                anchor = self._load_memory_copy()
+            except Exception as e:
+                print(f"Loi nap lai database vao bo nho: {e}")
+                return False
+            self._swap_readers(anchor)
+        print(f"Da nap lai database vao bo nho: {self.db_path}")
+        return True
+    
+    def _stat_pointer(self) -> Optional[Tuple[int, int]]:
+        """Dấu hiệu thay đổi của file con trỏ snapshot (inode, mtime)"""
+        try:
+            stat = os.stat(self.snapshot_pointer)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def _check_snapshot(self):
+        """Chuyển sang snapshot mới nếu file con trỏ đã được thay (một lần stat mỗi query)"""
+        if self.snapshot_pointer is None:
+            return
+        stamp = self._stat_pointer()
+        if stamp is None or stamp == self._pointer_stamp:
+            return
+        with self._reload_lock:
+            if stamp == self._pointer_stamp:
+                return
+            self._pointer_stamp = stamp
+            try:
+                path = resolve_snapshot_pointer(self.snapshot_pointer)
+                if path == self.db_path:
+                    return
+                old_path = self.db_path
+                self.db_path = path
+                try:
+                    anchor = self._load_memory_copy() if self.in_memory and self._fits_in_memory() else None
+                    self._swap_readers(anchor)
+                except Exception:
+                    self.db_path = old_path
+                    raise
+            except Exception as e:
+                print(f"Loi chuyen snapshot: {e}")
+                return
+        print(f"Da chuyen sang snapshot: {path}")
+    
+    def _connect_reader(self) -> sqlite3.Connection:
+        """Mở một kết nối chỉ đọc tới file database (hoặc bản sao trong RAM)"""
+        if self._memory_anchor is not None:
+            # Mở chung bản sao memdb (không dùng shared cache: khóa mức bảng làm các lần đọc chạy tuần tự)
+            name = self._memory_anchor.execute("PRAGMA database_list;").fetchone()[2]
+            conn = sqlite3.connect(f"file:{name}?vfs=memdb&mode=ro", uri=True, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA query_only = ON;")
+            conn.execute("PRAGMA temp_store = MEMORY;")
+            return conn
+        
+        uri = Path(self.db_path).absolute().as_uri() + ("?mode=ro&immutable=1" if self.serving else "?mode=ro")
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # PRAGMA không hỗ trợ tham số, các giá trị luôn được ép kiểu int
+        if self.mmap_size is not None:
+            # Đọc trang trực tiếp từ page cache của hệ điều hành thay vì copy vào bộ nhớ SQLite
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)};")
+        if self.page_cache_size is not None:
+            conn.execute(f"PRAGMA cache_size = {int(self.page_cache_size)};")
+        if self.serving:
+            # Bảng tạm (ORDER BY / GROUP BY lớn) nằm trong RAM, không ghi ra đĩa
+            conn.execute("PRAGMA temp_store = MEMORY;")
+        return conn
+    
+    def _writer(self) -> sqlite3.Connection:
+        """Kết nối ghi; báo lỗi khi database mở ở chế độ serving"""
+        if self.conn is None:
+            raise sqlite3.OperationalError("Database dang mo o che do chi doc (serving / in_memory)")
+        return self.conn
+    
+    @contextmanager
+    def _read_connection(self) -> Iterator[sqlite3.Connection]:
+        """Mượn kết nối đọc từ pool, hoặc dùng kết nối ghi nếu không có pool"""
+        self._check_snapshot()
+        if self.pool is None:
+            with self._read_lock:
+                yield self.conn
+        else:
+            with self.pool.connection() as conn:
+                yield conn
+    
+    @staticmethod
+    def _is_read_query(sql: str) -> bool:
+        """Kiểm tra câu lệnh có phải chỉ đọc không"""
+        return sql.lstrip().upper().startswith(READ_ONLY_PREFIXES)
+    
     def execute_query(self, sql: str, params: Optional[Tuple] = None) -> List[Dict[str, Any]]:
         """Thực thi query và trả về kết quả dạng list of dict"""
+        plans = getattr(self._local, 'query_plans', None)
+        if plans is not None:
+            return self._record_query_plan(plans, sql, params)
+        
         try:
-            cursor = self.conn.cursor()
-            cursor.execute(sql, params or ())
+            if self._is_read_query(sql):
+                return self._execute_read(sql, params)
             
-            if sql.strip().upper().startswith('SELECT'):
-                results = cursor.fetchall()
-                return [dict(row) for row in results]
-            else:
-                self.conn.commit()
-                return []
+            start = time.perf_counter()
+            with self._write_lock:
+                conn = self._writer()
+                try:
+                    changes = conn.total_changes
+                    cursor = conn.execute(sql, params or ())
+                    if conn.total_changes != changes:
+                        bump_write_counter(conn)
+                    # db_metadata / country_series được sửa ngay trong lần ghi, hàm đọc không phải ghi
+                    repair_derived_tables(conn)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            self._log_if_slow(sql, params, start, cursor.rowcount)
+            self._bump_data_version()
+            return []
                 
         except Exception as e:
             print(f"Loi query: {e}")
             print(f"SQL: {sql}")
             return []
     
+    def _execute_read(self, sql: str, params: Optional[Tuple]) -> List[Dict[str, Any]]:
+        """Chạy query chỉ đọc, dùng cache nếu được bật"""
+        key = None
+        if self.cache is not None:
+            # Key gồm cả phiên bản dữ liệu nên kết quả cũ không bao giờ được trả về
+            key = (self.get_data_version(), sql, tuple(params or ()))
+            try:
+                cached = self.cache.get(key)
+            except TypeError:
+                # Tham số không hash được, bỏ qua cache
+                key, cached = None, MISSING
+            if cached is not MISSING:
+                return [dict(row) for row in cached]
+        
+        start = time.perf_counter()
+        with self._read_connection() as conn:
+            results = [dict(row) for row in conn.execute(sql, params or ()).fetchall()]
+        self._log_if_slow(sql, params, start, len(results))
+        
+        if key is not None:
+            self.cache.set(key, results)
+            return [dict(row) for row in results]
+        return results
+    
+    def execute_query_iter(self, sql: str, params: Optional[Tuple] = None, batch_size: int = 1000,
+                           as_arrow: bool = False, schema: Optional[pa.Schema] = None
+                           ) -> Iterator[Union[Dict[str, Any], pa.RecordBatch]]:
+        """Duyệt kết quả query chỉ đọc theo từng lô fetchmany, bộ nhớ không phụ thuộc kích thước bảng
+        
+        Trả về từng dòng dạng dict, hoặc từng pyarrow.RecordBatch nếu as_arrow=True. Với schema cho trước,
+        mỗi cột được dựng thẳng theo kiểu đó; nếu không, kiểu được suy ra một lần rồi dùng lại cho các lô sau.
+        Kết nối đọc được giữ cho tới khi duyệt xong hoặc generator bị đóng.
+        """
+        with self._read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = None  # Lấy tuple thay vì sqlite3.Row
+            try:
+                cursor.execute(sql, params or ())
+                names = [column[0] for column in cursor.description or ()]
+                if schema is not None and schema.names != names:
+                    raise ValueError(f"Schema {schema.names} khong khop cot cua query {names}")
+                types = list(schema.types) if schema is not None else [None] * len(names)
+                emitted = False
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    emitted = True
+                    if as_arrow:
+                        yield _rows_to_batch(names, rows, types, strict=schema is not None)
+                    else:
+                        for row in rows:
+                            yield dict(zip(names, row))
+                # Kết quả rỗng: vẫn trả một batch rỗng để giữ tên (và kiểu) cột
+                if as_arrow and not emitted:
+                    yield pa.RecordBatch.from_arrays(
+                        [pa.array([], type=column_type or pa.null()) for column_type in types], names=names
+                    )
+            finally:
+                cursor.close()
+    
+    def execute_query_arrow(self, sql: str, params: Optional[Tuple] = None, batch_size: int = 65536,
+                            schema: Optional[pa.Schema] = None) -> pa.Table:
+        """Thực thi query chỉ đọc và dựng trực tiếp bảng Arrow theo cột (không tạo dict cho từng dòng)
+        
+        Lỗi query / chuyển kiểu được ném ra cho người gọi (không trả về bảng rỗng).
+        """
+        batches = list(self.execute_query_iter(sql, params, batch_size, as_arrow=True, schema=schema))
+        if schema is not None:
+            return pa.Table.from_batches(batches, schema=schema)
+        # Cột toàn NULL ở lô đầu, hoặc INTEGER lẫn REAL giữa các lô: thống nhất kiểu khi ghép
+        return pa.concat_tables([pa.Table.from_batches([batch]) for batch in batches], promote_options="permissive")
+    
+    def execute_query_frame(self, sql: str, params: Optional[Tuple] = None, batch_size: int = 65536,
+                            schema: Optional[pa.Schema] = None) -> pd.DataFrame:
+        """Thực thi query chỉ đọc và trả về pandas DataFrame dựng từ bảng Arrow"""
+        return self.execute_query_arrow(sql, params, batch_size, schema).to_pandas()
+    
+    def _log_if_slow(self, sql: str, params: Optional[Tuple], start: float, rows: int):
+        """Ghi log nếu query chạy lâu hơn ngưỡng slow_query_ms"""
+        if self.metrics is None:
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if self.metrics.is_slow(elapsed_ms):
+            stack = getattr(self._local, 'method_stack', None)
+            # Method public ngoài cùng là nơi gây ra query (vd: get_database_stats)
+            method = stack[0] if stack else 'execute_query'
+            self.metrics.log_slow_query(method, sql, params, elapsed_ms, rows)
+    
+    # ===== METRICS =====
+    def get_metrics_snapshot(self) -> Dict[str, Any]:
+        """Thống kê số lần gọi, độ trễ p50/p95/p99 và số dòng của từng method, kèm log query chậm"""
+        if self.metrics is None:
+            return {'enabled': False}
+        snapshot = self.metrics.snapshot()
+        snapshot['enabled'] = True
+        return snapshot
+    
+    def reset_metrics(self):
+        """Xóa thống kê"""
+        if self.metrics is not None:
+            self.metrics.reset()
+    
+    def dump_metrics(self, path: str):
+        """Ghi thống kê ra file JSON"""
+        if self.metrics is not None:
+            self.metrics.dump(path)
+    
+    # ===== CACHE / DATA VERSION =====
+    def get_data_version(self) -> int:
+        """Phiên bản dữ liệu, tăng mỗi khi database được ghi (bởi instance này hoặc kết nối khác)"""
+        self._check_snapshot()
+        if self._version_conn is not None:
+            with self._version_lock:
+                pragma_version = self._version_conn.execute("PRAGMA data_version;").fetchone()[0]
+                changed = self._last_pragma_version is not None and pragma_version != self._last_pragma_version
+                self._last_pragma_version = pragma_version
+            if changed:
+                self._bump_data_version()
+        return self._data_version
+    
+    def get_write_counter(self) -> Optional[int]:
+        """Bộ đếm lần ghi lưu trong database (bền giữa các tiến trình, khác get_data_version); None nếu chưa có db_metadata"""
+        version = self.get_data_version()
+        cached = self._write_counter
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._read_connection() as conn:
+            counter = read_write_counter(conn)
+        self._write_counter = (version, counter)
+        return counter
+    
+    def _bump_data_version(self):
+        """Đánh dấu dữ liệu đã thay đổi và xóa cache"""
+        with self._version_lock:
+            self._data_version += 1
+        if self.cache is not None:
+            self.cache.clear()
+    
+    def clear_cache(self):
+        """Xóa toàn bộ cache kết quả query"""
+        if self.cache is not None:
+            self.cache.clear()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss của cache kết quả query"""
+        if self.cache is None:
+            return {'enabled': False}
+        stats = self.cache.stats()
+        stats['enabled'] = True
+        stats['data_version'] = self._data_version
+        return stats
+    
+    # ===== SCHEMA / INDEX =====
+    def _auto_migrate(self, auto_migrate: Optional[bool]):
+        """auto_migrate=None: chỉ tạo schema cho database mới; database đã có dữ liệu phải migrate rõ ràng
+
+        Migration có thể back-fill cả bảng hoặc dừng vì dữ liệu trùng, không nên chạy ngầm khi mở ứng dụng
+        """
+        if auto_migrate is False:
+            return
+        with self._write_lock:
+            conn = self._writer()
+            is_new = conn.execute("SELECT COUNT(*) FROM sqlite_master;").fetchone()[0] == 0
+            current = get_schema_version(conn)
+        if auto_migrate or is_new:
+            self.ensure_schema()
+        elif current < latest_schema_version():
+            print(f"Canh bao: database '{self.db_path}' o schema version {current}, can {latest_schema_version()}. "
+                  "Chay 'python database_manager.py migrate' de nang cap")
+    
+    def ensure_schema(self) -> List[int]:
+        """Tạo bảng, index còn thiếu và nâng phiên bản schema"""
+        try:
+            with self._write_lock:
+                applied = apply_migrations(self._writer())
+            if applied:
+                self._bump_data_version()
+            return applied
+        except Exception as e:
+            print(f"Loi migration schema: {e}")
+            return []
+    
+    def find_duplicate_rows(self, limit: Optional[int] = 10) -> Tuple[int, List[Dict[str, Any]]]:
+        """Số bộ (country_code, indicator_code, year) bị trùng trong country_data và vài ví dụ"""
+        with self._read_connection() as conn:
+            return find_country_data_duplicates(conn, limit)
+    
+    def dedupe_country_data(self) -> int:
+        """Xoá dòng trùng trong country_data (giữ dòng ghi sau cùng), trả về số dòng đã xoá (-1 nếu lỗi)"""
+        try:
+            with self.write_transaction() as conn:
+                return dedupe_country_data(conn)
+        except Exception as e:
+            print(f"Loi xoa dong trung: {e}")
+            return -1
+    
+    def get_schema_version(self) -> int:
+        """Lấy phiên bản schema hiện tại của database"""
+        with self._read_connection() as conn:
+            return get_schema_version(conn)
+    
+    def _record_query_plan(self, plans: List[Dict[str, Any]], sql: str, params: Optional[Tuple]) -> List[Dict[str, Any]]:
+        """Ghi lại EXPLAIN QUERY PLAN thay vì chạy query (dùng cho explain_builtin_queries)"""
+        if not self._is_read_query(sql):
+            return []
+        try:
+            with self._read_connection() as conn:
+                rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params or ()).fetchall()
+            plans.append({'sql': sql.strip(), 'plan': [row['detail'] for row in rows]})
+        except Exception as e:
+            plans.append({'sql': sql.strip(), 'plan': [], 'error': str(e)})
+        return []
+    
+    def explain_builtin_queries(self, country_code: str = "VNM", indicator_code: str = "NY.GDP.MKTP.CD") -> Dict[str, List[Dict[str, Any]]]:
+        """Lấy EXPLAIN QUERY PLAN của tất cả query có sẵn trong class"""
+        calls = {
+            'get_all_countries': (),
+            'get_country_by_code': (country_code,),
+            'get_country_by_iso2': (country_code[:2],),
+            'get_all_indicators': (),
+            'get_indicator_by_code': (indicator_code,),
+            'get_indicators_by_category': ('Economy',),
+            'get_country_data': (country_code, indicator_code),
+            'get_latest_country_data': (country_code, indicator_code),
+            'get_latest_values_bulk': ([country_code], [indicator_code]),
+            'get_latest_data_all_countries': (indicator_code,),
+            'get_top_countries_by_indicator': (indicator_code, 10),
+            'get_top_countries_by_indicator(year)': (indicator_code, 10, 2020),
+            'get_indicator_trend': (country_code, indicator_code),
+            'get_multiple_countries_data': ([country_code], indicator_code),
+            'get_multiple_countries_data(year)': ([country_code], indicator_code, 2020),
+            'get_country_series': (country_code,),
+            'get_database_stats': (),
+            'get_available_years': (),
+            'get_available_years(indicator)': (indicator_code,),
+        }
+        
+        report = {}
+        for label, args in calls.items():
+            method = getattr(self, label.split('(')[0])
+            self._local.query_plans = []
+            try:
+                method(*args)
+                report[label] = self._local.query_plans
+            finally:
+                self._local.query_plans = None
+        return report
+    
+    def print_query_plans(self, country_code: str = "VNM", indicator_code: str = "NY.GDP.MKTP.CD"):
+        """In EXPLAIN QUERY PLAN của tất cả query có sẵn, đánh dấu các bước quét toàn bảng"""
+        report = self.explain_builtin_queries(country_code, indicator_code)
+        print(f"Schema version: {self.get_schema_version()} / {latest_schema_version()}")
+        for label, plans in report.items():
+            print("\n" + "=" * 60)
+            print(label)
+            print("=" * 60)
+            for entry in plans:
+                print(entry['sql'].splitlines()[0] + (" ..." if "\n" in entry['sql'] else ""))
+                if 'error' in entry:
+                    print(f"  Loi: {entry['error']}")
+                for detail in entry['plan']:
+                    # "SCAN bảng" không kèm index nghĩa là quét toàn bộ bảng (bỏ qua subquery)
+                    full_scan = detail.startswith('SCAN') and 'INDEX' not in detail and '(' not in detail
+                    print(f"  {'[FULL SCAN] ' if full_scan else ''}{detail}")
+    
+    @contextmanager
+    def write_transaction(self) -> Iterator[sqlite3.Connection]:
+        """Mở một transaction trên kết nối ghi; commit khi thành công, rollback khi có lỗi"""
+        with self._write_lock:
+            conn = self._writer()
+            conn.execute("BEGIN")
+            try:
+                changes = conn.total_changes
+                yield conn
+                if conn.total_changes != changes:
+                    bump_write_counter(conn)
+                repair_derived_tables(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self._bump_data_version()
+    
+    def refresh_country_latest(self) -> bool:
+        """Tính lại toàn bộ bảng country_latest từ country_data (sau khi nạp dữ liệu ngoài trigger)"""
+        try:
+            with self.write_transaction() as conn:
+                rebuild_country_latest(conn)
+            return True
+        except Exception as e:
+            print(f"Loi cap nhat country_latest: {e}")
+            return False
+    
+    def refresh_metadata(self) -> bool:
+        """Tính lại db_metadata / indicator_years (gọi sau khi ghi country_data ngoài worldbank_ingest)"""
+        try:
+            with self.write_transaction() as conn:
+                refresh_db_metadata(conn)
+            return True
+        except Exception as e:
+            print(f"Loi cap nhat db_metadata: {e}")
+            return False
+    
+    def refresh_country_series(self, pairs: Optional[List[Tuple[str, str]]] = None) -> bool:
+        """Đóng gói lại country_series: các chuỗi (country_code, indicator_code) cho trước, hoặc toàn bộ"""
+        try:
+            with self.write_transaction() as conn:
+                if pairs is None:
+                    rebuild_country_series(conn)
+                else:
+                    refresh_country_series(conn, pairs)
+            return True
+        except Exception as e:
+            print(f"Loi cap nhat country_series: {e}")
+            return False
+    
+    def _metadata_is_current(self) -> bool:
+        """db_metadata / indicator_years còn đúng với dữ liệu (chỉ đọc; được tính lại ở các lần ghi)"""
+        try:
+            with self._read_connection() as conn:
+                return not db_metadata_is_stale(conn)
+        except sqlite3.Error:
+            return False  # Database chưa có bảng db_metadata
+    
+    def _get_metadata(self) -> Dict[str, Any]:
+        """Đọc db_metadata; nếu chưa được tính hoặc đã cũ (chỉ đọc) thì tính trực tiếp từ các bảng (không ghi lại)"""
+        if self._metadata_is_current():
+            results = self.execute_query("SELECT key, value FROM db_metadata;")
+            return {row['key']: json.loads(row['value']) for row in results}
+        with self._read_connection() as conn:
+            return compute_db_metadata(conn)[0]
+    
     def test_connection(self) -> bool:
         """Kiểm tra kết nối database"""
         try:
@@ -112,6 +842,8 @@ class DatabaseManager:
     # ===== COUNTRY DATA =====
     def get_country_data(self, country_code: str, indicator_code: str) -> List[Dict[str, Any]]:
         """Lấy dữ liệu theo quốc gia và chỉ số"""
+        if self.packed_series:
+            return self._get_country_data_packed(country_code, indicator_code)
         sql = """
         SELECT cd.country_code, cd.indicator_code, cd.year, cd.value, cd.last_updated,
                c.name as country_name, i.name as indicator_name, i.unit
@@ -138,35 +870,56 @@ class DatabaseManager:
         results = self.execute_query(sql, (country_code, indicator_code))
         return results[0] if results else None
     
+    def get_latest_values_bulk(self, country_codes: Union[str, List[str]], indicator_codes: List[str]) -> List[Dict[str, Any]]:
+        """Lấy dữ liệu mới nhất (khác NULL) của nhiều chỉ số cho một hoặc nhiều quốc gia trong một query"""
+        if isinstance(country_codes, str):
+            country_codes = [country_codes]
+        if not country_codes or not indicator_codes:
+            return []
+        
+        country_placeholders = ','.join(['?' for _ in country_codes])
+        indicator_placeholders = ','.join(['?' for _ in indicator_codes])
+        # country_latest giữ sẵn dòng mới nhất khác NULL cho từng cặp (quốc gia, chỉ số)
+        sql = f"""
+        SELECT 
+            cl.country_code,
+            cl.indicator_code,
+            cl.year,
+            cl.value,
+            cl.last_updated,
+            c.name as country_name,
+            i.name as indicator_name,
+            i.unit
+        FROM country_latest cl
+        JOIN countries c ON cl.country_code = c.iso_code
+        JOIN indicators i ON cl.indicator_code = i.code
+        WHERE cl.country_code IN ({country_placeholders})
+        AND cl.indicator_code IN ({indicator_placeholders})
+        ORDER BY cl.country_code, cl.indicator_code;
+        """
+        params = tuple(country_codes) + tuple(indicator_codes)
+        return self.execute_query(sql, params)
+    
     def get_latest_data_all_countries(self, indicator_code: str) -> List[Dict[str, Any]]:
         """Lấy dữ liệu mới nhất cho tất cả quốc gia (cho bản đồ)"""
         sql = """
-        WITH LatestData AS (
-            SELECT 
-                country_code,
-                MAX(year) as latest_year
-            FROM country_data 
-            WHERE indicator_code = ? AND value IS NOT NULL
-            GROUP BY country_code
-        )
         SELECT 
-            cd.country_code,
-            cd.year,
-            cd.value,
+            cl.country_code,
+            cl.year,
+            cl.value,
             c.name as country_name,
             c.region,
             c.income_level,
             c.latitude,
             c.longitude,
             i.unit
-        FROM country_data cd
-        JOIN LatestData ld ON cd.country_code = ld.country_code AND cd.year = ld.latest_year
-        JOIN countries c ON cd.country_code = c.iso_code
-        JOIN indicators i ON cd.indicator_code = i.code
-        WHERE cd.indicator_code = ? AND cd.value IS NOT NULL
-        ORDER BY cd.value DESC;
+        FROM country_latest cl
+        JOIN countries c ON cl.country_code = c.iso_code
+        JOIN indicators i ON cl.indicator_code = i.code
+        WHERE cl.indicator_code = ?
+        ORDER BY cl.value DESC;
         """
-        return self.execute_query(sql, (indicator_code, indicator_code))
+        return self.execute_query(sql, (indicator_code,))
     
     def get_top_countries_by_indicator(self, indicator_code: str, limit: int = 10, year: Optional[int] = None) -> List[Dict[str, Any]]:
         """Lấy top countries theo chỉ số"""
@@ -190,35 +943,34 @@ class DatabaseManager:
         else:
             # Lấy năm mới nhất cho mỗi quốc gia
             sql = """
-            WITH LatestData AS (
-                SELECT 
-                    country_code,
-                    MAX(year) as latest_year
-                FROM country_data 
-                WHERE indicator_code = ? AND value IS NOT NULL
-                GROUP BY country_code
-            )
             SELECT 
-                cd.country_code,
-                cd.year,
-                cd.value,
+                cl.country_code,
+                cl.year,
+                cl.value,
                 c.name as country_name,
                 c.region,
                 i.unit
-            FROM country_data cd
-            JOIN LatestData ld ON cd.country_code = ld.country_code AND cd.year = ld.latest_year
-            JOIN countries c ON cd.country_code = c.iso_code
-            JOIN indicators i ON cd.indicator_code = i.code
-            WHERE cd.indicator_code = ? AND cd.value IS NOT NULL
-            ORDER BY cd.value DESC
+            FROM country_latest cl
+            JOIN countries c ON cl.country_code = c.iso_code
+            JOIN indicators i ON cl.indicator_code = i.code
+            WHERE cl.indicator_code = ?
+            ORDER BY cl.value DESC
             LIMIT ?;
             """
-            params = (indicator_code, indicator_code, limit)
+            params = (indicator_code, limit)
         
         return self.execute_query(sql, params)
     
     def get_indicator_trend(self, country_code: str, indicator_code: str, years_back: int = 10) -> List[Dict[str, Any]]:
         """Lấy xu hướng của chỉ số qua các năm"""
+        if self.packed_series:
+            series = self.get_country_series(country_code, [indicator_code]).get(indicator_code)
+            if not series:
+                return []
+            return [
+                {'year': point['year'], 'value': point['value'], 'unit': series['unit']}
+                for point in series['data'][:years_back]
+            ]
         sql = """
         SELECT 
             cd.year, 
@@ -258,89 +1010,246 @@ class DatabaseManager:
         else:
             # Lấy năm mới nhất cho mỗi quốc gia
             sql = f"""
-            WITH LatestData AS (
-                SELECT 
-                    country_code,
-                    MAX(year) as latest_year
-                FROM country_data 
-                WHERE country_code IN ({placeholders}) 
-                AND indicator_code = ? 
-                AND value IS NOT NULL
-                GROUP BY country_code
-            )
             SELECT 
-                cd.country_code,
-                cd.year,
-                cd.value,
+                cl.country_code,
+                cl.year,
+                cl.value,
                 c.name as country_name,
                 c.region,
                 i.unit
-            FROM country_data cd
-            JOIN LatestData ld ON cd.country_code = ld.country_code AND cd.year = ld.latest_year
-            JOIN countries c ON cd.country_code = c.iso_code
-            JOIN indicators i ON cd.indicator_code = i.code
-            WHERE cd.indicator_code = ?
-            ORDER BY cd.value DESC;
+            FROM country_latest cl
+            JOIN countries c ON cl.country_code = c.iso_code
+            JOIN indicators i ON cl.indicator_code = i.code
+            WHERE cl.indicator_code = ?
+            AND cl.country_code IN ({placeholders})
+            ORDER BY cl.value DESC;
             """
-            params = tuple(country_codes) + (indicator_code, indicator_code)
+            params = (indicator_code,) + tuple(country_codes)
         
         return self.execute_query(sql, params)
     
+    # ===== CHUỖI ĐÓNG GÓI =====
+    def _dirty_series(self, country_code: str) -> List[str]:
+        """Các chỉ số của quốc gia có country_series cũ hơn country_data (chỉ đọc; được đóng gói lại ở các lần ghi)"""
+        try:
+            with self._read_connection() as conn:
+                return [row[0] for row in conn.execute(
+                    "SELECT indicator_code FROM country_series_dirty WHERE country_code = ?;", (country_code,))]
+        except sqlite3.Error:
+            return []  # Database chưa có bảng country_series_dirty
+    
+    def _get_country_series_unpacked(self, country_code: str, indicator_codes: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cùng dạng với get_country_series nhưng đọc thẳng từ country_data (chuỗi đóng gói đã cũ)"""
+        sql = f"""
+        SELECT d.indicator_code, d.year, d.value, d.last_updated, i.name as indicator_name, i.unit
+        FROM country_data d
+        LEFT JOIN indicators i ON d.indicator_code = i.code
+        WHERE d.country_code = ? AND d.indicator_code IN ({','.join('?' for _ in indicator_codes)})
+        ORDER BY d.indicator_code, d.year DESC;
+        """
+        results = {}
+        for row in self.execute_query(sql, (country_code,) + tuple(indicator_codes)):
+            series = results.setdefault(row['indicator_code'], {
+                'indicator_code': row['indicator_code'],
+                'indicator_name': row['indicator_name'],
+                'unit': row['unit'],
+                'last_updated': None,
+                'data': [],
+            })
+            if row['last_updated'] and (series['last_updated'] is None or row['last_updated'] > series['last_updated']):
+                series['last_updated'] = row['last_updated']
+            series['data'].append({'year': row['year'], 'value': row['value']})
+        return results
+    
+    def get_country_series(self, country_code: str, indicator_codes: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """Đọc các chuỗi đóng gói của một quốc gia: indicator_code -> thông tin chỉ số + data (năm giảm dần)
+
+        Chuỗi bị ghi sau lần đóng gói cuối (country_series_dirty) được đóng gói lại trước khi đọc;
+        instance chỉ đọc thì đọc các chuỗi đó từ country_data.
+        """
+        sql = """
+        SELECT s.indicator_code, s.start_year, s.year_values, s.null_bitmap, s.row_bitmap, s.last_updated,
+               i.name as indicator_name, i.unit
+        FROM country_series s
+        LEFT JOIN indicators i ON s.indicator_code = i.code
+        WHERE s.country_code = ?
+        """
+        params: Tuple = (country_code,)
+        if indicator_codes is not None:
+            if not indicator_codes:
+                return {}
+            sql += f"AND s.indicator_code IN ({','.join('?' for _ in indicator_codes)})"
+            params += tuple(indicator_codes)
+        
+        dirty = self._dirty_series(country_code)
+        if indicator_codes is not None:
+            dirty = [code for code in dirty if code in indicator_codes]
+        results = self._get_country_series_unpacked(country_code, dirty) if dirty else {}
+        for row in self.execute_query(sql + ";", params):
+            if row['indicator_code'] in dirty:
+                continue
+            years, values, is_null = unpack_series(row['start_year'], row['year_values'],
+                                                   row['null_bitmap'], row['row_bitmap'])
+            data = [
+                {'year': year, 'value': None if null else value}
+                for year, value, null in zip(years.tolist()[::-1], values.tolist()[::-1], is_null.tolist()[::-1])
+            ]
+            results[row['indicator_code']] = {
+                'indicator_code': row['indicator_code'],
+                'indicator_name': row['indicator_name'],
+                'unit': row['unit'],
+                'last_updated': row['last_updated'],
+                'data': data,
+            }
+        return results
+    
+    def _get_country_data_packed(self, country_code: str, indicator_code: str) -> List[Dict[str, Any]]:
+        """get_country_data đọc từ country_series (last_updated là mốc mới nhất của cả chuỗi)"""
+        series = self.get_country_series(country_code, [indicator_code]).get(indicator_code)
+        country = self.get_country_by_code(country_code) if series else None
+        if not series or not country:
+            return []
+        return [
+            {
+                'country_code': country_code,
+                'indicator_code': indicator_code,
+                'year': point['year'],
+                'value': point['value'],
+                'last_updated': series['last_updated'],
+                'country_name': country['name'],
+                'indicator_name': series['indicator_name'],
+                'unit': series['unit'],
+            }
+            for point in series['data']
+        ]
+    
     # ===== DATABASE METADATA =====
     def get_database_stats(self) -> Dict[str, Any]:
-        """Lấy thống kê tổng quan về database"""
-        stats = {}
-        
-        # Số lượng quốc gia
-        result = self.execute_query("SELECT COUNT(*) as count FROM countries;")
-        stats['total_countries'] = result[0]['count'] if result else 0
-        
-        # Số lượng chỉ số
-        result = self.execute_query("SELECT COUNT(*) as count FROM indicators;")
-        stats['total_indicators'] = result[0]['count'] if result else 0
-        
-        # Số lượng bản ghi dữ liệu
-        result = self.execute_query("SELECT COUNT(*) as count FROM country_data;")
-        stats['total_data_records'] = result[0]['count'] if result else 0
-        
-        # Năm có dữ liệu
-        result = self.execute_query("SELECT MIN(year) as min_year, MAX(year) as max_year FROM country_data;")
-        if result and result[0]:
+        """Lấy thống kê tổng quan về database (từ bảng db_metadata tính sẵn)"""
+        metadata = self._get_metadata()
+        stats = {
+            'total_countries': metadata.get('total_countries', 0),
+            'total_indicators': metadata.get('total_indicators', 0),
+            'total_data_records': metadata.get('total_data_records', 0),
+            'categories': metadata.get('categories', []),
+            'regions': metadata.get('regions', []),
+        }
+        # Chưa có dữ liệu thì không có year_range
+        if metadata.get('min_year') is not None:
             stats['year_range'] = {
-                'min': result[0]['min_year'],
-                'max': result[0]['max_year']
+                'min': metadata.get('min_year'),
+                'max': metadata.get('max_year')
             }
-        
-        # Categories có sẵn
-        result = self.execute_query("SELECT DISTINCT category FROM indicators WHERE category IS NOT NULL;")
-        stats['categories'] = [row['category'] for row in result] if result else []
-        
-        # Regions có sẵn
-        result = self.execute_query("SELECT DISTINCT region FROM countries WHERE region IS NOT NULL;")
-        stats['regions'] = [row['region'] for row in result] if result else []
-        
         return stats
     
     def get_available_years(self, indicator_code: Optional[str] = None) -> List[int]:
-        """Lấy danh sách năm có dữ liệu"""
+        """Lấy danh sách năm có dữ liệu (giảm dần) từ bitmap năm của indicator_years"""
+        if not self._metadata_is_current():
+            # Metadata chưa được tính / bị ghi từ ngoài mà chưa tính lại: quét trực tiếp country_data
+            if indicator_code:
+                sql = "SELECT DISTINCT year FROM country_data WHERE indicator_code = ? ORDER BY year DESC;"
+                results = self.execute_query(sql, (indicator_code,))
+            else:
+                sql = "SELECT DISTINCT year FROM country_data ORDER BY year DESC;"
+                results = self.execute_query(sql)
+            return [row['year'] for row in results] if results else []
+        
         if indicator_code:
-            sql = "SELECT DISTINCT year FROM country_data WHERE indicator_code = ? ORDER BY year DESC;"
+            sql = "SELECT min_year, year_bitmap FROM indicator_years WHERE indicator_code = ?;"
             results = self.execute_query(sql, (indicator_code,))
         else:
-            sql = "SELECT DISTINCT year FROM country_data ORDER BY year DESC;"
+            sql = "SELECT min_year, year_bitmap FROM indicator_years;"
             results = self.execute_query(sql)
-        
-        return [row['year'] for row in results] if results else []
+        years = set()
+        for row in results:
+            years.update(decode_year_bitmap(row['min_year'], row['year_bitmap']))
+        return sorted(years, reverse=True)
     
     def close_connection(self):
         """Đóng kết nối database"""
+        if self.pool:
+            self.pool.close_all()
+        if self._version_conn:
+            self._version_conn.close()
+        if self._memory_anchor is not None:
+            self._memory_anchor.close()
         if self.conn:
             self.conn.close()
             print("Đã đóng kết nối database")
 
 # Factory function với database mặc định là worldbank.db
-def create_database_manager(db_path: str = "worldbank.db"):
-    return DatabaseManager(db_path)
+def create_database_manager(db_path: str = "worldbank.db", pool_size: int = 4, auto_migrate: Optional[bool] = None,
+                            cache_size: int = 0, cache_ttl: Optional[float] = 300.0,
+                            enable_metrics: bool = True, slow_query_ms: Optional[float] = None,
+                            serving: bool = False, mmap_size: Optional[int] = None,
+                            page_cache_size: Optional[int] = None, in_memory: bool = False,
+                            memory_limit_mb: Optional[float] = DEFAULT_MEMORY_LIMIT_MB,
+                            snapshot_pointer: Optional[str] = None, packed_series: bool = False):
+    """auto_migrate=None: chỉ tạo schema cho database mới, True: luôn migrate, False: không bao giờ
+    serving=True: mở file chỉ đọc với immutable=1, mmap và temp_store trong RAM (cho node chỉ phục vụ đọc)
+    in_memory=True: chép cả file vào RAM khi khởi động (dùng file trên đĩa nếu vượt memory_limit_mb)
+    snapshot_pointer: đọc snapshot do db_snapshot công bố (serving), tự mở lại khi snapshot mới được công bố
+    packed_series=True: get_country_data / get_indicator_trend đọc từ country_series
+    """
+    return DatabaseManager(db_path, pool_size=pool_size, auto_migrate=auto_migrate,
+                           cache_size=cache_size, cache_ttl=cache_ttl,
+                           enable_metrics=enable_metrics, slow_query_ms=slow_query_ms,
+                           serving=serving, mmap_size=mmap_size, page_cache_size=page_cache_size,
+                           in_memory=in_memory, memory_limit_mb=memory_limit_mb,
+                           snapshot_pointer=snapshot_pointer, packed_series=packed_series)
+
+class LazyDatabaseManager:
+    """Instance mặc định: chỉ mở (và tạo) worldbank.db ở lần dùng đầu tiên, không phải khi import module"""
+    
+    def __init__(self, factory: Callable[[], DatabaseManager] = create_database_manager):
+        self._factory = factory
+        self._instance: Optional[DatabaseManager] = None
+        self._lock = threading.Lock()
+    
+    def get_instance(self) -> DatabaseManager:
+        """DatabaseManager thật phía sau, tạo nếu chưa có"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+    
+    def set_instance(self, instance: Optional[DatabaseManager]):
+        """Dùng một DatabaseManager khác làm mặc định (None: tạo lại từ factory ở lần dùng sau)"""
+        with self._lock:
+            self._instance = instance
+    
+    def __getattr__(self, name: str) -> Any:
+        # Thuộc tính đặc biệt (__mro__, __wrapped__...) do công cụ dò xét hỏi tới không được mở database
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_instance(), name)
+
+# Instance mặc định để sử dụng trực tiếp
+db_manager = LazyDatabaseManager()
 
-# Tạo instance mặc định để sử dụng trực tiếp
-db_manager = create_database_manager()
\ No newline at end of file
+if __name__ == "__main__":
+    # python database_manager.py migrate  -> áp dụng migration còn thiếu
+    # python database_manager.py dedupe -> xoá dòng trùng trong country_data (giữ dòng ghi sau cùng)
+    # python database_manager.py explain [COUNTRY] [INDICATOR] -> in EXPLAIN QUERY PLAN
+    # python database_manager.py metadata -> tính lại db_metadata / indicator_years
+    # python database_manager.py series -> đóng gói lại toàn bộ country_series
+    command = sys.argv[1] if len(sys.argv) > 1 else "explain"
+    if command == "migrate":
+        applied = db_manager.ensure_schema()
+        print(f"Schema version: {db_manager.get_schema_version()} (da ap dung: {applied or 'khong co'})")
+    elif command == "dedupe":
+        total, examples = db_manager.find_duplicate_rows()
+        print(f"So bo bi trung: {total} {examples if examples else ''}")
+        if total:
+            print(f"Da xoa {db_manager.dedupe_country_data()} dong trung")
+    elif command == "explain":
+        db_manager.print_query_plans(*sys.argv[2:4])
+    elif command == "metadata":
+        if db_manager.refresh_metadata():
+            print(f"Thong ke database: {db_manager.get_database_stats()}")
+    elif command == "series":
+        if db_manager.refresh_country_series():
+            print("Da dong goi lai country_series")
+    else:
+        print("Cach dung: python database_manager.py [migrate | dedupe | explain [COUNTRY] [INDICATOR] | metadata | series]")
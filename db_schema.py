@@ -0,0 +1,598 @@
+import itertools
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+
+# Tính lại bảng country_latest từ country_data: dòng mới nhất khác NULL của mỗi chuỗi
+COUNTRY_LATEST_REBUILD_SQL = """
+INSERT INTO country_latest (indicator_code, country_code, year, value, last_updated)
+SELECT indicator_code, country_code, year, value, last_updated
+FROM (
+    SELECT indicator_code, country_code, year, value, last_updated,
+           ROW_NUMBER() OVER (
+               PARTITION BY indicator_code, country_code
+               ORDER BY year DESC
+           ) as rn
+    FROM country_data
+    WHERE value IS NOT NULL
+)
+WHERE rn = 1;
+"""
+
+# Trigger giữ country_latest đồng bộ với country_data
+COUNTRY_LATEST_TRIGGERS = [
+    # Thêm dòng: chỉ thay thế nếu năm mới hơn hoặc bằng năm đang lưu
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_country_data_latest_insert
+    AFTER INSERT ON country_data
+    WHEN NEW.value IS NOT NULL
+    BEGIN
+        INSERT INTO country_latest (indicator_code, country_code, year, value, last_updated)
+        VALUES (NEW.indicator_code, NEW.country_code, NEW.year, NEW.value, NEW.last_updated)
+        ON CONFLICT (indicator_code, country_code) DO UPDATE
+        SET year = excluded.year, value = excluded.value, last_updated = excluded.last_updated
+        WHERE excluded.year >= country_latest.year;
+    END;
+    """,
+    # Sửa / xóa dòng: tính lại giá trị mới nhất của chuỗi bị ảnh hưởng
+    # (không dùng INSERT OR REPLACE: khi câu lệnh ngoài là UPSERT, SQLite bỏ qua OR REPLACE trong trigger)
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_country_data_latest_update
+    AFTER UPDATE OF country_code, indicator_code, year, value, last_updated ON country_data
+    BEGIN
+        DELETE FROM country_latest
+        WHERE (indicator_code = OLD.indicator_code AND country_code = OLD.country_code)
+           OR (indicator_code = NEW.indicator_code AND country_code = NEW.country_code);
+        INSERT INTO country_latest (indicator_code, country_code, year, value, last_updated)
+        SELECT indicator_code, country_code, year, value, last_updated
+        FROM country_data
+        WHERE indicator_code = OLD.indicator_code AND country_code = OLD.country_code
+        AND value IS NOT NULL
+        ORDER BY year DESC
+        LIMIT 1;
+        INSERT INTO country_latest (indicator_code, country_code, year, value, last_updated)
+        SELECT indicator_code, country_code, year, value, last_updated
+        FROM country_data
+        WHERE indicator_code = NEW.indicator_code AND country_code = NEW.country_code
+        AND (NEW.indicator_code <> OLD.indicator_code OR NEW.country_code <> OLD.country_code)
+        AND value IS NOT NULL
+        ORDER BY year DESC
+        LIMIT 1;
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_country_data_latest_delete
+    AFTER DELETE ON country_data
+    BEGIN
+        DELETE FROM country_latest
+        WHERE indicator_code = OLD.indicator_code AND country_code = OLD.country_code;
+        INSERT INTO country_latest (indicator_code, country_code, year, value, last_updated)
+        SELECT indicator_code, country_code, year, value, last_updated
+        FROM country_data
+        WHERE indicator_code = OLD.indicator_code AND country_code = OLD.country_code
+        AND value IS NOT NULL
+        ORDER BY year DESC
+        LIMIT 1;
+    END;
+    """,
+]
+COUNTRY_LATEST_TRIGGER_NAMES = [
+    'trg_country_data_latest_insert',
+    'trg_country_data_latest_update',
+    'trg_country_data_latest_delete',
+]
+
+# ===== METADATA TÍNH SẴN =====
+def encode_year_bitmap(years: Iterable[int]) -> Tuple[int, bytes]:
+    """Mã hóa tập năm thành (năm đầu, bitmap): bit k bật nghĩa là có dữ liệu năm (năm đầu + k)"""
+    years = list(years)
+    if not years:
+        return 0, b""
+    base_year = min(years)
+    bits = 0
+    for year in years:
+        bits |= 1 << (year - base_year)
+    return base_year, bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+def decode_year_bitmap(base_year: int, bitmap: bytes) -> List[int]:
+    """Giải mã bitmap năm thành danh sách năm tăng dần"""
+    bits = int.from_bytes(bitmap or b"", 'little')
+    years = []
+    offset = 0
+    while bits:
+        if bits & 1:
+            years.append(base_year + offset)
+        bits >>= 1
+        offset += 1
+    return years
+
+def compute_db_metadata(conn: sqlite3.Connection) -> Tuple[Dict[str, Any], List[Tuple[str, int, int, int, bytes]]]:
+    """Tính thống kê database và độ phủ năm của từng chỉ số (một lần quét country_data)"""
+    years_by_indicator: Dict[str, List[int]] = {}
+    counts_by_indicator: Dict[str, int] = {}
+    cursor = conn.execute(
+        "SELECT indicator_code, year, COUNT(*) FROM country_data GROUP BY indicator_code, year;"
+    )
+    for indicator_code, year, count in cursor:
+        years_by_indicator.setdefault(indicator_code, []).append(year)
+        counts_by_indicator[indicator_code] = counts_by_indicator.get(indicator_code, 0) + count
+
+    indicator_years = []
+    for indicator_code, years in years_by_indicator.items():
+        base_year, bitmap = encode_year_bitmap(years)
+        indicator_years.append((indicator_code, base_year, max(years), counts_by_indicator[indicator_code], bitmap))
+
+    all_years = [year for years in years_by_indicator.values() for year in years]
+    metadata = {
+        'total_countries': conn.execute("SELECT COUNT(*) FROM countries;").fetchone()[0],
+        'total_indicators': conn.execute("SELECT COUNT(*) FROM indicators;").fetchone()[0],
+        'total_data_records': sum(counts_by_indicator.values()),
+        'min_year': min(all_years) if all_years else None,
+        'max_year': max(all_years) if all_years else None,
+        'categories': [row[0] for row in conn.execute(
+            "SELECT DISTINCT category FROM indicators WHERE category IS NOT NULL;")],
+        'regions': [row[0] for row in conn.execute(
+            "SELECT DISTINCT region FROM countries WHERE region IS NOT NULL;")],
+        'refreshed_at': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return metadata, indicator_years
+
+# Ghi làm đổi thống kê / độ phủ năm thì đánh dấu db_metadata cũ (chỉ đổi value thì không ảnh hưởng)
+METADATA_STALE_KEY = 'stale'
+METADATA_STALE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_{table}_metadata_{name}
+    AFTER {event} ON {table}
+    BEGIN
+        -- Không dùng OR IGNORE: trong trigger, cách xử lý xung đột của câu lệnh ngoài (UPSERT) được áp dụng
+        INSERT INTO db_metadata (key, value)
+        SELECT '{METADATA_STALE_KEY}', 'true'
+        WHERE NOT EXISTS (SELECT 1 FROM db_metadata WHERE key = '{METADATA_STALE_KEY}');
+    END;
+    """
+    for table, name, event in [
+        ('country_data', 'insert', 'INSERT'),
+        ('country_data', 'delete', 'DELETE'),
+        ('country_data', 'update', 'UPDATE OF country_code, indicator_code, year'),
+        ('countries', 'insert', 'INSERT'),
+        ('countries', 'delete', 'DELETE'),
+        ('countries', 'update', 'UPDATE OF region'),
+        ('indicators', 'insert', 'INSERT'),
+        ('indicators', 'delete', 'DELETE'),
+        ('indicators', 'update', 'UPDATE OF category'),
+    ]
+]
+
+# Bộ đếm lần ghi lưu trong db_metadata: bền giữa các tiến trình (khác data_version của DatabaseManager),
+# dùng để biết bản xuất (Parquet) có còn khớp với database không
+WRITE_COUNTER_KEY = 'write_counter'
+
+def bump_write_counter(conn: sqlite3.Connection):
+    """Tăng bộ đếm lần ghi (chạy trong transaction của người gọi); bỏ qua khi chưa có db_metadata"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'db_metadata';").fetchone() is None:
+        return
+    conn.execute(
+        "INSERT INTO db_metadata (key, value) VALUES (?, '1') "
+        "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1;",
+        (WRITE_COUNTER_KEY,)
+    )
+
+def read_write_counter(conn: sqlite3.Connection) -> Optional[int]:
+    """Giá trị bộ đếm lần ghi (0 nếu chưa ghi lần nào, None nếu chưa có bảng db_metadata)"""
+    try:
+        row = conn.execute("SELECT value FROM db_metadata WHERE key = ?;", (WRITE_COUNTER_KEY,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return int(row[0]) if row else 0
+
+def db_metadata_is_stale(conn: sqlite3.Connection) -> bool:
+    """db_metadata chưa được tính, hoặc đã bị trigger đánh dấu cũ"""
+    keys = {row[0] for row in conn.execute(
+        "SELECT key FROM db_metadata WHERE key IN (?, 'total_data_records');", (METADATA_STALE_KEY,))}
+    return keys != {'total_data_records'}
+
+def refresh_db_metadata(conn: sqlite3.Connection):
+    """Tính lại db_metadata và indicator_years (chạy trong transaction của người gọi)"""
+    metadata, indicator_years = compute_db_metadata(conn)
+    conn.execute("DELETE FROM db_metadata WHERE key != ?;", (WRITE_COUNTER_KEY,))
+    conn.executemany(
+        "INSERT INTO db_metadata (key, value) VALUES (?, ?);",
+        [(key, json.dumps(value, ensure_ascii=False)) for key, value in metadata.items()]
+    )
+    conn.execute("DELETE FROM indicator_years;")
+    conn.executemany(
+        "INSERT INTO indicator_years (indicator_code, min_year, max_year, record_count, year_bitmap) "
+        "VALUES (?, ?, ?, ?, ?);",
+        indicator_years
+    )
+
+def refresh_db_metadata_if_stale(conn: sqlite3.Connection) -> bool:
+    """Chỉ tính lại db_metadata khi đã bị đánh dấu cũ (lần nạp chỉ đổi giá trị không phải quét lại country_data)"""
+    if not db_metadata_is_stale(conn):
+        return False
+    refresh_db_metadata(conn)
+    return True
+
+# ===== CHUỖI ĐÓNG GÓI (country_series) =====
+# Mỗi chuỗi (country_code, indicator_code) là một dòng: mảng float64 little-endian từ start_year tới end_year,
+# null_bitmap (bit k = 1: năm start_year + k không có giá trị) và row_bitmap (bit k = 1: có dòng trong country_data)
+UPSERT_COUNTRY_SERIES_SQL = """
+INSERT OR REPLACE INTO country_series
+    (country_code, indicator_code, start_year, end_year, point_count, year_values, null_bitmap, row_bitmap, last_updated)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+def pack_series(points: List[Tuple[int, Optional[float]]]) -> Tuple[int, int, bytes, bytes, bytes]:
+    """Đóng gói các điểm (year, value) thành (start_year, end_year, year_values, null_bitmap, row_bitmap)"""
+    years = np.array([year for year, _ in points], dtype=np.int64)
+    start_year, end_year = int(years.min()), int(years.max())
+    size = end_year - start_year + 1
+    values = np.zeros(size, dtype='<f8')
+    has_row = np.zeros(size, dtype=bool)
+    is_null = np.ones(size, dtype=bool)
+    for (year, value), offset in zip(points, (years - start_year).tolist()):
+        has_row[offset] = True
+        if value is not None:
+            values[offset] = value
+            is_null[offset] = False
+    return (start_year, end_year, values.tobytes(),
+            np.packbits(is_null, bitorder='little').tobytes(),
+            np.packbits(has_row, bitorder='little').tobytes())
+
+def unpack_series(start_year: int, year_values: bytes, null_bitmap: bytes,
+                  row_bitmap: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Giải nén chuỗi thành (years, values, null_mask) chỉ gồm các năm có dòng, tăng dần theo năm"""
+    values = np.frombuffer(year_values, dtype='<f8')
+    size = len(values)
+    is_null = np.unpackbits(np.frombuffer(null_bitmap, dtype=np.uint8), count=size, bitorder='little').astype(bool)
+    has_row = np.unpackbits(np.frombuffer(row_bitmap, dtype=np.uint8), count=size, bitorder='little').astype(bool)
+    offsets = np.flatnonzero(has_row)
+    return offsets + start_year, values[offsets], is_null[offsets]
+
+def _write_series(conn: sqlite3.Connection, rows: Iterable[Tuple[str, str, int, Optional[float], Optional[str]]],
+                  batch_size: int = 1000) -> int:
+    """Đóng gói các dòng country_data (đã sắp theo country_code, indicator_code) và ghi vào country_series"""
+    batch = []
+    written = 0
+    for (country_code, indicator_code), group in itertools.groupby(rows, key=lambda row: (row[0], row[1])):
+        group = list(group)
+        stamps = [row[4] for row in group if row[4]]
+        start_year, end_year, year_values, null_bitmap, row_bitmap = pack_series([(row[2], row[3]) for row in group])
+        batch.append((country_code, indicator_code, start_year, end_year, len(group),
+                      year_values, null_bitmap, row_bitmap, max(stamps) if stamps else None))
+        if len(batch) >= batch_size:
+            conn.executemany(UPSERT_COUNTRY_SERIES_SQL, batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(UPSERT_COUNTRY_SERIES_SQL, batch)
+        written += len(batch)
+    return written
+
+# Ghi country_data ngoài các đường nạp dữ liệu: đánh dấu chuỗi cần đóng gói lại trong country_series_dirty
+def _mark_series_dirty(row: str) -> str:
+    return f"""
+        INSERT INTO country_series_dirty (country_code, indicator_code)
+        SELECT {row}.country_code, {row}.indicator_code
+        WHERE NOT EXISTS (
+            SELECT 1 FROM country_series_dirty
+            WHERE country_code = {row}.country_code AND indicator_code = {row}.indicator_code
+        );"""
+
+COUNTRY_SERIES_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_country_data_series_{name}
+    AFTER {event} ON country_data
+    BEGIN{''.join(_mark_series_dirty(row) for row in rows)}
+    END;
+    """
+    for name, event, rows in [
+        ('insert', 'INSERT', ['NEW']),
+        ('update', 'UPDATE', ['NEW', 'OLD']),
+        ('delete', 'DELETE', ['OLD']),
+    ]
+]
+COUNTRY_SERIES_TRIGGER_NAMES = [
+    'trg_country_data_series_insert',
+    'trg_country_data_series_update',
+    'trg_country_data_series_delete',
+]
+
+def _clear_dirty_series(conn: sqlite3.Connection, pairs: Optional[Iterable[Tuple[str, str]]] = None):
+    """Bỏ đánh dấu các chuỗi vừa đóng gói lại (None = tất cả); bỏ qua khi chưa có bảng (trước migration 9)"""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'country_series_dirty';").fetchone() is None:
+        return
+    if pairs is None:
+        conn.execute("DELETE FROM country_series_dirty;")
+    else:
+        conn.executemany("DELETE FROM country_series_dirty WHERE country_code = ? AND indicator_code = ?;", pairs)
+
+def rebuild_country_series(conn: sqlite3.Connection) -> int:
+    """Tính lại toàn bộ country_series từ country_data (chạy trong transaction của người gọi)"""
+    conn.execute("DELETE FROM country_series;")
+    cursor = conn.execute("""
+        SELECT country_code, indicator_code, year, value, last_updated
+        FROM country_data
+        ORDER BY country_code, indicator_code, year;
+    """)
+    written = _write_series(conn, cursor)
+    _clear_dirty_series(conn)
+    return written
+
+def refresh_country_series(conn: sqlite3.Connection, pairs: Iterable[Tuple[str, str]]) -> int:
+    """Đóng gói lại các chuỗi (country_code, indicator_code) đã thay đổi"""
+    pairs = set(pairs)
+    written = 0
+    for country_code, indicator_code in pairs:
+        rows = conn.execute("""
+            SELECT country_code, indicator_code, year, value, last_updated
+            FROM country_data
+            WHERE country_code = ? AND indicator_code = ?
+            ORDER BY year;
+        """, (country_code, indicator_code)).fetchall()
+        if rows:
+            written += _write_series(conn, rows)
+        else:
+            conn.execute("DELETE FROM country_series WHERE country_code = ? AND indicator_code = ?;",
+                         (country_code, indicator_code))
+    _clear_dirty_series(conn, pairs)
+    return written
+
+def repair_derived_tables(conn: sqlite3.Connection) -> bool:
+    """Tính lại db_metadata nếu bị đánh dấu cũ và đóng gói lại các chuỗi trong country_series_dirty
+
+    Chạy trong transaction ghi của người gọi trước khi commit, để các hàm đọc không phải ghi;
+    bỏ qua các bảng chưa có (database trước migration 6 / 9). Trả về True nếu có thay đổi
+    """
+    tables = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name IN ('db_metadata', 'country_series_dirty');")}
+    changed = False
+    if 'country_series_dirty' in tables:
+        pairs = conn.execute("SELECT country_code, indicator_code FROM country_series_dirty;").fetchall()
+        if pairs:
+            refresh_country_series(conn, [tuple(pair) for pair in pairs])
+            changed = True
+    if 'db_metadata' in tables:
+        changed = refresh_db_metadata_if_stale(conn) or changed
+    return changed
+
+def find_country_data_duplicates(conn: sqlite3.Connection, limit: Optional[int] = 10) -> Tuple[int, List[Dict[str, Any]]]:
+    """Đếm các bộ (country_code, indicator_code, year) bị trùng trong country_data và trả về vài ví dụ"""
+    duplicate_sql = """
+        SELECT country_code, indicator_code, year, COUNT(*) AS row_count
+        FROM country_data
+        GROUP BY country_code, indicator_code, year
+        HAVING COUNT(*) > 1
+    """
+    total = conn.execute(f"SELECT COUNT(*) FROM ({duplicate_sql});").fetchone()[0]
+    examples = []
+    if total and limit:
+        rows = conn.execute(duplicate_sql + " ORDER BY country_code, indicator_code, year LIMIT ?;", (limit,)).fetchall()
+        examples = [dict(zip(('country_code', 'indicator_code', 'year', 'row_count'), row)) for row in rows]
+    return total, examples
+
+def dedupe_country_data(conn: sqlite3.Connection) -> int:
+    """Xoá các dòng trùng trong country_data, giữ dòng được ghi sau cùng (chạy trong transaction của người gọi)
+
+    Chỉ chạy khi người dùng yêu cầu rõ ràng (python database_manager.py dedupe), migration không tự xoá dữ liệu
+    """
+    cursor = conn.execute("""
+        DELETE FROM country_data
+        WHERE rowid NOT IN (
+            SELECT MAX(rowid) FROM country_data
+            GROUP BY country_code, indicator_code, year
+        );
+    """)
+    return cursor.rowcount
+
+def _require_unique_country_data(conn: sqlite3.Connection):
+    """Dừng migration 4 nếu country_data còn dòng trùng, thay vì tự xoá dữ liệu của người dùng"""
+    total, examples = find_country_data_duplicates(conn)
+    if total:
+        sample = ", ".join(f"{row['country_code']}/{row['indicator_code']}/{row['year']} (x{row['row_count']})"
+                           for row in examples)
+        raise sqlite3.IntegrityError(
+            f"country_data co {total} bo (country_code, indicator_code, year) bi trung: {sample}. "
+            "Kiem tra du lieu roi chay 'python database_manager.py dedupe' truoc khi migrate"
+        )
+
+# Danh sách migration theo thứ tự: (phiên bản, mô tả, các câu lệnh SQL)
+# Một bước có thể là hàm nhận connection (dùng cho back-fill tính bằng Python)
+# Phiên bản hiện tại của database được lưu trong PRAGMA user_version
+SCHEMA_MIGRATIONS: List[Tuple[int, str, List[Union[str, Callable[[sqlite3.Connection], None]]]]] = [
+    (1, "Bang co so countries / indicators / country_data", [
+        """
+        CREATE TABLE IF NOT EXISTS countries (
+            iso_code TEXT PRIMARY KEY,
+            iso2_code TEXT,
+            name TEXT NOT NULL,
+            region TEXT,
+            income_level TEXT,
+            latitude REAL,
+            longitude REAL
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS indicators (
+            code TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            unit TEXT,
+            description TEXT,
+            category TEXT
+        );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS country_data (
+            country_code TEXT NOT NULL,
+            indicator_code TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            value REAL,
+            last_updated TEXT
+        );
+        """,
+    ]),
+    (2, "Index bao phu cho cac truy van country_data", [
+        # Bản đồ / top-N: lọc theo chỉ số, nhóm theo quốc gia, lấy năm lớn nhất và giá trị
+        """
+        CREATE INDEX IF NOT EXISTS idx_country_data_indicator_country_year_value
+        ON country_data (indicator_code, country_code, year, value);
+        """,
+        # Dữ liệu / xu hướng của một quốc gia cho một chỉ số
+        """
+        CREATE INDEX IF NOT EXISTS idx_country_data_country_indicator_year
+        ON country_data (country_code, indicator_code, year);
+        """,
+        # DISTINCT year, MIN/MAX(year)
+        """
+        CREATE INDEX IF NOT EXISTS idx_country_data_year
+        ON country_data (year);
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_countries_iso2_code ON countries (iso2_code);",
+        "CREATE INDEX IF NOT EXISTS idx_indicators_category ON indicators (category);",
+    ]),
+    (3, "Bang country_latest (gia tri moi nhat khac NULL) duoc trigger cap nhat", [
+        """
+        CREATE TABLE IF NOT EXISTS country_latest (
+            indicator_code TEXT NOT NULL,
+            country_code TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            value REAL NOT NULL,
+            last_updated TEXT,
+            PRIMARY KEY (indicator_code, country_code)
+        ) WITHOUT ROWID;
+        """,
+        # Top-N / bản đồ: sắp xếp theo giá trị trong một chỉ số
+        """
+        CREATE INDEX IF NOT EXISTS idx_country_latest_indicator_value
+        ON country_latest (indicator_code, value DESC);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_country_latest_country
+        ON country_latest (country_code, indicator_code);
+        """,
+        "DELETE FROM country_latest;",
+        COUNTRY_LATEST_REBUILD_SQL,
+        *COUNTRY_LATEST_TRIGGERS,
+    ]),
+    (4, "Khoa duy nhat (country_code, indicator_code, year) cho upsert", [
+        # Không tự xoá dòng trùng: báo lỗi kèm danh sách để người dùng chạy dedupe
+        _require_unique_country_data,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_country_data_country_indicator_year
+        ON country_data (country_code, indicator_code, year);
+        """,
+        # Index duy nhất đã bao gồm các cột này
+        "DROP INDEX IF EXISTS idx_country_data_country_indicator_year;",
+    ]),
+    (5, "Sua trigger cap nhat country_latest khi ghi bang UPSERT", [
+        "DROP TRIGGER IF EXISTS trg_country_data_latest_update;",
+        COUNTRY_LATEST_TRIGGERS[1],
+    ]),
+    (6, "Bang db_metadata va indicator_years (bitmap nam) tinh san", [
+        # Thống kê tổng quan: mỗi key lưu một giá trị JSON
+        """
+        CREATE TABLE IF NOT EXISTS db_metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        ) WITHOUT ROWID;
+        """,
+        # Độ phủ năm của từng chỉ số: bit k của year_bitmap = năm (min_year + k)
+        """
+        CREATE TABLE IF NOT EXISTS indicator_years (
+            indicator_code TEXT PRIMARY KEY,
+            min_year INTEGER NOT NULL,
+            max_year INTEGER NOT NULL,
+            record_count INTEGER NOT NULL,
+            year_bitmap BLOB NOT NULL
+        ) WITHOUT ROWID;
+        """,
+        refresh_db_metadata,
+    ]),
+    (7, "Bang country_series: moi chuoi (quoc gia, chi so) la mot mang float64 dong goi", [
+        """
+        CREATE TABLE IF NOT EXISTS country_series (
+            country_code TEXT NOT NULL,
+            indicator_code TEXT NOT NULL,
+            start_year INTEGER NOT NULL,
+            end_year INTEGER NOT NULL,
+            point_count INTEGER NOT NULL,
+            year_values BLOB NOT NULL,
+            null_bitmap BLOB NOT NULL,
+            row_bitmap BLOB NOT NULL,
+            last_updated TEXT,
+            PRIMARY KEY (country_code, indicator_code)
+        ) WITHOUT ROWID;
+        """,
+        rebuild_country_series,
+    ]),
+    (8, "Trigger danh dau db_metadata cu khi ghi countries / indicators / country_data", METADATA_STALE_TRIGGERS),
+    (9, "Bang country_series_dirty: chuoi can dong goi lai sau khi country_data bi ghi", [
+        """
+        CREATE TABLE IF NOT EXISTS country_series_dirty (
+            country_code TEXT NOT NULL,
+            indicator_code TEXT NOT NULL,
+            PRIMARY KEY (country_code, indicator_code)
+        ) WITHOUT ROWID;
+        """,
+        *COUNTRY_SERIES_TRIGGERS,
+    ]),
+]
+
+def latest_schema_version() -> int:
+    """Phiên bản schema mới nhất mà code hỗ trợ"""
+    return SCHEMA_MIGRATIONS[-1][0] if SCHEMA_MIGRATIONS else 0
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Đọc phiên bản schema hiện tại của database"""
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+def apply_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Áp dụng các migration còn thiếu, mỗi migration trong một transaction riêng"""
+    applied = []
+    current = get_schema_version(conn)
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN")
+            for statement in statements:
+                if callable(statement):
+                    statement(conn)
+                else:
+                    conn.execute(statement)
+            # PRAGMA không hỗ trợ tham số, version luôn là số nguyên trong code
+            conn.execute(f"PRAGMA user_version = {int(version)};")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Da ap dung migration {version}: {description}")
+        applied.append(version)
+    return applied
+
+def rebuild_country_latest(conn: sqlite3.Connection):
+    """Tính lại toàn bộ country_latest (chạy trong transaction của người gọi)"""
+    conn.execute("DELETE FROM country_latest;")
+    conn.execute(COUNTRY_LATEST_REBUILD_SQL)
+
+def drop_country_latest_triggers(conn: sqlite3.Connection):
+    """Tạm bỏ trigger country_latest khi nạp dữ liệu lớn (sau đó gọi rebuild + create lại)"""
+    for name in COUNTRY_LATEST_TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name};")
+
+def create_country_latest_triggers(conn: sqlite3.Connection):
+    """Tạo lại trigger country_latest"""
+    for statement in COUNTRY_LATEST_TRIGGERS:
+        conn.execute(statement)
+
+def drop_country_series_triggers(conn: sqlite3.Connection):
+    """Tạm bỏ trigger đánh dấu country_series khi nạp dữ liệu lớn (sau đó gọi rebuild_country_series + create lại)"""
+    for name in COUNTRY_SERIES_TRIGGER_NAMES:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name};")
+
+def create_country_series_triggers(conn: sqlite3.Connection):
+    """Tạo lại trigger đánh dấu country_series"""
+    for statement in COUNTRY_SERIES_TRIGGERS:
+        conn.execute(statement)
@@ -0,0 +1,181 @@
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+from db_schema import METADATA_STALE_KEY, latest_schema_version, refresh_db_metadata_if_stale
+
+# File con trỏ chứa đường dẫn tới snapshot đang được phục vụ
+DEFAULT_SNAPSHOT_POINTER = "worldbank.current"
+DEFAULT_SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_PREFIX = "worldbank_"
+
+def _snapshot_path(snapshot_dir: str, vintage: str) -> str:
+    return os.path.join(snapshot_dir, f"{SNAPSHOT_PREFIX}{vintage}.db")
+
+def validate_snapshot(path: str) -> List[str]:
+    """Kiểm tra một file snapshot, trả về danh sách lỗi (rỗng nếu hợp lệ)"""
+    if not os.path.exists(path):
+        return [f"Khong tim thay file: {path}"]
+    problems = []
+    conn = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+    try:
+        check = conn.execute("PRAGMA quick_check;").fetchone()[0]
+        if check != "ok":
+            problems.append(f"quick_check that bai: {check}")
+
+        version = conn.execute("PRAGMA user_version;").fetchone()[0]
+        if version != latest_schema_version():
+            problems.append(f"Schema version {version}, can {latest_schema_version()}")
+            return problems
+
+        for table in ("countries", "indicators", "country_data", "country_latest"):
+            if conn.execute(f"SELECT 1 FROM {table} LIMIT 1;").fetchone() is None:
+                problems.append(f"Bang {table} rong")
+
+        # country_latest và db_metadata phải khớp với country_data
+        expected_latest = conn.execute("""
+            SELECT COUNT(*) FROM (
+                SELECT DISTINCT indicator_code, country_code FROM country_data WHERE value IS NOT NULL
+            );
+        """).fetchone()[0]
+        actual_latest = conn.execute("SELECT COUNT(*) FROM country_latest;").fetchone()[0]
+        if expected_latest != actual_latest:
+            problems.append(f"country_latest co {actual_latest} dong, can {expected_latest}")
+
+        total_records = conn.execute("SELECT COUNT(*) FROM country_data;").fetchone()[0]
+        row = conn.execute("SELECT value FROM db_metadata WHERE key = 'total_data_records';").fetchone()
+        if row is None or int(row[0]) != total_records:
+            problems.append(f"db_metadata chua cap nhat (total_data_records = {row[0] if row else None}, "
+                            f"thuc te {total_records})")
+        elif conn.execute("SELECT 1 FROM db_metadata WHERE key = ?;", (METADATA_STALE_KEY,)).fetchone():
+            problems.append("db_metadata bi danh dau cu, can tinh lai")
+    except sqlite3.DatabaseError as e:
+        problems.append(f"Loi doc snapshot: {e}")
+    finally:
+        conn.close()
+    return problems
+
+def build_snapshot(source_db: str = "worldbank.db", snapshot_dir: str = DEFAULT_SNAPSHOT_DIR,
+                   vintage: Optional[str] = None) -> str:
+    """Tạo một file snapshot bất biến từ database nguồn bằng backup API, trả về đường dẫn snapshot
+
+    Snapshot được ghi ra file tạm, kiểm tra, rồi mới đổi tên thành file chính thức,
+    nên không bao giờ tồn tại một snapshot ghi dở.
+    """
+    vintage = vintage or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = _snapshot_path(snapshot_dir, vintage)
+    if os.path.exists(path):
+        raise FileExistsError(f"Snapshot da ton tai: {path}")
+
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    # Backup đọc một bản nhất quán của nguồn, không chặn kết nối ghi đang hoạt động
+    source = sqlite3.connect(Path(source_db).absolute().as_uri() + "?mode=ro", uri=True)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)
+        # Snapshot được mở với immutable=1: không dùng WAL, tất cả nằm trong một file
+        target.execute("PRAGMA journal_mode = DELETE;")
+        # Nguồn có thể đã ghi sau lần tính metadata cuối: snapshot luôn mang thống kê đúng
+        refresh_db_metadata_if_stale(target)
+        target.execute("ANALYZE;")
+        target.commit()
+    finally:
+        target.close()
+        source.close()
+
+    problems = validate_snapshot(tmp_path)
+    if problems:
+        os.remove(tmp_path)
+        raise ValueError(f"Snapshot khong hop le: {'; '.join(problems)}")
+    os.replace(tmp_path, path)
+    print(f"Da tao snapshot: {path}")
+    return path
+
+def resolve_snapshot_pointer(pointer: str = DEFAULT_SNAPSHOT_POINTER) -> str:
+    """Đọc đường dẫn snapshot từ file con trỏ (đường dẫn tương đối tính từ thư mục của con trỏ)"""
+    with open(pointer, "r", encoding="utf-8") as f:
+        target = f.read().strip()
+    if not target:
+        raise ValueError(f"File con tro rong: {pointer}")
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(pointer)), target))
+
+def publish_snapshot(path: str, pointer: str = DEFAULT_SNAPSHOT_POINTER, validate: bool = True) -> str:
+    """Công bố snapshot bằng cách thay file con trỏ một cách nguyên tử (os.replace)
+
+    Các DatabaseManager mở với snapshot_pointer sẽ chuyển sang snapshot mới ở query kế tiếp.
+    """
+    if validate:
+        problems = validate_snapshot(path)
+        if problems:
+            raise ValueError(f"Snapshot khong hop le: {'; '.join(problems)}")
+    pointer_dir = os.path.dirname(os.path.abspath(pointer))
+    target = os.path.relpath(os.path.abspath(path), pointer_dir)
+    tmp_pointer = f"{pointer}.{os.getpid()}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(target + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, pointer)
+    print(f"Da cong bo snapshot: {target}")
+    return target
+
+def list_snapshots(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR) -> List[str]:
+    """Danh sách snapshot trong thư mục, cũ trước mới sau"""
+    if not os.path.isdir(snapshot_dir):
+        return []
+    names = sorted(name for name in os.listdir(snapshot_dir)
+                   if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".db"))
+    return [os.path.join(snapshot_dir, name) for name in names]
+
+def prune_snapshots(snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, keep: int = 3,
+                    pointer: str = DEFAULT_SNAPSHOT_POINTER) -> List[str]:
+    """Xóa các snapshot cũ, giữ lại keep bản mới nhất và bản đang được công bố"""
+    current = resolve_snapshot_pointer(pointer) if os.path.exists(pointer) else None
+    snapshots = list_snapshots(snapshot_dir)
+    removed = []
+    for path in snapshots[:max(len(snapshots) - keep, 0)]:
+        if current and os.path.abspath(path) == current:
+            continue
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+if __name__ == "__main__":
+    # python db_snapshot.py build --publish   -> tạo snapshot từ worldbank.db và công bố
+    # python db_snapshot.py publish snapshots/worldbank_20240101T000000.db
+    # python db_snapshot.py list | prune --keep 3
+    parser = argparse.ArgumentParser(description="Tao va cong bo snapshot bat bien cua worldbank.db")
+    parser.add_argument("command", choices=["build", "publish", "validate", "list", "prune"])
+    parser.add_argument("path", nargs="?", help="File snapshot (cho publish / validate)")
+    parser.add_argument("--source", default="worldbank.db")
+    parser.add_argument("--dir", default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--pointer", default=DEFAULT_SNAPSHOT_POINTER)
+    parser.add_argument("--vintage", default=None, help="Ten phien ban du lieu (mac dinh: thoi diem UTC)")
+    parser.add_argument("--publish", action="store_true", help="Khi build: cong bo ngay snapshot vua tao")
+    parser.add_argument("--keep", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        snapshot = build_snapshot(args.source, args.dir, args.vintage)
+        if args.publish:
+            publish_snapshot(snapshot, args.pointer, validate=False)
+    elif args.command in ("publish", "validate"):
+        if not args.path:
+            parser.error(f"{args.command} can duong dan snapshot")
+        if args.command == "publish":
+            publish_snapshot(args.path, args.pointer)
+        else:
+            errors = validate_snapshot(args.path)
+            print("Snapshot hop le" if not errors else "\n".join(errors))
+    elif args.command == "list":
+        current = resolve_snapshot_pointer(args.pointer) if os.path.exists(args.pointer) else None
+        for snapshot in list_snapshots(args.dir):
+            print(("* " if os.path.abspath(snapshot) == current else "  ") + snapshot)
+    else:
+        for snapshot in prune_snapshots(args.dir, args.keep, args.pointer):
+            print(f"Da xoa {snapshot}")
@@ -0,0 +1,90 @@
+import copy
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from urllib.parse import urlencode
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from cache_utils import LRUCache, MISSING
+from query_metrics import QueryMetrics
+
+# (connect timeout, read timeout) tính bằng giây
+DEFAULT_TIMEOUT = (3.05, 10.0)
+# Mã lỗi tạm thời đáng để thử lại
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+class HttpClient:
+    """Client HTTP dùng chung: giữ kết nối (keep-alive), timeout, thử lại có backoff, ETag và đo độ trễ
+
+    Chỉ các request GET / HEAD (idempotent) được thử lại. Phản hồi có ETag được lưu lại để lần sau
+    gửi If-None-Match; khi server trả 304 thì dùng lại dữ liệu đã lưu.
+    """
+
+    def __init__(self, timeout: Union[float, Tuple[float, float]] = DEFAULT_TIMEOUT, retries: int = 3,
+                 backoff_factor: float = 0.3, pool_maxsize: int = 10, etag_cache_size: int = 256,
+                 headers: Optional[Dict[str, str]] = None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["GET", "HEAD"]),
+            respect_retry_after_header=True,
+            raise_on_status=False,  # Trả về phản hồi lỗi cuối cùng để raise_for_status xử lý
+        )
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.etags = LRUCache(etag_cache_size)  # url -> (etag, bản sao dữ liệu đã giải mã)
+        self.metrics = QueryMetrics()  # Độ trễ theo endpoint
+
+    @staticmethod
+    def _cache_key(url: str, params: Optional[Dict[str, Any]]) -> str:
+        return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+    def get_json(self, url: str, params: Optional[Dict[str, Any]] = None, headers: Optional[Dict[str, str]] = None,
+                 timeout: Union[None, float, Tuple[float, float]] = None, endpoint: Optional[str] = None) -> Any:
+        """GET và trả về dữ liệu JSON; ném requests.exceptions.RequestException khi lỗi"""
+        return self.get_decoded(url, lambda response: response.json(), params, headers, timeout, endpoint)
+
+    def get_decoded(self, url: str, decode: Callable[[requests.Response], Any], params: Optional[Dict[str, Any]] = None,
+                    headers: Optional[Dict[str, str]] = None, timeout: Union[None, float, Tuple[float, float]] = None,
+                    endpoint: Optional[str] = None) -> Any:
+        """GET và giải mã phản hồi bằng decode(response); ETag được lưu riêng theo header Accept"""
+        endpoint = endpoint or url
+        request_headers = dict(headers or {})
+        key = self._cache_key(url, params)
+        if "Accept" in request_headers:
+            key = f"{key}|{request_headers['Accept']}"
+        cached = self.etags.get(key)
+        if cached is not MISSING:
+            request_headers["If-None-Match"] = cached[0]
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, params=params, headers=request_headers,
+                                        timeout=timeout or self.timeout)
+            if response.status_code == 304 and cached is not MISSING:
+                # Mỗi lần trả về một bản sao: người gọi sửa dữ liệu không làm hỏng bản đã lưu
+                data = copy.deepcopy(cached[1])
+            else:
+                response.raise_for_status()
+                data = decode(response)
+                etag = response.headers.get("ETag")
+                if etag:
+                    self.etags.set(key, (etag, copy.deepcopy(data)))
+        except Exception:
+            self.metrics.record(endpoint, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        self.metrics.record(endpoint, (time.perf_counter() - start) * 1000, len(data) if isinstance(data, list) else 1)
+        return data
+
+    def get_metrics_snapshot(self) -> Dict[str, Any]:
+        """Thống kê số lần gọi, lỗi, độ trễ p50/p95/p99 theo endpoint"""
+        return self.metrics.snapshot()['methods']
+
+    def close(self):
+        self.session.close()
@@ -3,7 +3,7 @@ import plotly.express as px
 import pandas as pd
 from api_utils import (
     get_sample_country_info_api,get_country_info_map,
-    valid_iso3_codes, indicator_mapping, geo_regions,get_country_data_by_iso3,income_groups
+    valid_iso3_codes, indicator_mapping, map_indicator_codes, geo_regions,get_countries_data_by_iso3,income_groups
 )
 
 
@@ -39,28 +39,14 @@ except FileNotFoundError:
 # =========================
 def process_country_data():
     """Lấy dữ liệu từ DB và phân loại hợp lệ / bị loại."""
-    data = get_country_info_map()
-    valid, excluded = [], []
-
-    for country in data:
-        name = country.get("name", "").lower()
-        iso = country.get("iso_code", None)
-        entry = {
-            "code": iso,
-            "country_name": country.get("name"),
-            "gdp_billion": country.get("indicator", {}).get("NY.GDP.MKTP.CD", 0) / 1e9,
-            "population": country.get("indicator", {}).get("SP.POP.TOTL"),
-            "gdp_per_capita": country.get("indicator", {}).get("NY.GDP.PCAP.CD"),
-            "unemployment_rate": country.get("indicator", {}).get("SL.UEM.TOTL.ZS"),
-            "inflation_rate": country.get("indicator", {}).get("FP.CPI.TOTL.ZG")
-        }
-
-        if name == "world" or iso not in valid_iso3_codes:
-            excluded.append(entry)
-        else:
-            valid.append(entry)
+    data = get_country_info_map(indicators=list(map_indicator_codes.values()))
+    entries = pd.DataFrame({"code": data["iso_code"], "country_name": data["name"]})
+    for column, code in map_indicator_codes.items():
+        entries[column] = data[code]
+    entries["gdp_billion"] = entries["gdp_billion"].fillna(0) / 1e9
 
-    return pd.DataFrame(valid), pd.DataFrame(excluded)
+    excluded_mask = (data["name"].fillna("").str.lower() == "world") | ~data["iso_code"].isin(valid_iso3_codes)
+    return entries[~excluded_mask].reset_index(drop=True), entries[excluded_mask].reset_index(drop=True)
 
 def enrich_with_coordinates(df):
     """Bổ sung tọa độ từ API."""
@@ -260,33 +246,24 @@ else:
 if not income_df.empty:
     st.markdown("### 💹 So sánh tăng trưởng các chỉ số kinh tế theo **nhóm thu nhập**")
 
-    # Bước 1: Lấy dữ liệu chi tiết từng quốc gia
-    all_records = []
-    for _, row in income_df.iterrows():
-        iso3 = row["code"]
-        country_name = row["country_name"]
-        income_group = row.get("income_group", "Không xác định")
-
-        country_data = get_country_data_by_iso3(iso3_code=iso3)
-        if not country_data["data"]:
-            continue
-
-        # Lưu dữ liệu từng chỉ số của quốc gia
-        for indicator_code, indicator_data in country_data["data"].items():
-            for entry in indicator_data["data"]:
-                all_records.append({
-                    "year": entry["year"],
-                    "value": entry["value"],
-                    "indicator": indicator_code,
-                    "country_name": country_name,
-                    "income_group": income_group
-                })
+    # Bước 1: Lấy dữ liệu chi tiết của tất cả quốc gia trong một query
+    countries_df = income_df[["code", "country_name"]].copy()
+    countries_df["income_group"] = (
+        income_df["income_group"] if "income_group" in income_df.columns else "Không xác định"
+    )
+    long_df = get_countries_data_by_iso3(countries_df["code"].tolist(), as_frame=True)
+    all_records = (
+        long_df[["iso_code", "year", "value", "indicator_code"]]
+        .rename(columns={"indicator_code": "indicator"})
+        .merge(countries_df, left_on="iso_code", right_on="code")
+        [["year", "value", "indicator", "country_name", "income_group"]]
+    )
             
     # Bước 2: Gom dữ liệu lại
-    if not all_records:
+    if all_records.empty:
         st.warning("Không có dữ liệu chỉ số nào khả dụng để hiển thị.")
     else:
-        df_all = pd.DataFrame(all_records)
+        df_all = all_records
 
         # Kiểm tra dữ liệu
         if "income_group" not in df_all.columns:
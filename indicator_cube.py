@@ -0,0 +1,196 @@
+import threading
+import numpy as np
+import pyarrow as pa
+from typing import Any, Dict, List, Optional, Tuple
+from database_manager import DatabaseManager
+
+# Kiểu cột khi đọc country_data (dựng Arrow trực tiếp, không suy ra kiểu)
+CUBE_SOURCE_SCHEMA = pa.schema([
+    ('country_code', pa.string()),
+    ('indicator_code', pa.string()),
+    ('year', pa.int64()),
+    ('value', pa.float64()),
+])
+
+class IndicatorCube:
+    """Dữ liệu country_data nạp một lần vào mảng NumPy dày quốc gia × chỉ số × năm
+
+    Các method trả về cùng dạng list of dict như DatabaseManager để dùng thay thế trực tiếp.
+    Ô không có dữ liệu (hoặc NULL) là NaN, mask đánh dấu các ô có giá trị,
+    present đánh dấu các ô có dòng trong country_data (kể cả giá trị NULL).
+    """
+
+    def __init__(self, country_codes: List[str], indicator_codes: List[str], years: np.ndarray,
+                 values: np.ndarray, countries: Dict[str, Dict[str, Any]], indicators: Dict[str, Dict[str, Any]],
+                 data_version: int = 0, present: Optional[np.ndarray] = None):
+        self.country_codes = country_codes
+        self.indicator_codes = indicator_codes
+        self.years = years  # Năm tương ứng với trục thứ 3
+        self.values = values  # float64 [quốc gia, chỉ số, năm]
+        self.mask = ~np.isnan(values)
+        self.present = self.mask if present is None else present
+        self.country_index = {code: i for i, code in enumerate(country_codes)}
+        self.indicator_index = {code: i for i, code in enumerate(indicator_codes)}
+        self.countries = countries  # Thông tin bảng countries theo mã
+        self.indicators = indicators  # Thông tin bảng indicators theo mã
+        self.data_version = data_version
+
+        # Chỉ giữ các quốc gia có trong bảng countries (giống JOIN countries trong SQL)
+        self.known_countries = np.array([code in countries for code in country_codes], dtype=bool)
+
+        # Năm mới nhất có dữ liệu của mỗi (quốc gia, chỉ số)
+        if values.size:
+            last_from_end = np.argmax(self.mask[:, :, ::-1], axis=2)
+            self.latest_year_index = values.shape[2] - 1 - last_from_end
+            self.has_latest = self.mask.any(axis=2)
+            self.latest_values = np.take_along_axis(values, self.latest_year_index[:, :, None], axis=2)[:, :, 0]
+        else:
+            self.latest_year_index = np.zeros(values.shape[:2], dtype=np.int64)
+            self.has_latest = np.zeros(values.shape[:2], dtype=bool)
+            self.latest_values = np.full(values.shape[:2], np.nan)
+
+    @classmethod
+    def load(cls, db: DatabaseManager) -> "IndicatorCube":
+        """Nạp toàn bộ country_data từ database"""
+        data_version = db.get_data_version()
+        table = db.execute_query_arrow("SELECT country_code, indicator_code, year, value FROM country_data;",
+                                       schema=CUBE_SOURCE_SCHEMA)
+        countries = {row['iso_code']: row for row in db.get_all_countries()}
+        indicators = {row['code']: row for row in db.get_all_indicators()}
+
+        if table.num_rows == 0:
+            return cls([], [], np.array([], dtype=np.int64), np.empty((0, 0, 0)), countries, indicators, data_version)
+
+        # Mã hóa từ điển trên Arrow: nhanh hơn np.unique trên mảng chuỗi
+        country_column = table.column('country_code').combine_chunks().dictionary_encode()
+        indicator_column = table.column('indicator_code').combine_chunks().dictionary_encode()
+        country_idx = country_column.indices.to_numpy()
+        indicator_idx = indicator_column.indices.to_numpy()
+        year_values = table.column('year').to_numpy()
+        min_year = int(year_values.min())
+        years = np.arange(min_year, int(year_values.max()) + 1)
+
+        shape = (len(country_column.dictionary), len(indicator_column.dictionary), len(years))
+        values = np.full(shape, np.nan)
+        present = np.zeros(shape, dtype=bool)
+        cells = (country_idx, indicator_idx, year_values - min_year)
+        # Giá trị NULL được chuyển thành NaN
+        values[cells] = table.column('value').cast('double').to_numpy(zero_copy_only=False)
+        present[cells] = True
+
+        cube = cls(country_column.dictionary.to_pylist(), indicator_column.dictionary.to_pylist(),
+                   years, values, countries, indicators, data_version, present)
+        print(f"Da nap IndicatorCube: {values.shape[0]} quoc gia x {values.shape[1]} chi so x {values.shape[2]} nam")
+        return cube
+
+    # ===== TRUY VẤN VECTOR HÓA =====
+    def latest_vector(self, indicator_code: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Trả về (chỉ số quốc gia, năm, giá trị) mới nhất của một chỉ số cho tất cả quốc gia có dữ liệu"""
+        i = self.indicator_index.get(indicator_code)
+        if i is None or indicator_code not in self.indicators:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, np.array([], dtype=np.float64)
+        rows = np.flatnonzero(self.has_latest[:, i] & self.known_countries)
+        return rows, self.years[self.latest_year_index[rows, i]], self.latest_values[rows, i]
+
+    def _country_rows(self, rows: np.ndarray, years: np.ndarray, values: np.ndarray,
+                      indicator_code: str, fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+        """Dựng list of dict (country_code, year, value + các cột của countries) theo thứ tự cho trước"""
+        unit = self.indicators.get(indicator_code, {}).get('unit')
+        results = []
+        for row, year, value in zip(rows.tolist(), years.tolist(), values.tolist()):
+            code = self.country_codes[row]
+            country = self.countries[code]
+            record = {'country_code': code, 'year': year, 'value': value, 'country_name': country['name']}
+            for field in fields:
+                record[field] = country.get(field)
+            record['unit'] = unit
+            results.append(record)
+        return results
+
+    def get_latest_data_all_countries(self, indicator_code: str) -> List[Dict[str, Any]]:
+        """Dữ liệu mới nhất cho tất cả quốc gia (cho bản đồ), sắp xếp giảm dần theo giá trị"""
+        rows, years, values = self.latest_vector(indicator_code)
+        order = np.argsort(-values, kind='stable')
+        return self._country_rows(rows[order], years[order], values[order], indicator_code,
+                                  ('region', 'income_level', 'latitude', 'longitude'))
+
+    def get_top_countries_by_indicator(self, indicator_code: str, limit: int = 10, year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top quốc gia theo chỉ số (năm mới nhất của mỗi quốc gia, hoặc một năm cụ thể)"""
+        if year:
+            i = self.indicator_index.get(indicator_code)
+            y = int(year) - int(self.years[0]) if len(self.years) else -1
+            if i is None or indicator_code not in self.indicators or not 0 <= y < len(self.years):
+                return []
+            rows = np.flatnonzero(self.mask[:, i, y] & self.known_countries)
+            years = np.full(len(rows), int(year))
+            values = self.values[rows, i, y]
+        else:
+            rows, years, values = self.latest_vector(indicator_code)
+
+        if limit < len(values):
+            # Chỉ sắp xếp phần top thay vì toàn bộ mảng
+            top = np.argpartition(-values, limit - 1)[:limit] if limit > 0 else np.array([], dtype=np.int64)
+            order = top[np.argsort(-values[top], kind='stable')]
+        else:
+            order = np.argsort(-values, kind='stable')
+        return self._country_rows(rows[order], years[order], values[order], indicator_code, ('region',))
+
+    def get_indicator_trend(self, country_code: str, indicator_code: str, years_back: int = 10) -> List[Dict[str, Any]]:
+        """Xu hướng của chỉ số: các năm gần nhất có dòng dữ liệu, giảm dần theo năm"""
+        c = self.country_index.get(country_code)
+        i = self.indicator_index.get(indicator_code)
+        if c is None or i is None or indicator_code not in self.indicators:
+            return []
+        year_idx = np.flatnonzero(self.present[c, i])[::-1][:years_back]
+        unit = self.indicators[indicator_code].get('unit')
+        return [
+            {'year': year, 'value': None if np.isnan(value) else value, 'unit': unit}
+            for year, value in zip(self.years[year_idx].tolist(), self.values[c, i, year_idx].tolist())
+        ]
+
+    def get_multiple_countries_data(self, country_codes: List[str], indicator_code: str, year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """So sánh nhiều quốc gia cho một chỉ số (năm mới nhất hoặc một năm cụ thể)"""
+        i = self.indicator_index.get(indicator_code)
+        if i is None or indicator_code not in self.indicators:
+            return []
+        rows = np.array(sorted({self.country_index[code] for code in country_codes if code in self.country_index}), dtype=np.int64)
+        if len(rows):
+            rows = rows[self.known_countries[rows]]
+
+        if year:
+            y = int(year) - int(self.years[0])
+            if not 0 <= y < len(self.years):
+                return []
+            rows = rows[self.mask[rows, i, y]]
+            years = np.full(len(rows), int(year))
+            values = self.values[rows, i, y]
+        else:
+            rows = rows[self.has_latest[rows, i]]
+            years = self.years[self.latest_year_index[rows, i]]
+            values = self.latest_values[rows, i]
+
+        order = np.argsort(-values, kind='stable')
+        return self._country_rows(rows[order], years[order], values[order], indicator_code, ('region',))
+
+class CubeHolder:
+    """Giữ một IndicatorCube và nạp lại khi phiên bản dữ liệu của database thay đổi"""
+
+    def __init__(self, db: DatabaseManager):
+        self.db = db
+        self.cube: Optional[IndicatorCube] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> IndicatorCube:
+        version = self.db.get_data_version()
+        cube = self.cube
+        if cube is not None and cube.data_version == version:
+            return cube
+        with self._lock:
+            if self.cube is None or self.cube.data_version != version:
+                self.cube = IndicatorCube.load(self.db)
+            return self.cube
+
+    def invalidate(self):
+        with self._lock:
+            self.cube = None
@@ -4,7 +4,7 @@ import pandas as pd
 import time
 from api_utils import (
     get_country_data, get_country_info_api, get_sample_country_info_api,get_country_info_map,
-    valid_iso3_codes, indicator_mapping, geo_regions, get_country_data_by_iso3
+    valid_iso3_codes, indicator_mapping, map_indicator_codes, geo_regions, get_country_data_by_iso3
 )
 from sidebar_info import render_sidebar
 from data_processor import data_processor
@@ -33,28 +33,14 @@ st.divider()
 # =========================
 def process_country_data():
     """Lấy dữ liệu từ DB và phân loại hợp lệ / bị loại."""
-    data = get_country_info_map()
-    valid, excluded = [], []
+    data = get_country_info_map(indicators=list(map_indicator_codes.values()))
+    entries = pd.DataFrame({"code": data["iso_code"], "country_name": data["name"]})
+    for column, code in map_indicator_codes.items():
+        entries[column] = data[code]
+    entries["gdp_billion"] = entries["gdp_billion"].fillna(0) / 1e9
 
-    for country in data:
-        name = country.get("name", "").lower()
-        iso = country.get("iso_code", None)
-        entry = {
-            "code": iso,
-            "country_name": country.get("name"),
-            "gdp_billion": country.get("indicator", {}).get("NY.GDP.MKTP.CD", 0) / 1e9,
-            "population": country.get("indicator", {}).get("SP.POP.TOTL"),
-            "gdp_per_capita": country.get("indicator", {}).get("NY.GDP.PCAP.CD"),
-            "unemployment_rate": country.get("indicator", {}).get("SL.UEM.TOTL.ZS"),
-            "inflation_rate": country.get("indicator", {}).get("FP.CPI.TOTL.ZG")
-        }
-
-        if name == "world" or iso not in valid_iso3_codes:
-            excluded.append(entry)
-        else:
-            valid.append(entry)
-
-    return pd.DataFrame(valid), pd.DataFrame(excluded)
+    excluded_mask = (data["name"].fillna("").str.lower() == "world") | ~data["iso_code"].isin(valid_iso3_codes)
+    return entries[~excluded_mask].reset_index(drop=True), entries[excluded_mask].reset_index(drop=True)
 
 def enrich_with_coordinates(df):
     """Bổ sung tọa độ từ API."""
@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from database_manager import db_manager, DatabaseManager
+from db_schema import (
+    create_country_latest_triggers, create_country_series_triggers, drop_country_latest_triggers,
+    drop_country_series_triggers, rebuild_country_latest, rebuild_country_series, refresh_db_metadata_if_stale,
+)
+from worldbank_ingest import UPSERT_COUNTRY_DATA_SQL, UPSERT_COUNTRY_SQL, UPSERT_INDICATOR_SQL
+
+DEFAULT_PARQUET_ROOT = "parquet"
+DEFAULT_YEAR_BUCKET = 10  # Mỗi thư mục year_bucket chứa 10 năm
+
+# country_data kèm thông tin quốc gia / chỉ số, đủ cột cho các truy vấn của DataProcessor
+PARQUET_EXPORT_SQL = """
+SELECT
+    cd.country_code,
+    c.iso2_code,
+    c.name as country_name,
+    c.region,
+    c.income_level,
+    c.latitude,
+    c.longitude,
+    cd.indicator_code,
+    i.name as indicator_name,
+    i.unit,
+    i.category,
+    cd.year,
+    cd.value,
+    cd.last_updated
+FROM country_data cd
+JOIN countries c ON cd.country_code = c.iso_code
+JOIN indicators i ON cd.indicator_code = i.code;
+"""
+
+PARQUET_SCHEMA = pa.schema([
+    ('country_code', pa.string()),
+    ('iso2_code', pa.string()),
+    ('country_name', pa.string()),
+    ('region', pa.string()),
+    ('income_level', pa.string()),
+    ('latitude', pa.float64()),
+    ('longitude', pa.float64()),
+    ('indicator_code', pa.string()),
+    ('indicator_name', pa.string()),
+    ('unit', pa.string()),
+    ('category', pa.string()),
+    ('year', pa.int32()),
+    ('value', pa.float64()),
+    ('last_updated', pa.string()),
+    ('year_bucket', pa.int32()),
+])
+
+INDICATORS_SCHEMA = pa.schema([
+    ('code', pa.string()),
+    ('name', pa.string()),
+    ('unit', pa.string()),
+    ('description', pa.string()),
+    ('category', pa.string()),
+])
+
+# Thư mục con theo category rồi theo nhóm năm: data/category=Economy/year_bucket=2010/part-0.parquet
+PARTITIONING = ds.partitioning(
+    pa.schema([('category', pa.string()), ('year_bucket', pa.int32())]), flavor="hive"
+)
+
+def _data_dir(root: str) -> str:
+    return os.path.join(root, "data")
+
+def _indicators_path(root: str) -> str:
+    return os.path.join(root, "indicators.parquet")
+
+def _manifest_path(root: str) -> str:
+    return os.path.join(root, "_manifest.json")
+
+def read_manifest(root: str) -> Dict[str, Any]:
+    """Thông tin bản xuất: bộ đếm lần ghi của database lúc xuất, thời điểm, số dòng ({} nếu không có)"""
+    try:
+        with open(_manifest_path(root), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _export_batches(db: DatabaseManager, year_bucket: int, batch_size: int) -> Iterator[pa.RecordBatch]:
+    """Đọc country_data theo lô Arrow, ép về PARQUET_SCHEMA và thêm cột year_bucket"""
+    source_schema = pa.schema([field for field in PARQUET_SCHEMA if field.name != 'year_bucket'])
+    for batch in db.execute_query_iter(PARQUET_EXPORT_SQL, batch_size=batch_size, as_arrow=True,
+                                       schema=source_schema):
+        if batch.num_rows == 0:
+            continue
+        table = pa.Table.from_batches([batch])
+        buckets = pc.multiply(pc.divide(table.column('year'), year_bucket), year_bucket)
+        table = table.append_column(PARQUET_SCHEMA.field('year_bucket'), buckets.cast(pa.int32()))
+        yield from table.to_batches()
+
+def export_parquet(root: str = DEFAULT_PARQUET_ROOT, db: Optional[DatabaseManager] = None,
+                   year_bucket: int = DEFAULT_YEAR_BUCKET, batch_size: int = 65536) -> int:
+    """Xuất country_data (kèm countries / indicators) ra Parquet phân vùng theo category và nhóm năm
+
+    Ghi vào thư mục tạm rồi đổi tên, nên người đọc không thấy bản xuất dở. _manifest.json ghi bộ đếm lần ghi
+    (write_counter trong db_metadata) lúc bắt đầu xuất, so được với database từ tiến trình khác
+    (ghi xen giữa lúc xuất làm bản xuất lệch phiên bản). Trả về số dòng đã ghi.
+    """
+    db = db or db_manager
+    write_counter = db.get_write_counter()
+    tmp_root = root.rstrip("/\\") + ".tmp"
+    if os.path.exists(tmp_root):
+        shutil.rmtree(tmp_root)
+    os.makedirs(tmp_root)
+
+    count = 0
+    def counted(batches):
+        nonlocal count
+        for batch in batches:
+            count += batch.num_rows
+            yield batch
+
+    ds.write_dataset(
+        counted(_export_batches(db, year_bucket, batch_size)),
+        _data_dir(tmp_root),
+        schema=PARQUET_SCHEMA,
+        format="parquet",
+        partitioning=PARTITIONING,
+        # Row group nhỏ hơn để thống kê min/max theo năm / chỉ số lọc được nhiều hơn
+        max_rows_per_group=64 * 1024,
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    # Bảng chỉ số nhỏ: dùng để biết category của một chỉ số (cắt tỉa thư mục khi đọc)
+    indicators = db.execute_query_arrow("SELECT code, name, unit, description, category FROM indicators;",
+                                        schema=INDICATORS_SCHEMA)
+    pq.write_table(indicators, _indicators_path(tmp_root))
+    with open(_manifest_path(tmp_root), "w", encoding="utf-8") as f:
+        json.dump({
+            'write_counter': write_counter,
+            'exported_at': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+            'rows': count,
+        }, f)
+
+    # Đổi tên bản cũ sang bên cạnh rồi mới đưa bản mới vào: thư mục root gần như luôn tồn tại,
+    # ParquetAnalytics đang mở bản cũ thấy _manifest.json đổi và tự mở lại
+    old_root = root.rstrip("/\\") + ".old"
+    if os.path.exists(old_root):
+        shutil.rmtree(old_root)
+    if os.path.exists(root):
+        os.replace(root, old_root)
+    os.replace(tmp_root, root)
+    if os.path.exists(old_root):
+        shutil.rmtree(old_root)
+    return count
+
+def import_parquet(root: str = DEFAULT_PARQUET_ROOT, db: Optional[DatabaseManager] = None,
+                   bulk: bool = True) -> Dict[str, int]:
+    """Nạp lại dữ liệu từ thư mục Parquet vào countries / indicators / country_data (upsert)"""
+    db = db or db_manager
+    dataset = ds.dataset(_data_dir(root), format="parquet", partitioning=PARTITIONING)
+    stats = {'rows': 0, 'countries': 0, 'indicators': 0}
+    seen_countries = set()
+
+    with db.write_transaction() as conn:
+        if bulk:
+            drop_country_latest_triggers(conn)
+            drop_country_series_triggers(conn)
+        if os.path.exists(_indicators_path(root)):
+            indicators = pq.read_table(_indicators_path(root)).to_pylist()
+            conn.executemany(UPSERT_INDICATOR_SQL, [
+                (row['code'], row['name'], row['unit'], row['description'], row['category']) for row in indicators
+            ])
+            stats['indicators'] = len(indicators)
+
+        for batch in dataset.to_batches():
+            columns = batch.to_pydict()
+            countries = {}
+            for i, code in enumerate(columns['country_code']):
+                if code not in seen_countries and code not in countries:
+                    countries[code] = i
+            for code, i in countries.items():
+                conn.execute(UPSERT_COUNTRY_SQL, (code, columns['iso2_code'][i], columns['country_name'][i],
+                                                  columns['region'][i], columns['income_level'][i]))
+                conn.execute(
+                    "UPDATE countries SET latitude = COALESCE(latitude, ?), longitude = COALESCE(longitude, ?) "
+                    "WHERE iso_code = ?;",
+                    (columns['latitude'][i], columns['longitude'][i], code)
+                )
+            seen_countries.update(countries)
+
+            conn.executemany(UPSERT_COUNTRY_DATA_SQL, zip(
+                columns['country_code'], columns['indicator_code'], columns['year'],
+                columns['value'], columns['last_updated']
+            ))
+            stats['rows'] += batch.num_rows
+        if bulk:
+            rebuild_country_latest(conn)
+            create_country_latest_triggers(conn)
+        rebuild_country_series(conn)
+        if bulk:
+            create_country_series_triggers(conn)
+        refresh_db_metadata_if_stale(conn)
+
+    stats['countries'] = len(seen_countries)
+    return stats
+
+class ParquetAnalytics:
+    """Trả lời các truy vấn so sánh / top-N / bản đồ / xu hướng trực tiếp từ Parquet bằng Arrow compute
+
+    Bộ lọc (chỉ số, năm, quốc gia) được đẩy xuống dataset: thư mục category / year_bucket không liên quan
+    bị bỏ qua, row group được lọc theo thống kê min/max. Kết quả cùng dạng với DatabaseManager.
+    Mỗi truy vấn stat _manifest.json một lần: export_parquet ghi bản mới thì dataset được mở lại.
+    """
+
+    def __init__(self, root: str = DEFAULT_PARQUET_ROOT, year_bucket: int = DEFAULT_YEAR_BUCKET):
+        self.root = root
+        self.year_bucket = year_bucket
+        self.refresh()
+
+    def _stat_manifest(self) -> Optional[Tuple[int, int]]:
+        """Dấu hiệu thay đổi của bản xuất (inode, mtime của _manifest.json)"""
+        try:
+            stat = os.stat(_manifest_path(self.root))
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def refresh(self):
+        """Mở lại dataset (sau khi export_parquet ghi bản mới)"""
+        self._manifest_stamp = self._stat_manifest()
+        self.manifest = read_manifest(self.root)
+        self.dataset = ds.dataset(_data_dir(self.root), format="parquet", partitioning=PARTITIONING)
+        self.indicators = {
+            row['code']: row for row in pq.read_table(_indicators_path(self.root)).to_pylist()
+        }
+
+    @property
+    def write_counter(self) -> Optional[int]:
+        """Bộ đếm lần ghi của database lúc xuất bản đang mở (None nếu bản xuất không có manifest)"""
+        return self.manifest.get('write_counter')
+
+    def check_refresh(self):
+        """Mở lại nếu bản xuất đã được thay"""
+        stamp = self._stat_manifest()
+        if stamp is not None and stamp != self._manifest_stamp:
+            self.refresh()
+
+    def _to_table(self, columns: List[str], expression: ds.Expression) -> pa.Table:
+        """Quét dataset; file của bản cũ đã bị xóa giữa chừng thì mở lại bản mới và thử thêm một lần"""
+        try:
+            return self.dataset.to_table(columns=columns, filter=expression)
+        except OSError:
+            self.refresh()
+            return self.dataset.to_table(columns=columns, filter=expression)
+
+    def _indicator_filter(self, indicator_code: str) -> ds.Expression:
+        """Bộ lọc theo chỉ số, kèm category để cắt tỉa thư mục"""
+        expression = ds.field('indicator_code') == indicator_code
+        category = self.indicators[indicator_code]['category']
+        if category is None:
+            return expression & ds.field('category').is_null()
+        return expression & (ds.field('category') == category)
+
+    def _year_filter(self, year: int) -> ds.Expression:
+        bucket = int(year) // self.year_bucket * self.year_bucket
+        return (ds.field('year_bucket') == bucket) & (ds.field('year') == int(year))
+
+    def _latest(self, expression: ds.Expression, columns: List[str]) -> pa.Table:
+        """Dòng mới nhất khác NULL của mỗi quốc gia thỏa bộ lọc"""
+        table = self._to_table(columns, expression & ds.field('value').is_valid())
+        if table.num_rows == 0:
+            return table
+        latest_years = table.group_by('country_code').aggregate([('year', 'max')])
+        latest_years = latest_years.rename_columns(['country_code', 'year'])
+        return table.join(latest_years, keys=['country_code', 'year'], join_type='inner')
+
+    def _query(self, indicator_code: str, columns: List[str], extra: Optional[ds.Expression] = None,
+               year: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        self.check_refresh()
+        if indicator_code not in self.indicators:
+            return []
+        expression = self._indicator_filter(indicator_code)
+        if extra is not None:
+            expression = expression & extra
+        if year:
+            table = self._to_table(columns, expression & self._year_filter(year) & ds.field('value').is_valid())
+        else:
+            table = self._latest(expression, columns)
+        if table.num_rows == 0:
+            return []
+        order = pc.sort_indices(table, sort_keys=[('value', 'descending')])
+        if limit is not None:
+            order = order[:limit]
+        return table.take(order).select(columns).to_pylist()
+
+    def get_latest_data_all_countries(self, indicator_code: str) -> List[Dict[str, Any]]:
+        """Dữ liệu mới nhất cho tất cả quốc gia (cho bản đồ)"""
+        columns = ['country_code', 'year', 'value', 'country_name', 'region', 'income_level',
+                   'latitude', 'longitude', 'unit']
+        return self._query(indicator_code, columns)
+
+    def get_top_countries_by_indicator(self, indicator_code: str, limit: int = 10, year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Top quốc gia theo chỉ số (năm mới nhất của mỗi quốc gia, hoặc một năm cụ thể)"""
+        columns = ['country_code', 'year', 'value', 'country_name', 'region', 'unit']
+        return self._query(indicator_code, columns, year=year, limit=limit)
+
+    def get_multiple_countries_data(self, country_codes: List[str], indicator_code: str, year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """So sánh nhiều quốc gia cho một chỉ số"""
+        columns = ['country_code', 'year', 'value', 'country_name', 'region', 'unit']
+        return self._query(indicator_code, columns, extra=ds.field('country_code').isin(list(country_codes)), year=year)
+
+    def get_indicator_trend(self, country_code: str, indicator_code: str, years_back: int = 10) -> List[Dict[str, Any]]:
+        """Xu hướng của chỉ số qua các năm, giảm dần theo năm"""
+        self.check_refresh()
+        if indicator_code not in self.indicators:
+            return []
+        table = self._to_table(['year', 'value', 'unit'],
+                               self._indicator_filter(indicator_code) & (ds.field('country_code') == country_code))
+        order = pc.sort_indices(table, sort_keys=[('year', 'descending')])[:years_back]
+        return table.take(order).to_pylist()
+
+if __name__ == "__main__":
+    # python parquet_store.py export parquet/
+    # python parquet_store.py import parquet/
+    parser = argparse.ArgumentParser(description="Xuat / nap country_data dang Parquet phan vung")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("root", nargs="?", default=DEFAULT_PARQUET_ROOT)
+    parser.add_argument("--year-bucket", type=int, default=DEFAULT_YEAR_BUCKET)
+    args = parser.parse_args()
+    if args.command == "export":
+        total = export_parquet(args.root, year_bucket=args.year_bucket)
+        print(f"Da xuat {total} dong ra {args.root}")
+    else:
+        print(f"Ket qua: {import_parquet(args.root)}")
@@ -0,0 +1,150 @@
+import functools
+import inspect
+import json
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Percentile theo phương pháp nearest-rank trên danh sách đã sắp xếp"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(percent / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def count_rows(result: Any) -> int:
+    """Đếm số dòng của kết quả trả về (list, dict, DataFrame, pyarrow.Table...)"""
+    if result is None:
+        return 0
+    if hasattr(result, 'num_rows'):
+        return result.num_rows
+    if isinstance(result, dict):
+        return 1
+    if hasattr(result, '__len__'):
+        return len(result)
+    return 1
+
+class QueryMetrics:
+    """Thống kê số lần gọi, độ trễ p50/p95/p99, số dòng và log query chậm theo từng method"""
+
+    def __init__(self, window: int = 1024, slow_query_ms: Optional[float] = None, slow_log_size: int = 200):
+        self.window = window  # Số mẫu độ trễ gần nhất giữ lại cho mỗi method
+        self.slow_query_ms = slow_query_ms  # None = tắt log query chậm
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._slow_queries = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def record(self, name: str, elapsed_ms: float, rows: int = 0, error: bool = False):
+        """Ghi nhận một lần gọi method"""
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = {
+                    'calls': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'latencies': deque(maxlen=self.window),
+                }
+                self._stats[name] = stats
+            stats['calls'] += 1
+            stats['rows'] += rows
+            stats['total_ms'] += elapsed_ms
+            stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+            stats['latencies'].append(elapsed_ms)
+            if error:
+                stats['errors'] += 1
+
+    def is_slow(self, elapsed_ms: float) -> bool:
+        return self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms
+
+    def log_slow_query(self, method: str, sql: str, params: Any, elapsed_ms: float, rows: int):
+        """Lưu một query chậm hơn ngưỡng slow_query_ms"""
+        entry = {
+            'timestamp': time.time(),
+            'method': method,
+            'elapsed_ms': round(elapsed_ms, 3),
+            'rows': rows,
+            'sql': " ".join(sql.split()),
+            'params': list(params) if params else [],
+        }
+        with self._lock:
+            self._slow_queries.append(entry)
+        print(f"Query cham ({entry['elapsed_ms']} ms) trong {method}: {entry['sql'][:200]}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Ảnh chụp thống kê hiện tại"""
+        with self._lock:
+            methods = {}
+            for name, stats in self._stats.items():
+                latencies = sorted(stats['latencies'])
+                methods[name] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'rows': stats['rows'],
+                    'avg_ms': round(stats['total_ms'] / stats['calls'], 3) if stats['calls'] else 0.0,
+                    'p50_ms': round(_percentile(latencies, 50), 3),
+                    'p95_ms': round(_percentile(latencies, 95), 3),
+                    'p99_ms': round(_percentile(latencies, 99), 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                    'total_ms': round(stats['total_ms'], 3),
+                }
+            return {
+                'methods': methods,
+                'slow_query_ms': self.slow_query_ms,
+                'slow_queries': list(self._slow_queries),
+            }
+
+    def dump(self, path: str):
+        """Ghi ảnh chụp thống kê ra file JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        """Xóa toàn bộ thống kê"""
+        with self._lock:
+            self._stats.clear()
+            self._slow_queries.clear()
+
+def timed(method: Callable) -> Callable:
+    """Đo thời gian một method của DatabaseManager và ghi vào self.metrics"""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = getattr(self, 'metrics', None)
+        if metrics is None:
+            return method(self, *args, **kwargs)
+
+        # Ngăn xếp tên method đang chạy, để log query chậm biết query thuộc method nào
+        stack = getattr(self._local, 'method_stack', None)
+        if stack is None:
+            stack = self._local.method_stack = []
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception:
+            metrics.record(name, (time.perf_counter() - start) * 1000, error=True)
+            raise
+        finally:
+            stack.pop()
+        metrics.record(name, (time.perf_counter() - start) * 1000, count_rows(result))
+        return result
+
+    return wrapper
+
+def instrument_public_methods(exclude: tuple = ()):
+    """Class decorator: bọc tất cả method public (trừ generator và exclude) bằng timed"""
+    def decorate(cls):
+        for attr_name, attr in list(vars(cls).items()):
+            if attr_name.startswith('_') or attr_name in exclude:
+                continue
+            if not inspect.isfunction(attr) or inspect.isgeneratorfunction(attr):
+                continue
+            setattr(cls, attr_name, timed(attr))
+        return cls
+    return decorate
@@ -0,0 +1,177 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from cache_utils import MISSING
+
+class PersistentCache:
+    """Cache phản hồi API lưu trong SQLite: TTL từng mục, stale-while-revalidate, chế độ offline
+
+    - Mục còn hạn: trả về ngay.
+    - Mục hết hạn: trả về giá trị cũ ngay và làm mới trong thread nền (mỗi key tối đa một lần cùng lúc).
+    - Chưa có mục: gọi fetch đồng bộ và lưu lại.
+    - offline=True: chỉ đọc cache, không bao giờ gọi fetch.
+    """
+
+    def __init__(self, path: str = "api_cache.db", default_ttl: float = 7 * 24 * 3600,
+                 offline: bool = False, seed_path: Optional[str] = None):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._refreshing = set()  # Các key đang được làm mới trong nền
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL;")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS api_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID;
+            """)
+            self.conn.commit()
+        if seed_path and os.path.exists(seed_path):
+            self.seed(seed_path)
+
+    def get_entry(self, key: str) -> Tuple[Any, bool]:
+        """Trả về (giá trị, còn hạn hay không), hoặc (MISSING, False) nếu chưa có"""
+        with self._lock:
+            row = self.conn.execute("SELECT value, expires_at FROM api_cache WHERE key = ?;", (key,)).fetchone()
+        if row is None:
+            return MISSING, False
+        return json.loads(row[0]), row[1] > time.time()
+
+    def get_ttl(self, key: str) -> Optional[float]:
+        """Số giây còn lại trước khi mục hết hạn (<= 0 nếu đã hết hạn), None nếu chưa có"""
+        with self._lock:
+            row = self.conn.execute("SELECT expires_at FROM api_cache WHERE key = ?;", (key,)).fetchone()
+        return None if row is None else row[0] - time.time()
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Lưu giá trị (dạng JSON) với thời gian sống ttl giây"""
+        now = time.time()
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO api_cache (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?);",
+                (key, json.dumps(value, ensure_ascii=False), now, now + ttl)
+            )
+            self.conn.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            self.conn.execute("DELETE FROM api_cache WHERE key = ?;", (key,))
+            self.conn.commit()
+
+    def _refresh(self, key: str, fetch: Callable[[], Any], ttl: Optional[float]):
+        try:
+            self.set(key, fetch(), ttl)
+        except Exception as e:
+            # Giữ giá trị cũ, lần gọi sau sẽ thử lại
+            print(f"Loi lam moi cache {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh_in_background(self, key: str, fetch: Callable[[], Any], ttl: Optional[float]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, fetch, ttl), daemon=True).start()
+
+    def _refresh_many(self, keys: List[str], fetch_many: Callable[[List[str]], Any]):
+        try:
+            fetch_many(keys)
+        except Exception as e:
+            print(f"Loi lam moi cache ({len(keys)} key): {e}")
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keys)
+
+    def refresh_many_in_background(self, keys: List[str], fetch_many: Callable[[List[str]], Any]) -> List[str]:
+        """Làm mới nhiều key trong một thread nền (vd: lấy theo lô); key đang được làm mới thì bỏ qua
+
+        fetch_many(keys) tự lưu kết quả bằng set(); key lỗi giữ giá trị cũ. Trả về các key được làm mới.
+        """
+        with self._lock:
+            keys = [key for key in dict.fromkeys(keys) if key not in self._refreshing]
+            self._refreshing.update(keys)
+        if keys:
+            threading.Thread(target=self._refresh_many, args=(keys, fetch_many), daemon=True).start()
+        return keys
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Lấy từ cache theo stale-while-revalidate; trả về MISSING nếu offline và chưa có trong cache
+
+        Lỗi của fetch (khi chưa có mục trong cache) được ném ra cho người gọi; kết quả lỗi không được lưu.
+        """
+        value, fresh = self.get_entry(key)
+        if value is not MISSING:
+            if not fresh and not self.offline:
+                self._refresh_in_background(key, fetch, ttl)
+            return value
+        if self.offline:
+            return MISSING
+        value = fetch()
+        self.set(key, value, ttl)
+        return value
+
+    def seed(self, path: str) -> int:
+        """Nạp snapshot JSON {key: value} đi kèm ứng dụng; chỉ thêm các key chưa có, coi như đã hết hạn
+
+        Nhờ vậy trang khởi động lạnh có dữ liệu ngay, còn bản mới được lấy dần trong nền.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        with self._lock:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO api_cache (key, value, stored_at, expires_at) VALUES (?, ?, 0, 0);",
+                [(key, json.dumps(value, ensure_ascii=False)) for key, value in snapshot.items()]
+            )
+            self.conn.commit()
+        return max(cursor.rowcount, 0)
+
+    def export_seed(self, path: str) -> int:
+        """Ghi toàn bộ cache ra file JSON để đóng gói làm snapshot seed"""
+        with self._lock:
+            rows = self.conn.execute("SELECT key, value FROM api_cache ORDER BY key;").fetchall()
+        snapshot: Dict[str, Any] = {key: json.loads(value) for key, value in rows}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, indent=1)
+        return len(snapshot)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class LazyPersistentCache:
+    """Cache mặc định: chỉ mở (và tạo) file SQLite ở lần dùng đầu tiên, không phải khi import module"""
+
+    def __init__(self, factory: Callable[[], PersistentCache]):
+        self._factory = factory
+        self._instance: Optional[PersistentCache] = None
+        self._lock = threading.Lock()
+
+    def get_instance(self) -> PersistentCache:
+        """PersistentCache thật phía sau, tạo nếu chưa có"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+    def set_instance(self, instance: Optional[PersistentCache]):
+        """Dùng một PersistentCache khác làm mặc định (None: tạo lại từ factory ở lần dùng sau)"""
+        with self._lock:
+            self._instance = instance
+
+    def __getattr__(self, name: str) -> Any:
+        # Thuộc tính đặc biệt (__mro__, __wrapped__...) do công cụ dò xét hỏi tới không được mở file cache
+        if name.startswith('__') and name.endswith('__'):
+            raise AttributeError(name)
+        return getattr(self.get_instance(), name)
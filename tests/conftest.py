@@ -0,0 +1,54 @@
+import os
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database_manager import DatabaseManager, db_manager
+
+COUNTRIES = [
+    ("VNM", "VN", "Viet Nam", "EAS", "LMC"),
+    ("USA", "US", "United States", "NAC", "HIC"),
+    ("FRA", "FR", "France", "ECS", "HIC"),
+    ("WLD", "1W", "World", None, None),
+]
+INDICATORS = [
+    ("NY.GDP.MKTP.CD", "GDP (current US$)", "US$", None, "Economy"),
+    ("SP.POP.TOTL", "Population, total", "people", None, "Population"),
+]
+
+def seed(db: DatabaseManager, years=range(2018, 2023)):
+    """Nạp dữ liệu mẫu nhỏ: 4 quốc gia x 2 chỉ số x 5 năm (mã quốc gia ISO3 trong country_data)"""
+    with db.write_transaction() as conn:
+        conn.executemany("INSERT INTO countries (iso_code, iso2_code, name, region, income_level) "
+                         "VALUES (?, ?, ?, ?, ?);", COUNTRIES)
+        conn.executemany("INSERT INTO indicators (code, name, unit, description, category) "
+                         "VALUES (?, ?, ?, ?, ?);", INDICATORS)
+        rows = []
+        for i, (iso_code, *_rest) in enumerate(COUNTRIES):
+            for year in years:
+                rows.append((iso_code, "NY.GDP.MKTP.CD", year, 1e9 * (i + 1) + year, "2024-01-01"))
+                rows.append((iso_code, "SP.POP.TOTL", year, 1e6 * (i + 1) + year, "2024-01-01"))
+        conn.executemany("INSERT INTO country_data (country_code, indicator_code, year, value, last_updated) "
+                         "VALUES (?, ?, ?, ?, ?);", rows)
+    db.refresh_metadata()
+    db.refresh_country_series()
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "worldbank.db"), enable_metrics=False)
+    yield manager
+    manager.close_connection()
+
+@pytest.fixture
+def seeded_db(db):
+    seed(db)
+    return db
+
+@pytest.fixture
+def default_db(seeded_db):
+    """Dùng seeded_db làm db_manager mặc định trong suốt test"""
+    db_manager.set_instance(seeded_db)
+    yield seeded_db
+    db_manager.set_instance(None)
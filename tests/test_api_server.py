@@ -0,0 +1,96 @@
+import json
+import urllib.request
+import pyarrow as pa
+import pytest
+import api_server
+import api_utils
+import cache_utils
+from api_server import CountryInfoApi, start_background_server
+from api_utils import ARROW_STREAM_MIME
+from http_client import HttpClient
+from database_manager import DatabaseManager, db_manager
+
+@pytest.fixture
+def server(seeded_db):
+    # db_manager mặc định là một database khác (rỗng): server phải chỉ đọc từ db được truyền vào
+    server = start_background_server(db=seeded_db)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def empty_default_db(tmp_path):
+    other = DatabaseManager(str(tmp_path / "other.db"), enable_metrics=False)
+    db_manager.set_instance(other)
+    yield other
+    db_manager.set_instance(None)
+    other.close_connection()
+
+def _get(url, accept=None):
+    request = urllib.request.Request(url, headers={"Accept": accept} if accept else {})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return response.headers.get("Content-Type"), response.read()
+
+def test_routes_read_the_server_database(empty_default_db, server):
+    _, body = _get(server + "/country_info/map")
+    countries = {country['iso_code']: country for country in json.loads(body)}
+    assert set(countries) == {"VNM", "USA", "FRA", "WLD"}
+    assert countries["VNM"]['indicator']["SP.POP.TOTL"] == 1002022.0
+
+    _, body = _get(server + "/country_info/map?indicators=SP.POP.TOTL")
+    assert all(set(country['indicator']) == {"SP.POP.TOTL"} for country in json.loads(body))
+
+    content_type, body = _get(server + "/country_info/map", accept=ARROW_STREAM_MIME)
+    assert content_type == ARROW_STREAM_MIME
+    assert pa.ipc.open_stream(body).read_all().num_rows == 4
+
+    _, body = _get(server + "/country_info/map/FRA")
+    data = json.loads(body)
+    assert data['country_name'] == "France"
+    assert [point['year'] for point in data['data']["NY.GDP.MKTP.CD"]['data']] == [2018, 2019, 2020, 2021, 2022]
+
+def test_country_info_map_client_returns_private_frames(server, monkeypatch):
+    monkeypatch.setattr(api_utils, "LOCAL_API_BASE_URL", server)
+    first = api_utils.get_country_info_map()
+    assert set(first['iso_code']) == {"VNM", "USA", "FRA", "WLD"}
+    first.loc[:, "SP.POP.TOTL"] = 0.0
+    # Lần sau server trả 304, dữ liệu lấy lại từ cache ETag
+    second = api_utils.get_country_info_map()
+    assert second is not first
+    assert second.set_index("iso_code").loc["VNM", "SP.POP.TOTL"] == 1002022.0
+
+def test_country_info_map_client_reports_errors(monkeypatch, capsys):
+    monkeypatch.setattr(api_utils, "LOCAL_API_BASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setattr(api_utils, "http_client", HttpClient(retries=0))
+    frame = api_utils.get_country_info_map(["SP.POP.TOTL"])
+    assert frame.empty and list(frame.columns) == api_utils.DB_COUNTRY_KEY_COLUMNS + ["SP.POP.TOTL"]
+    assert "Loi lay /country_info/map" in capsys.readouterr().out
+
+def test_country_detail_cache_follows_upstream_freshness(seeded_db, monkeypatch):
+    upstream = {'info': {"error": "Lỗi: timeout"}, 'ttl': None, 'calls': 0}
+    def fake_info(code):
+        upstream['calls'] += 1
+        return dict(upstream['info'])
+    monkeypatch.setattr(api_server, "get_country_info_api", fake_info)
+    monkeypatch.setattr(api_server, "get_country_info_ttl", lambda code: upstream['ttl'])
+    clock = [1000.0]
+    monkeypatch.setattr(cache_utils.time, "monotonic", lambda: clock[0])
+    api = CountryInfoApi(seeded_db)
+    
+    # Lỗi tạm thời của REST Countries: phản hồi dự phòng / 404 chỉ được cache trong thời gian ngắn
+    assert json.loads(api.get_response('country_detail', ("VNM",)).bodies['identity'])['capital'] == "N/A"
+    assert api.get_response('country_detail', ("XXX",)).status == 404
+    upstream['info'] = {"code": "VNM", "common": "Vietnam", "capital": "Hanoi", "region": "Asia",
+                        "income_level": "N/A"}
+    upstream['ttl'] = 3600.0
+    clock[0] += api_server.RETRY_RESPONSE_TTL + 1
+    assert json.loads(api.get_response('country_detail', ("VNM",)).bodies['identity'])['capital'] == "Hanoi"
+    
+    # Phản hồi thành công sống không lâu hơn mục trong api_cache
+    calls = upstream['calls']
+    clock[0] += 3599
+    api.get_response('country_detail', ("VNM",))
+    assert upstream['calls'] == calls
+    clock[0] += 2
+    api.get_response('country_detail', ("VNM",))
+    assert upstream['calls'] == calls + 1
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+import pytest
+import api_utils
+from database_manager import db_manager
+from response_cache import PersistentCache
+from worldbank_ingest import load_files
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+@pytest.fixture
+def ingested_db(db):
+    """Database nạp từ file dump mẫu qua worldbank_ingest (country_data dùng mã ISO3)"""
+    load_files([FIXTURES], db=db, workers=1)
+    db_manager.set_instance(db)
+    yield db
+    db_manager.set_instance(None)
+
+def test_ingested_data_reaches_map_and_country_queries(ingested_db):
+    countries = {country['iso_code']: country for country in api_utils.get_db_countries()}
+    assert set(countries) == {"VNM", "USA"}
+    assert countries["VNM"]['indicator'] == {"NY.GDP.MKTP.CD": 408802378905.23, "SP.POP.TOTL": 98186856.0}
+
+    data = api_utils.get_country_data_by_iso3("VNM")
+    assert data['country_name'] == "Viet Nam"
+    assert [point['year'] for point in data['data']["SP.POP.TOTL"]['data']] == [2020, 2021, 2022]
+
+def test_batch_and_single_country_queries_return_none_for_null(ingested_db):
+    ingested_db.execute_query("UPDATE country_data SET value = NULL WHERE country_code = 'VNM' "
+                              "AND indicator_code = 'SP.POP.TOTL' AND year = 2021;")
+    batch = api_utils.get_countries_data_by_iso3(["VNM"], indicators=["SP.POP.TOTL"])["VNM"]
+    single = api_utils.get_country_data_by_iso3("VNM")
+    points = {point['year']: point['value'] for point in batch['data']["SP.POP.TOTL"]['data']}
+    assert points[2021] is None
+    assert points == {point['year']: point['value'] for point in single['data']["SP.POP.TOTL"]['data']}
+    assert json.dumps(batch, allow_nan=False)  # Không có NaN trong payload
+
+def test_csv_only_ingest_reaches_map_payload(db, tmp_path):
+    # CSV không có mã ISO2: iso2_code NULL vẫn phải có mặt trên bản đồ
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir()
+    for name in os.listdir(FIXTURES):
+        if name.endswith(".csv"):
+            shutil.copy(os.path.join(FIXTURES, name), csv_dir / name)
+    load_files([str(csv_dir)], db=db, workers=1)
+    
+    countries = api_utils.get_db_countries(db=db)
+    assert [country['iso_code'] for country in countries] == ["USA", "VNM"]
+    assert countries[1] == {"iso_code": "VNM", "iso2_code": None, "name": "Viet Nam",
+                            "indicator": {"SP.POP.TOTL": 98186856.0}}
+    assert json.loads(api_utils.get_db_countries_json(db=db)) == countries
+    assert list(api_utils.get_db_countries_frame(["SP.POP.TOTL"], db=db)["iso_code"]) == ["USA", "VNM"]
+
+@pytest.fixture
+def rest_countries(tmp_path, monkeypatch):
+    """REST Countries giả trên cổng ngẫu nhiên: /alpha?codes=A,B trả về các mã đã biết, ghi lại từng request"""
+    known = {"VNM", "USA", "FRA", "DEU", "JPN"}
+    state = {'requests': [], 'gate': threading.Event()}
+    state['gate'].set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            codes = parse_qs(urlsplit(self.path).query)['codes'][0].split(',')
+            state['requests'].append(codes)
+            state['gate'].wait(5)
+            body = json.dumps([{"cca3": code, "name": {"common": code.title()}} for code in codes if code in known])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    cache = PersistentCache(str(tmp_path / "api_cache.db"))
+    monkeypatch.setattr(api_utils, "REST_COUNTRIES_BASE_URL", base_url)
+    monkeypatch.setattr(api_utils, "api_cache", cache)
+    # URL vừa đủ cho hai mã mỗi lô ("AAA%2CBBB")
+    base_length = len(f"{base_url}/alpha?codes=&fields={quote(api_utils.COUNTRY_INFO_FIELDS)}")
+    monkeypatch.setattr(api_utils, "MAX_URL_LENGTH", base_length + 9)
+    yield state
+    state['gate'].set()
+    server.shutdown()
+    server.server_close()
+    cache.close()
+
+def test_countries_info_batches_and_caches(rest_countries):
+    result = api_utils.get_countries_info_api(["vnm", " USA ", "FRA", "DEU", "XXX", "VNM"])
+    assert set(result['data']) == {"VNM", "USA", "FRA", "DEU"}
+    assert result['errors'] == {"XXX": "Không có dữ liệu"}
+    # Các lô chạy song song, thứ tự request không cố định
+    assert sorted(rest_countries['requests']) == [["FRA", "DEU"], ["VNM", "USA"], ["XXX"]]
+
+    # Lần sau đọc từ cache, kể cả get_country_info_api với mã chưa chuẩn hóa
+    again = api_utils.get_countries_info_api(["VNM", "USA", "FRA", "DEU"])
+    assert again['data'] == {code: result['data'][code] for code in ("VNM", "USA", "FRA", "DEU")}
+    assert api_utils.get_country_info_api(" vnm ")['common'] == "Vnm"
+    assert len(rest_countries['requests']) == 3
+
+def test_stale_codes_refresh_once_in_background(rest_countries):
+    for code in ("VNM", "USA", "FRA"):
+        api_utils.api_cache.set(api_utils._country_cache_key(code), {"code": code, "common": "old"}, ttl=-1)
+    rest_countries['gate'].clear()  # Giữ request làm mới đang chạy
+
+    for _ in range(3):
+        result = api_utils.get_countries_info_api(["VNM", "USA", "FRA"])
+        assert {info['common'] for info in result['data'].values()} == {"old"}
+    api_utils.get_country_info_api("vnm")
+
+    rest_countries['gate'].set()
+    deadline = time.time() + 5
+    while api_utils.api_cache._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not api_utils.api_cache._refreshing
+    # Ba lần gọi hết hạn chỉ sinh một lượt làm mới: 3 mã, 2 lô
+    assert sorted(rest_countries['requests']) == [["FRA"], ["VNM", "USA"]]
+    assert api_utils.get_countries_info_api(["VNM"])['data']["VNM"]['common'] == "Vnm"
@@ -0,0 +1,81 @@
+import os
+import sqlite3
+import api_utils
+from conftest import ROOT
+from database_manager import DatabaseManager
+from db_schema import COUNTRY_SERIES_TRIGGER_NAMES
+from worldbank_ingest import load_files
+
+def _dirty(db):
+    return {(row['country_code'], row['indicator_code'])
+            for row in db.execute_query("SELECT country_code, indicator_code FROM country_series_dirty;")}
+
+def _values(series, indicator_code):
+    return {point['year']: point['value'] for point in series[indicator_code]['data']}
+
+def test_plain_write_repacks_series_in_same_write(seeded_db):
+    assert _dirty(seeded_db) == set()
+    seeded_db.execute_query("UPDATE country_data SET value = NULL WHERE country_code = 'VNM' "
+                            "AND indicator_code = 'SP.POP.TOTL' AND year = 2020;")
+    seeded_db.execute_query("INSERT INTO country_data (country_code, indicator_code, year, value) "
+                            "VALUES ('VNM', 'SP.POP.TOTL', 2023, 5.0);")
+    seeded_db.execute_query("DELETE FROM country_data WHERE country_code = 'VNM' AND indicator_code = 'NY.GDP.MKTP.CD';")
+    assert _dirty(seeded_db) == set()
+    
+    series = seeded_db.get_country_series("VNM")
+    assert set(series) == {"SP.POP.TOTL"}
+    assert [point['year'] for point in series["SP.POP.TOTL"]['data']] == [2023, 2022, 2021, 2020, 2019, 2018]
+    assert _values(series, "SP.POP.TOTL")[2020] is None
+    assert _values(series, "SP.POP.TOTL")[2023] == 5.0
+    assert not seeded_db.execute_query("SELECT 1 FROM country_series WHERE country_code = 'VNM' "
+                                       "AND indicator_code = 'NY.GDP.MKTP.CD';")
+
+def test_read_does_not_write_dirty_series(seeded_db):
+    # Ghi từ tiến trình khác (không qua DatabaseManager): chuỗi bị đánh dấu nhưng chưa đóng gói lại
+    conn = sqlite3.connect(seeded_db.db_path)
+    conn.execute("UPDATE country_data SET value = 9.0 WHERE country_code = 'FRA' "
+                 "AND indicator_code = 'SP.POP.TOTL' AND year = 2021;")
+    conn.commit()
+    conn.close()
+    version = seeded_db.get_data_version()
+    
+    series = seeded_db.get_country_series("FRA")
+    assert _values(series, "SP.POP.TOTL")[2021] == 9.0
+    assert _dirty(seeded_db) == {("FRA", "SP.POP.TOTL")}
+    assert seeded_db.get_data_version() == version
+    
+    with seeded_db.write_transaction():
+        pass
+    assert _dirty(seeded_db) == set()
+    assert _values(seeded_db.get_country_series("FRA"), "SP.POP.TOTL")[2021] == 9.0
+
+def test_read_only_instance_reads_dirty_series_from_country_data(seeded_db):
+    seeded_db.execute_query("UPDATE country_data SET value = 7.0 WHERE country_code = 'USA' "
+                            "AND indicator_code = 'SP.POP.TOTL' AND year = 2022;")
+    seeded_db.execute_query("PRAGMA wal_checkpoint(TRUNCATE);")
+    reader = DatabaseManager(seeded_db.db_path, serving=True, enable_metrics=False)
+    try:
+        series = reader.get_country_series("USA")
+        assert _values(series, "SP.POP.TOTL")[2022] == 7.0
+        assert _values(series, "NY.GDP.MKTP.CD") == _values(seeded_db.get_country_series("USA"), "NY.GDP.MKTP.CD")
+        assert series["SP.POP.TOTL"]['indicator_name'] == "Population, total"
+        assert [point['year'] for point in series["SP.POP.TOTL"]['data']] == [2022, 2021, 2020, 2019, 2018]
+    finally:
+        reader.close_connection()
+
+def test_bulk_ingest_restores_series_triggers(db):
+    load_files([os.path.join(ROOT, "tests", "fixtures")], db=db, workers=1, bulk=True)
+    names = {row['name'] for row in db.execute_query("SELECT name FROM sqlite_master WHERE type = 'trigger';")}
+    assert set(COUNTRY_SERIES_TRIGGER_NAMES) <= names
+    assert _dirty(db) == set()
+
+def test_country_data_by_iso3_uses_packed_series(default_db):
+    default_db.execute_query("UPDATE country_data SET value = 9.0 WHERE country_code = 'FRA' "
+                             "AND indicator_code = 'NY.GDP.MKTP.CD' AND year = 2021;")
+    data = api_utils.get_country_data_by_iso3("FRA")
+    assert data['country_name'] == "France"
+    gdp = data['data']["NY.GDP.MKTP.CD"]
+    assert gdp['indicator_name'] == "GDP (current US$)"
+    assert [point['year'] for point in gdp['data']] == [2018, 2019, 2020, 2021, 2022]
+    assert gdp['data'][3] == {'year': 2021, 'value': 9.0}
+    assert api_utils.get_country_data_by_iso3("XXX") == {"country_code": "XXX", "country_name": None, "data": {}}
@@ -0,0 +1,49 @@
+from data_processor import DataProcessor
+
+def test_summary_cache_hits_and_misses(default_db):
+    processor = DataProcessor()
+    first = processor.get_country_data_summary("VNM")
+    assert first['country_info']['name'] == "Viet Nam"
+    assert [row['indicator_code'] for row in first['economic_indicators']] == ["NY.GDP.MKTP.CD"]
+    again = processor.get_country_data_summary("VNM")
+    assert again == first
+    stats = processor.get_summary_cache_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+def test_summary_is_a_private_copy(default_db):
+    processor = DataProcessor()
+    first = processor.get_country_data_summary("USA")
+    first['country_info']['name'] = "changed"
+    first['economic_indicators'].clear()
+    second = processor.get_country_data_summary("USA")
+    assert second['country_info']['name'] == "United States"
+    assert second['economic_indicators']
+
+def test_unknown_country_is_not_cached(default_db):
+    processor = DataProcessor()
+    assert processor.get_country_data_summary("XXX") is None
+    assert len(processor.summary_cache) == 0
+    default_db.execute_query("INSERT INTO countries (iso_code, name) VALUES ('XXX', 'Later');")
+    assert processor.get_country_data_summary("XXX")['country_info']['name'] == "Later"
+
+def test_summary_follows_data_version_and_invalidation(default_db):
+    processor = DataProcessor()
+    before = processor.get_country_data_summary("FRA")
+    default_db.execute_query("UPDATE country_data SET value = 1.0 WHERE country_code = 'FRA' "
+                             "AND indicator_code = 'SP.POP.TOTL' AND year = 2022;")
+    after = processor.get_country_data_summary("FRA")
+    assert before['population_indicators'][0]['value'] != 1.0
+    assert after['population_indicators'][0]['value'] == 1.0
+
+    processor.invalidate_summaries(["FRA"])
+    processor.get_country_data_summary("FRA")
+    assert processor.get_summary_cache_stats()['misses'] == 3
+    processor.invalidate_summaries()
+    assert len(processor.summary_cache) == 0
+
+def test_warm_up_fills_cache(default_db):
+    processor = DataProcessor()
+    assert processor.warm_up_summaries(workers=2, background=False) is None
+    assert len(processor.summary_cache) == 4
+    processor.get_country_data_summary("WLD")
+    assert processor.get_summary_cache_stats()['hits'] == 1
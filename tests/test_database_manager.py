@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import pyarrow as pa
+import pytest
+from conftest import ROOT
+from database_manager import DatabaseManager, LazyDatabaseManager
+
+def test_import_does_not_create_database(tmp_path):
+    subprocess.run([sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import database_manager"],
+                   cwd=tmp_path, check=True)
+    assert not os.path.exists(tmp_path / "worldbank.db")
+
+def test_write_while_iterating_without_pool():
+    db = DatabaseManager(":memory:", enable_metrics=False)
+    db.execute_query("INSERT INTO indicators (code, name) VALUES ('A', 'a');")
+    db.execute_query("INSERT INTO indicators (code, name) VALUES ('B', 'b');")
+
+    def iterate_and_write():
+        for row in db.execute_query_iter("SELECT code FROM indicators;", batch_size=1):
+            db.execute_query("INSERT INTO countries (iso_code, name) VALUES (?, ?);", (row['code'], row['code']))
+
+    worker = threading.Thread(target=iterate_and_write, daemon=True)
+    worker.start()
+    worker.join(timeout=5)
+    assert not worker.is_alive(), "ghi trong luc duyet execute_query_iter bi treo"
+    assert len(db.get_all_countries()) == 2
+
+def test_execute_query_arrow_raises_on_error(db):
+    with pytest.raises(sqlite3.OperationalError):
+        db.execute_query_arrow("SELECT missing_column FROM countries;")
+
+def test_execute_query_arrow_schema(seeded_db):
+    schema = pa.schema([('country_code', pa.string()), ('year', pa.int64()), ('value', pa.float64())])
+    table = seeded_db.execute_query_arrow("SELECT country_code, year, value FROM country_data;",
+                                          batch_size=7, schema=schema)
+    assert table.schema == schema
+    assert table.num_rows == 40
+
+    # Không có schema: lô đầu toàn NULL, lô sau có giá trị vẫn ghép được với kiểu suy ra
+    seeded_db.execute_query("UPDATE country_data SET value = NULL WHERE country_code = 'FRA';")
+    inferred = seeded_db.execute_query_arrow(
+        "SELECT value FROM country_data ORDER BY country_code, indicator_code, year;", batch_size=10)
+    assert inferred.schema.field('value').type == pa.float64()
+    assert inferred.column('value').null_count == 10
+
+    empty = seeded_db.execute_query_arrow("SELECT year, value FROM country_data WHERE 0;", schema=schema.remove(0))
+    assert empty.num_rows == 0 and empty.schema == schema.remove(0)
+
+def test_lazy_manager_dunder_lookup_does_not_open_database():
+    created = []
+    lazy = LazyDatabaseManager(factory=lambda: created.append(1))
+    assert not hasattr(lazy, '__mro__')
+    assert not hasattr(lazy, '__wrapped__')
+    assert created == []
+
+def test_in_memory_readers_share_one_copy(seeded_db):
+    reader = DatabaseManager(seeded_db.db_path, in_memory=True, pool_size=2, enable_metrics=False)
+    try:
+        assert reader._memory_anchor is not None
+        name = reader._memory_anchor.execute("PRAGMA database_list;").fetchone()[2]
+        with reader._read_connection() as first, reader._read_connection() as second:
+            assert first is not second
+            # Mọi kết nối đọc mở cùng một database memdb, chỉ đọc
+            for conn in (first, second):
+                assert conn.execute("PRAGMA database_list;").fetchone()[2] == name
+                assert conn.execute("SELECT COUNT(*) FROM country_data;").fetchone()[0] == 40
+            with pytest.raises(sqlite3.OperationalError):
+                first.execute("DELETE FROM countries;")
+        
+        version = reader.get_data_version()
+        seeded_db.execute_query("DELETE FROM country_data WHERE year = 2018;")
+        assert reader.get_data_version() == version  # Bản sao trong RAM không đổi cho tới khi nạp lại
+        assert reader.reload_memory_copy()
+        assert reader.get_data_version() > version
+        assert reader.execute_query("SELECT COUNT(*) AS n FROM country_data;")[0]['n'] == 32
+        assert reader._memory_anchor.execute("PRAGMA database_list;").fetchone()[2] != name
+    finally:
+        reader.close_connection()
+
+def test_in_memory_limit_counts_one_copy(seeded_db):
+    seeded_db.execute_query("PRAGMA wal_checkpoint(TRUNCATE);")
+    size_mb = os.path.getsize(seeded_db.db_path) / (1024 * 1024)
+    reader = DatabaseManager(seeded_db.db_path, in_memory=True, pool_size=4, enable_metrics=False,
+                             memory_limit_mb=size_mb * 3)
+    try:
+        assert reader._memory_anchor is not None  # Pool 4 kết nối vẫn chỉ dùng một bản sao
+    finally:
+        reader.close_connection()
+    reader = DatabaseManager(seeded_db.db_path, in_memory=True, enable_metrics=False, memory_limit_mb=size_mb / 2)
+    try:
+        assert reader._memory_anchor is None  # Vượt giới hạn: đọc từ file
+        assert reader.execute_query("SELECT COUNT(*) AS n FROM countries;")[0]['n'] == 4
+    finally:
+        reader.close_connection()
+
+def _create_v3_database(path):
+    """Database cũ ở schema version 3: chưa có khoá duy nhất trên country_data"""
+    from db_schema import SCHEMA_MIGRATIONS
+    conn = sqlite3.connect(path)
+    for version, _description, statements in SCHEMA_MIGRATIONS[:3]:
+        for statement in statements:
+            statement(conn) if callable(statement) else conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {version};")
+    conn.executemany(
+        "INSERT INTO country_data (country_code, indicator_code, year, value) VALUES (?, ?, ?, ?);",
+        [("VNM", "SP.POP.TOTL", 2020, 1.0), ("VNM", "SP.POP.TOTL", 2020, 2.0), ("VNM", "SP.POP.TOTL", 2021, 3.0)],
+    )
+    conn.commit()
+    conn.close()
+
+def test_existing_database_is_not_migrated_on_open(tmp_path):
+    path = str(tmp_path / "old.db")
+    _create_v3_database(path)
+    manager = DatabaseManager(path, pool_size=1)
+    try:
+        assert manager.get_schema_version() == 3
+        assert manager.execute_query("SELECT COUNT(*) AS n FROM country_data;")[0]['n'] == 3
+    finally:
+        manager.close_connection()
+
+def test_migration_reports_duplicates_instead_of_deleting(tmp_path, capsys):
+    path = str(tmp_path / "old.db")
+    _create_v3_database(path)
+    manager = DatabaseManager(path, pool_size=1, auto_migrate=False)
+    try:
+        manager.ensure_schema()
+        assert "VNM/SP.POP.TOTL/2020 (x2)" in capsys.readouterr().out
+        assert manager.get_schema_version() == 3
+        assert manager.find_duplicate_rows()[0] == 1
+        assert manager.execute_query("SELECT COUNT(*) AS n FROM country_data;")[0]['n'] == 3
+        
+        assert manager.dedupe_country_data() == 1
+        manager.ensure_schema()
+        from db_schema import latest_schema_version
+        assert manager.get_schema_version() == latest_schema_version()
+        rows = manager.execute_query("SELECT year, value FROM country_data ORDER BY year;")
+        assert [(row['year'], row['value']) for row in rows] == [(2020, 2.0), (2021, 3.0)]
+    finally:
+        manager.close_connection()
@@ -0,0 +1,79 @@
+import sqlite3
+from db_schema import METADATA_STALE_KEY, refresh_db_metadata_if_stale
+from db_snapshot import build_snapshot, validate_snapshot
+from database_manager import DatabaseManager
+
+def _is_stale(db):
+    return bool(db.execute_query("SELECT 1 FROM db_metadata WHERE key = ?;", (METADATA_STALE_KEY,)))
+
+def test_empty_database_has_no_year_range(db):
+    stats = db.get_database_stats()
+    assert 'year_range' not in stats
+    assert stats['total_data_records'] == 0
+    assert db.get_available_years() == []
+
+def test_plain_writes_keep_stats_and_years_current(seeded_db):
+    assert seeded_db.get_database_stats()['year_range'] == {'min': 2018, 'max': 2022}
+    assert not _is_stale(seeded_db)
+
+    seeded_db.execute_query("INSERT INTO country_data (country_code, indicator_code, year, value) "
+                            "VALUES ('VNM', 'SP.POP.TOTL', 2030, 1.0);")
+    seeded_db.execute_query("INSERT INTO countries (iso_code, name, region) VALUES ('JPN', 'Japan', 'EAP');")
+    # db_metadata được tính lại ngay trong lần ghi
+    assert not _is_stale(seeded_db)
+
+    stats = seeded_db.get_database_stats()
+    assert stats['year_range'] == {'min': 2018, 'max': 2030}
+    assert stats['total_data_records'] == 41
+    assert stats['total_countries'] == 5
+    assert 'EAP' in stats['regions']
+    assert seeded_db.get_available_years('SP.POP.TOTL')[0] == 2030
+    assert not _is_stale(seeded_db)
+
+def test_value_only_update_does_not_mark_stale(seeded_db):
+    seeded_db.execute_query("UPDATE country_data SET value = 0 WHERE country_code = 'VNM';")
+    assert not _is_stale(seeded_db)
+    with seeded_db.write_transaction() as conn:
+        assert refresh_db_metadata_if_stale(conn) is False
+
+def _write_outside_manager(db, sql):
+    """Ghi thẳng vào file (như một tiến trình khác), db_metadata chỉ bị trigger đánh dấu cũ"""
+    conn = sqlite3.connect(db.db_path)
+    conn.execute(sql)
+    conn.commit()
+    conn.close()
+
+def test_read_does_not_write_stale_metadata(seeded_db):
+    _write_outside_manager(seeded_db, "DELETE FROM country_data WHERE year = 2018;")
+    version = seeded_db.get_data_version()
+    assert seeded_db.get_database_stats()['year_range'] == {'min': 2019, 'max': 2022}
+    assert 2018 not in seeded_db.get_available_years()
+    assert _is_stale(seeded_db)
+    assert seeded_db.get_data_version() == version
+    
+    # Đọc được khi đang giữ transaction ghi (không tự mở transaction ghi khác)
+    with seeded_db.write_transaction():
+        assert 2018 not in seeded_db.get_available_years()
+    assert not _is_stale(seeded_db)
+
+def test_read_only_instance_computes_stale_metadata(seeded_db, tmp_path):
+    _write_outside_manager(seeded_db, "DELETE FROM country_data WHERE year = 2018;")
+    # serving mở file với immutable=1, không đọc -wal
+    seeded_db.execute_query("PRAGMA wal_checkpoint(TRUNCATE);")
+    reader = DatabaseManager(seeded_db.db_path, serving=True, enable_metrics=False)
+    try:
+        assert reader.get_database_stats()['year_range'] == {'min': 2019, 'max': 2022}
+        assert 2018 not in reader.get_available_years()
+    finally:
+        reader.close_connection()
+    assert _is_stale(seeded_db)
+
+def test_snapshot_refreshes_stale_metadata(seeded_db, tmp_path):
+    seeded_db.execute_query("DELETE FROM countries WHERE iso_code = 'WLD';")
+    path = build_snapshot(seeded_db.db_path, str(tmp_path / "snapshots"), vintage="v1")
+    assert validate_snapshot(path) == []
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT value FROM db_metadata WHERE key = 'total_countries';").fetchone()[0] == '3'
+    finally:
+        conn.close()
@@ -0,0 +1,49 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from http_client import HttpClient
+
+@pytest.fixture
+def etag_server():
+    """Server trả JSON kèm ETag cố định, 304 khi client gửi If-None-Match khớp"""
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            requests_seen.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("ETag", '"v1"')
+                self.end_headers()
+                return
+            body = json.dumps({"items": [1, 2, 3]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1"')
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/data", requests_seen
+    server.shutdown()
+    server.server_close()
+
+def test_not_modified_returns_private_copy(etag_server):
+    url, requests_seen = etag_server
+    client = HttpClient(retries=0)
+    try:
+        first = client.get_json(url)
+        first["items"].append(99)  # Sửa dữ liệu trả về không được ảnh hưởng bản lưu theo ETag
+        second = client.get_json(url)
+        assert second == {"items": [1, 2, 3]}
+        second["items"].clear()
+        assert client.get_json(url) == {"items": [1, 2, 3]}
+        assert requests_seen == [None, '"v1"', '"v1"']
+    finally:
+        client.close()
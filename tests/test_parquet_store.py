@@ -0,0 +1,69 @@
+import os
+from data_processor import DataProcessor
+from database_manager import DatabaseManager, db_manager
+from parquet_store import ParquetAnalytics, export_parquet, read_manifest
+
+def _top(reader):
+    return [(row['country_code'], row['year'], row['value'])
+            for row in reader.get_top_countries_by_indicator("SP.POP.TOTL", limit=2)]
+
+def test_export_records_write_counter(seeded_db, tmp_path):
+    root = str(tmp_path / "parquet")
+    assert export_parquet(root, seeded_db) == 40
+    manifest = read_manifest(root)
+    assert manifest['write_counter'] == seeded_db.get_write_counter() > 0
+    assert manifest['rows'] == 40
+    assert _top(ParquetAnalytics(root)) == _top(seeded_db)
+
+def test_open_reader_follows_reexport(seeded_db, tmp_path):
+    root = str(tmp_path / "parquet")
+    export_parquet(root, seeded_db)
+    analytics = ParquetAnalytics(root)
+    before = _top(analytics)
+
+    seeded_db.execute_query("UPDATE country_data SET value = 1e12 WHERE country_code = 'VNM' AND year = 2022;")
+    export_parquet(root, seeded_db)
+    assert not os.path.exists(root + ".old") and not os.path.exists(root + ".tmp")
+    # Không gọi refresh(): reader thấy manifest mới và mở lại bản xuất
+    assert _top(analytics) != before
+    assert _top(analytics)[0] == ("VNM", 2022, 1e12)
+    assert analytics.write_counter == seeded_db.get_write_counter()
+
+def test_processor_falls_back_to_db_when_export_is_stale(default_db, tmp_path):
+    root = str(tmp_path / "parquet")
+    processor = DataProcessor()
+    processor.enable_parquet(root, export=True)
+    assert processor._analytics_reader() is processor.parquet
+
+    default_db.execute_query("UPDATE country_data SET value = 1e12 WHERE country_code = 'FRA' AND year = 2022;")
+    assert processor._analytics_reader() is not processor.parquet
+    assert processor.get_top_countries("SP.POP.TOTL", limit=1)[0]['country_code'] == "FRA"
+
+    processor.enable_parquet(root, export=True)
+    assert processor._analytics_reader() is processor.parquet
+    assert processor.get_top_countries("SP.POP.TOTL", limit=1)[0]['country_code'] == "FRA"
+
+def test_processor_detects_write_from_another_process(default_db, tmp_path):
+    root = str(tmp_path / "parquet")
+    DataProcessor().enable_parquet(root, export=True)
+    
+    # Tiến trình khác ghi qua DatabaseManager của nó; tiến trình mới mở database có data_version bắt đầu lại từ 0
+    other = DatabaseManager(default_db.db_path, pool_size=1, enable_metrics=False)
+    other.execute_query("UPDATE country_data SET value = 1e12 WHERE country_code = 'USA' AND year = 2022;")
+    other.close_connection()
+    fresh = DatabaseManager(default_db.db_path, pool_size=1, enable_metrics=False)
+    db_manager.set_instance(fresh)
+    try:
+        processor = DataProcessor()
+        processor.enable_parquet(root)
+        assert processor._analytics_reader() is not processor.parquet
+        assert processor.get_top_countries("SP.POP.TOTL", limit=1)[0]['country_code'] == "USA"
+    finally:
+        db_manager.set_instance(default_db)
+        fresh.close_connection()
+
+def test_value_free_statements_do_not_change_write_counter(seeded_db):
+    counter = seeded_db.get_write_counter()
+    seeded_db.execute_query("PRAGMA wal_checkpoint(TRUNCATE);")
+    seeded_db.execute_query("UPDATE country_data SET value = 0 WHERE country_code = 'XXX';")
+    assert seeded_db.get_write_counter() == counter
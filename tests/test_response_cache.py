@@ -0,0 +1,99 @@
+import json
+import subprocess
+import sys
+import threading
+import time
+import pytest
+from cache_utils import MISSING
+from conftest import ROOT
+from response_cache import PersistentCache
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PersistentCache(str(tmp_path / "api_cache.db"), default_ttl=60)
+    yield cache
+    cache.close()
+
+def _wait_refreshed(cache, timeout=5.0):
+    deadline = time.time() + timeout
+    while cache._refreshing and time.time() < deadline:
+        time.sleep(0.01)
+    assert not cache._refreshing
+
+def test_entry_expires_after_ttl(cache, monkeypatch):
+    cache.set("a", {"v": 1}, ttl=10)
+    assert cache.get_entry("a") == ({"v": 1}, True)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get_entry("a") == ({"v": 1}, False)
+    assert cache.get_entry("b") == (MISSING, False)
+
+def test_missing_entry_is_fetched_once_and_stored(cache):
+    calls = []
+    fetch = lambda: calls.append(1) or {"v": len(calls)}
+    assert cache.get_or_fetch("a", fetch) == {"v": 1}
+    assert cache.get_or_fetch("a", fetch) == {"v": 1}
+    assert calls == [1]
+
+def test_fetch_error_is_raised_and_not_stored(cache):
+    def fail():
+        raise ConnectionError("down")
+    with pytest.raises(ConnectionError):
+        cache.get_or_fetch("a", fail)
+    assert cache.get_entry("a") == (MISSING, False)
+
+def test_stale_entry_is_served_while_refreshing_once(cache):
+    cache.set("a", "old", ttl=-1)
+    gate = threading.Event()
+    calls = []
+    def fetch():
+        calls.append(1)
+        gate.wait(5)
+        return "new"
+    # Hai lần đọc trong lúc đang làm mới: đều nhận giá trị cũ ngay, chỉ một lần fetch
+    assert cache.get_or_fetch("a", fetch) == "old"
+    assert cache.get_or_fetch("a", fetch) == "old"
+    gate.set()
+    _wait_refreshed(cache)
+    assert calls == [1]
+    assert cache.get_entry("a") == ("new", True)
+
+def test_failed_refresh_keeps_stale_value(cache):
+    cache.set("a", "old", ttl=-1)
+    def fail():
+        raise ConnectionError("down")
+    assert cache.get_or_fetch("a", fail) == "old"
+    _wait_refreshed(cache)
+    assert cache.get_entry("a") == ("old", False)
+
+def test_offline_mode_never_fetches(cache):
+    cache.offline = True
+    cache.set("stale", "old", ttl=-1)
+    def fetch():
+        raise AssertionError("offline khong duoc goi fetch")
+    assert cache.get_or_fetch("stale", fetch) == "old"
+    assert cache.get_or_fetch("missing", fetch) is MISSING
+    assert not cache._refreshing
+
+def test_seed_adds_missing_keys_as_stale(tmp_path, cache):
+    cache.set("a", "current")
+    seed_path = tmp_path / "seed.json"
+    seed_path.write_text(json.dumps({"a": "seeded", "b": "seeded"}), encoding="utf-8")
+    assert cache.seed(str(seed_path)) == 1
+    assert cache.get_entry("a") == ("current", True)
+    assert cache.get_entry("b") == ("seeded", False)  # Có dữ liệu ngay, làm mới ở lần đọc sau
+
+    exported = tmp_path / "export.json"
+    assert cache.export_seed(str(exported)) == 2
+    reopened = PersistentCache(str(tmp_path / "other.db"), seed_path=str(exported))
+    try:
+        assert reopened.get_entry("a") == ("current", False)
+    finally:
+        reopened.close()
+
+def test_importing_api_utils_does_not_create_cache_file(tmp_path):
+    # Chạy trong thư mục tạm: import không được tạo api_cache.db, lần dùng đầu tiên mới tạo
+    code = (f"import os, sys; sys.path.insert(0, {ROOT!r}); import api_utils; "
+            "assert not os.path.exists('api_cache.db'); "
+            "api_utils.api_cache.set('k', 1); assert os.path.exists('api_cache.db')")
+    subprocess.run([sys.executable, "-c", code], cwd=tmp_path, check=True)
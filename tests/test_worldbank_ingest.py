@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import pytest
+from worldbank_ingest import UPSERT_COUNTRY_SQL, _is_not_newer, load_files, parse_api_json, parse_csv, refresh_files
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+API_GDP = os.path.join(FIXTURES, "api_gdp.json")
+CSV_POP = os.path.join(FIXTURES, "API_SP.POP.TOTL_DS2_en_csv_v2.csv")
+CSV_META = os.path.join(FIXTURES, "Metadata_Country_API_SP.POP.TOTL_DS2_en_csv_v2.csv")
+
+def _latest(db, country_code, indicator_code):
+    rows = db.execute_query("SELECT year, value FROM country_latest WHERE country_code = ? AND indicator_code = ?;",
+                            (country_code, indicator_code))
+    return (rows[0]['year'], rows[0]['value']) if rows else None
+
+def test_parse_api_json():
+    dump = parse_api_json(API_GDP)
+    assert dump['last_updated'] == "2024-06-28"
+    # Giá trị NULL và dữ liệu theo quý bị bỏ qua
+    assert sorted(dump['rows']) == [
+        ("USA", "NY.GDP.MKTP.CD", 2021, 23594031000000.0),
+        ("USA", "NY.GDP.MKTP.CD", 2022, 25744108000000.0),
+        ("VNM", "NY.GDP.MKTP.CD", 2021, 366474752771.66),
+        ("VNM", "NY.GDP.MKTP.CD", 2022, 408802378905.226),
+    ]
+    assert dump['countries']["VNM"] == {'iso2_code': "VN", 'name': "Viet Nam"}
+
+def test_parse_csv_wide_and_metadata():
+    dump = parse_csv(CSV_POP)
+    assert dump['last_updated'] == "2024-06-28"
+    assert len(dump['rows']) == 5
+    assert ("USA", "SP.POP.TOTL", 2022, 0.0) not in dump['rows']
+    meta = parse_csv(CSV_META)
+    assert meta['countries']["VNM"]['income_level'] == "Lower middle income"
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_load_files(db, bulk):
+    stats = load_files([FIXTURES], db=db, workers=1, bulk=bulk)
+    assert stats['rows_read'] == 9
+    assert db.execute_query("SELECT COUNT(*) AS n FROM country_data;")[0]['n'] == 9
+    assert _latest(db, "VNM", "NY.GDP.MKTP.CD") == (2022, 408802378905.226)
+    assert _latest(db, "USA", "SP.POP.TOTL") == (2021, 332031554.0)
+    assert db.get_country_by_code("VNM")['region'] == "East Asia & Pacific"
+    assert db.get_database_stats()['total_data_records'] == 9
+    assert [point['year'] for point in db.get_country_series("VNM")["SP.POP.TOTL"]['data']] == [2022, 2021, 2020]
+
+def test_reload_updated_dump(db, tmp_path):
+    load_files([API_GDP], db=db, workers=1, bulk=False)
+    with open(API_GDP, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    payload[1][0]['value'] = 410000000000.0  # VNM 2022
+    updated = tmp_path / "api_gdp.json"
+    updated.write_text(json.dumps(payload), encoding="utf-8")
+
+    # Nạp lại file đã sửa: upsert dòng đã có phải cập nhật được country_latest (không lỗi UNIQUE)
+    stats = load_files([str(updated)], db=db, workers=1, bulk=False)
+    assert stats['rows_changed'] == 1
+    assert _latest(db, "VNM", "NY.GDP.MKTP.CD") == (2022, 410000000000.0)
+    assert db.execute_query("SELECT COUNT(*) AS n FROM country_data;")[0]['n'] == 4
+
+    # Nạp lại y nguyên: không dòng nào thay đổi
+    assert load_files([str(updated)], db=db, workers=1, bulk=False)['rows_changed'] == 0
+
+def _store_vnm_gdp(db, value, last_updated):
+    with db.write_transaction() as conn:
+        conn.execute("INSERT INTO countries (iso_code, name) VALUES ('VNM', 'Viet Nam');")
+        conn.execute("INSERT INTO indicators (code, name) VALUES ('NY.GDP.MKTP.CD', 'GDP');")
+        conn.execute("INSERT INTO country_data VALUES ('VNM', 'NY.GDP.MKTP.CD', 2022, ?, ?);", (value, last_updated))
+
+def test_refresh_same_day_date_stamp_is_not_skipped(db):
+    # Mốc file "2024-06-28" (chỉ ngày) so với mốc đã lưu cùng ngày có giờ: phải so nội dung, không bỏ qua
+    _store_vnm_gdp(db, 1.0, "2024-06-28 10:00:00")
+    report = refresh_files([API_GDP], db=db, workers=1)
+    assert report['series_skipped_by_timestamp'] == 0
+    assert db.get_latest_country_data("VNM", "NY.GDP.MKTP.CD")['value'] == 408802378905.226
+
+def test_refresh_skips_older_dump(db):
+    _store_vnm_gdp(db, 1.0, "2024-07-01 00:00:00")
+    report = refresh_files([API_GDP], db=db, workers=1)
+    assert report['series_skipped_by_timestamp'] == 1
+    assert db.get_latest_country_data("VNM", "NY.GDP.MKTP.CD")['value'] == 1.0
+
+def test_stamp_comparison():
+    assert _is_not_newer("2024-06-28", "2024-06-28")
+    assert not _is_not_newer("2024-06-28", "2024-06-28 10:00:00")
+    assert _is_not_newer("2024-06-27", "2024-06-28 10:00:00")
+    assert _is_not_newer("2024-06-28 09:00:00", "2024-06-28T10:00:00")
+    assert not _is_not_newer("not a date", "2024-06-28")
+
+def test_country_name_from_code_is_replaced_by_real_name(db):
+    with db.write_transaction() as conn:
+        conn.execute(UPSERT_COUNTRY_SQL, ("VNM", None, "VNM", None, None))
+        conn.execute(UPSERT_COUNTRY_SQL, ("VNM", "VN", "Viet Nam", None, None))
+        # Dump sau không có tên (tên tạm = mã): giữ tên thật
+        conn.execute(UPSERT_COUNTRY_SQL, ("VNM", None, "VNM", "EAS", None))
+    country = db.get_country_by_code("VNM")
+    assert (country['name'], country['iso2_code'], country['region']) == ("Viet Nam", "VN", "EAS")
@@ -0,0 +1,450 @@
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from database_manager import db_manager, DatabaseManager
+from db_schema import (
+    create_country_latest_triggers, create_country_series_triggers, drop_country_latest_triggers,
+    drop_country_series_triggers, rebuild_country_latest, rebuild_country_series, refresh_country_series,
+    refresh_db_metadata, refresh_db_metadata_if_stale,
+)
+
+# Nạp theo lô executemany
+DEFAULT_BATCH_SIZE = 50000
+# Tổng dung lượng file từ ngưỡng này trở lên: bỏ trigger country_latest, tính lại một lần ở cuối
+DEFAULT_BULK_THRESHOLD_BYTES = 50 * 1024 * 1024
+
+UPSERT_COUNTRY_DATA_SQL = """
+INSERT INTO country_data (country_code, indicator_code, year, value, last_updated)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (country_code, indicator_code, year) DO UPDATE
+SET value = excluded.value, last_updated = excluded.last_updated
+WHERE country_data.value IS NOT excluded.value;
+"""
+
+UPSERT_INDICATOR_SQL = """
+INSERT INTO indicators (code, name, unit, description, category)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (code) DO UPDATE
+SET name = COALESCE(excluded.name, indicators.name),
+    unit = COALESCE(excluded.unit, indicators.unit),
+    description = COALESCE(excluded.description, indicators.description),
+    category = COALESCE(excluded.category, indicators.category);
+"""
+
+UPSERT_COUNTRY_SQL = """
+INSERT INTO countries (iso_code, iso2_code, name, region, income_level)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (iso_code) DO UPDATE
+SET iso2_code = COALESCE(excluded.iso2_code, countries.iso2_code),
+    -- File không có tên thì tên tạm là mã quốc gia: chỉ giữ tên cũ khi file mới cũng không có tên thật
+    name = CASE WHEN excluded.name IS NOT NULL AND excluded.name != excluded.iso_code THEN excluded.name
+                ELSE COALESCE(countries.name, excluded.name) END,
+    region = COALESCE(excluded.region, countries.region),
+    income_level = COALESCE(excluded.income_level, countries.income_level);
+"""
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+def _parse_stamp(value: Any) -> Optional[Tuple[datetime, bool]]:
+    """Đọc mốc thời gian ("2024-06-28" của World Bank hoặc "%Y-%m-%d %H:%M:%S" lúc nạp): (thời điểm UTC, có giờ không)"""
+    text = str(value or "").strip()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed, len(text) > 10
+
+def _is_not_newer(source_stamp: Any, stored_stamp: Any) -> bool:
+    """Mốc của file không mới hơn mốc đã lưu (False nếu không đọc được một trong hai)
+
+    Khi chỉ một bên có giờ, hai mốc được so theo ngày: cùng ngày vẫn coi là có thể mới hơn.
+    """
+    source, stored = _parse_stamp(source_stamp), _parse_stamp(stored_stamp)
+    if source is None or stored is None:
+        return False
+    if source[1] == stored[1]:
+        return source[0] <= stored[0]
+    return source[0].date() < stored[0].date()
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _to_year(value: Any) -> Optional[int]:
+    """Chỉ nhận dữ liệu theo năm ("2020"), bỏ qua quý / tháng ("2020Q1", "2020M01")"""
+    text = str(value).strip()
+    return int(text) if text.isdigit() else None
+
+def _empty_dump(path: str) -> Dict[str, Any]:
+    return {
+        'source': path,
+        'rows': [],          # (country_code, indicator_code, year, value)
+        'countries': {},     # iso_code -> {iso2_code, name, region, income_level}
+        'indicators': {},    # code -> {name, unit, description, category}
+        'last_updated': None,
+    }
+
+# ===== JSON (World Bank API) =====
+def _iter_api_records(payload: Any) -> Iterable[Tuple[Optional[Dict[str, Any]], Dict[str, Any]]]:
+    """Duyệt các bản ghi trong file JSON dạng [meta, records] hoặc danh sách nhiều trang như vậy"""
+    if isinstance(payload, list) and len(payload) == 2 and isinstance(payload[0], dict) and isinstance(payload[1], list):
+        for record in payload[1]:
+            yield payload[0], record
+    elif isinstance(payload, list):
+        for item in payload:
+            if isinstance(item, list):
+                yield from _iter_api_records(item)
+            elif isinstance(item, dict) and 'indicator' in item:
+                yield None, item
+
+def parse_api_json(path: str) -> Dict[str, Any]:
+    """Đọc file JSON theo định dạng World Bank API (/v2/country/.../indicator/...?format=json)"""
+    dump = _empty_dump(path)
+    with open(path, "r", encoding="utf-8-sig") as f:
+        payload = json.load(f)
+
+    for meta, record in _iter_api_records(payload):
+        if meta and meta.get('lastupdated') and not dump['last_updated']:
+            dump['last_updated'] = meta['lastupdated']
+
+        indicator = record.get('indicator') or {}
+        country = record.get('country') or {}
+        indicator_code = indicator.get('id')
+        # countryiso3code rỗng với một số nhóm tổng hợp, dùng mã trong country.id
+        country_code = record.get('countryiso3code') or country.get('id')
+        year = _to_year(record.get('date'))
+        if not indicator_code or not country_code or year is None:
+            continue
+
+        dump['indicators'].setdefault(indicator_code, {
+            'name': indicator.get('value'),
+            'unit': record.get('unit') or None,
+        })
+        dump['countries'].setdefault(country_code, {
+            'iso2_code': country.get('id') if country.get('id') != country_code else None,
+            'name': country.get('value'),
+        })
+        value = _to_float(record.get('value'))
+        if value is not None:
+            dump['rows'].append((country_code, indicator_code, year, value))
+    return dump
+
+# ===== CSV =====
+def parse_csv(path: str) -> Dict[str, Any]:
+    """Đọc file CSV: bảng rộng World Bank (API_*.csv), file Metadata_*, hoặc dạng dài country_code,indicator_code,year,value"""
+    dump = _empty_dump(path)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        for header in reader:
+            if not header:
+                continue
+            first = header[0].strip()
+            # Các dòng mô tả ở đầu file bảng rộng: "Last Updated Date","2024-06-28"
+            if first == "Last Updated Date" and len(header) > 1:
+                dump['last_updated'] = header[1].strip() or None
+                continue
+            if first in ("Country Name", "Country Code", "INDICATOR_CODE") or "country_code" in [h.strip().lower() for h in header]:
+                break
+        else:
+            return dump
+
+        columns = {name.strip(): i for i, name in enumerate(header)}
+        lower_columns = {name.lower(): i for name, i in columns.items()}
+
+        def cell(record, column_index):
+            if column_index is None or column_index >= len(record):
+                return None
+            return record[column_index].strip() or None
+
+        if "Country Name" in columns:
+            # Bảng rộng: mỗi dòng là một chuỗi (quốc gia, chỉ số), mỗi cột năm là một giá trị
+            year_columns = [(i, int(name)) for name, i in columns.items() if name.isdigit()]
+            for record in reader:
+                country_code = cell(record, columns.get("Country Code"))
+                indicator_code = cell(record, columns.get("Indicator Code"))
+                if not country_code or not indicator_code:
+                    continue
+                dump['countries'].setdefault(country_code, {'name': cell(record, columns.get("Country Name"))})
+                dump['indicators'].setdefault(indicator_code, {'name': cell(record, columns.get("Indicator Name"))})
+                for i, year in year_columns:
+                    value = _to_float(cell(record, i))
+                    if value is not None:
+                        dump['rows'].append((country_code, indicator_code, year, value))
+        elif "Country Code" in columns:
+            # Metadata_Country_*.csv: vùng và nhóm thu nhập
+            for record in reader:
+                country_code = cell(record, columns["Country Code"])
+                if country_code:
+                    dump['countries'][country_code] = {
+                        'name': cell(record, columns.get("TableName")),
+                        'region': cell(record, columns.get("Region")),
+                        'income_level': cell(record, columns.get("IncomeGroup")),
+                    }
+        elif "INDICATOR_CODE" in columns:
+            # Metadata_Indicator_*.csv: tên và mô tả chỉ số
+            for record in reader:
+                indicator_code = cell(record, columns["INDICATOR_CODE"])
+                if indicator_code:
+                    dump['indicators'][indicator_code] = {
+                        'name': cell(record, columns.get("INDICATOR_NAME")),
+                        'description': cell(record, columns.get("SOURCE_NOTE")),
+                    }
+        else:
+            # Dạng dài: country_code, indicator_code, year, value [, country_name, indicator_name]
+            for record in reader:
+                country_code = cell(record, lower_columns.get("country_code"))
+                indicator_code = cell(record, lower_columns.get("indicator_code"))
+                year = _to_year(cell(record, lower_columns.get("year")) or "")
+                if not country_code or not indicator_code or year is None:
+                    continue
+                if "country_name" in lower_columns:
+                    dump['countries'].setdefault(country_code, {'name': cell(record, lower_columns["country_name"])})
+                if "indicator_name" in lower_columns:
+                    dump['indicators'].setdefault(indicator_code, {'name': cell(record, lower_columns["indicator_name"])})
+                value = _to_float(cell(record, lower_columns.get("value")))
+                if value is not None:
+                    dump['rows'].append((country_code, indicator_code, year, value))
+    return dump
+
+def parse_file(path: str) -> Dict[str, Any]:
+    """Đọc một file dump theo phần mở rộng (.json / .csv)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        return parse_api_json(path)
+    if extension == ".csv":
+        return parse_csv(path)
+    raise ValueError(f"Khong ho tro dinh dang file: {path}")
+
+def collect_files(paths: Iterable[str]) -> List[str]:
+    """Mở rộng thư mục thành danh sách file .json / .csv"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in (".json", ".csv"):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+def iter_parsed(files: List[str], workers: Optional[int] = None) -> Iterable[Dict[str, Any]]:
+    """Đọc các file song song bằng process pool (tuần tự nếu chỉ có một file hoặc workers=1)"""
+    if workers == 1 or len(files) <= 1:
+        for path in files:
+            yield parse_file(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(parse_file, files)
+
+# ===== GHI DATABASE =====
+def _write_metadata(conn, dump: Dict[str, Any]):
+    """Ghi thông tin chỉ số / quốc gia của một file đã đọc"""
+    if dump['indicators']:
+        conn.executemany(UPSERT_INDICATOR_SQL, [
+            (code, meta.get('name') or code, meta.get('unit'), meta.get('description'), meta.get('category'))
+            for code, meta in dump['indicators'].items()
+        ])
+    if dump['countries']:
+        conn.executemany(UPSERT_COUNTRY_SQL, [
+            (code, meta.get('iso2_code'), meta.get('name') or code, meta.get('region'), meta.get('income_level'))
+            for code, meta in dump['countries'].items()
+        ])
+
+def write_dump(conn, dump: Dict[str, Any], last_updated: Optional[str] = None,
+               batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Ghi một file đã đọc vào database (trong transaction của người gọi), trả về số dòng country_data thay đổi"""
+    _write_metadata(conn, dump)
+
+    stamp = dump['last_updated'] or last_updated or _utc_now()
+    rows = dump['rows']
+    changed = 0
+    for start in range(0, len(rows), batch_size):
+        cursor = conn.executemany(UPSERT_COUNTRY_DATA_SQL, [row + (stamp,) for row in rows[start:start + batch_size]])
+        changed += max(cursor.rowcount, 0)
+    return changed
+
+def load_files(paths: Iterable[str], db: Optional[DatabaseManager] = None, workers: Optional[int] = None,
+               batch_size: int = DEFAULT_BATCH_SIZE, bulk: Optional[bool] = None) -> Dict[str, Any]:
+    """Nạp các file dump World Bank vào countries / indicators / country_data trong một transaction
+
+    bulk=None tự chọn theo dung lượng file: khi nạp lớn, trigger country_latest được bỏ tạm
+    và bảng được tính lại một lần ở cuối thay vì cập nhật từng dòng.
+    """
+    db = db or db_manager
+    files = collect_files(paths)
+    if bulk is None:
+        bulk = sum(os.path.getsize(path) for path in files) >= DEFAULT_BULK_THRESHOLD_BYTES
+
+    started = time.perf_counter()
+    load_stamp = _utc_now()
+    stats = {'files': len(files), 'rows_read': 0, 'rows_changed': 0, 'countries': 0, 'indicators': 0, 'bulk': bulk}
+    touched_series = set()
+    with db.write_transaction() as conn:
+        if bulk:
+            drop_country_latest_triggers(conn)
+            drop_country_series_triggers(conn)
+        for dump in iter_parsed(files, workers):
+            stats['rows_read'] += len(dump['rows'])
+            stats['countries'] += len(dump['countries'])
+            stats['indicators'] += len(dump['indicators'])
+            stats['rows_changed'] += write_dump(conn, dump, load_stamp, batch_size)
+            if not bulk:
+                touched_series.update((row[0], row[1]) for row in dump['rows'])
+            print(f"Da doc {dump['source']}: {len(dump['rows'])} dong")
+        if bulk:
+            rebuild_country_latest(conn)
+            create_country_latest_triggers(conn)
+            rebuild_country_series(conn)
+            create_country_series_triggers(conn)
+            refresh_db_metadata(conn)
+        else:
+            refresh_country_series(conn, touched_series)
+            refresh_db_metadata_if_stale(conn)
+
+    stats['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return stats
+
+# ===== CẬP NHẬT TĂNG DẦN =====
+def _group_series(rows: List[Tuple[str, str, int, float]]) -> Dict[Tuple[str, str], Dict[int, float]]:
+    """Gom các dòng thành chuỗi (country_code, indicator_code) -> {year: value}"""
+    series = {}
+    for country_code, indicator_code, year, value in rows:
+        series.setdefault((country_code, indicator_code), {})[year] = value
+    return series
+
+def _load_existing_series(conn, indicator_code: str) -> Dict[str, Dict[str, Any]]:
+    """Đọc các chuỗi hiện có của một chỉ số: country_code -> {points, last_updated}"""
+    existing = {}
+    cursor = conn.execute(
+        "SELECT country_code, year, value, last_updated FROM country_data WHERE indicator_code = ?;",
+        (indicator_code,)
+    )
+    for country_code, year, value, last_updated in cursor:
+        entry = existing.setdefault(country_code, {'points': {}, 'last_updated': None})
+        if value is not None:
+            entry['points'][year] = value
+        parsed = _parse_stamp(last_updated)
+        if parsed and (entry['last_updated'] is None or parsed[0] > _parse_stamp(entry['last_updated'])[0]):
+            entry['last_updated'] = last_updated
+    return existing
+
+def refresh_dump(conn, dump: Dict[str, Any], report: Dict[str, Any], last_updated: Optional[str] = None,
+                 prune_missing_years: bool = False):
+    """So sánh từng chuỗi trong file với database và chỉ ghi lại các chuỗi đã thay đổi
+
+    Chuỗi được bỏ qua ngay nếu mốc thời gian của file không mới hơn last_updated đã lưu,
+    ngược lại so sánh nội dung {year: value} của hai bên.
+    """
+    _write_metadata(conn, dump)
+    source_stamp = dump['last_updated']
+    stamp = source_stamp or last_updated or _utc_now()
+
+    series_by_indicator = {}
+    for (country_code, indicator_code), points in _group_series(dump['rows']).items():
+        series_by_indicator.setdefault(indicator_code, {})[country_code] = points
+
+    for indicator_code, new_series in series_by_indicator.items():
+        existing = _load_existing_series(conn, indicator_code)
+        for country_code, points in new_series.items():
+            report['series_checked'] += 1
+            old = existing.get(country_code)
+            if old and _is_not_newer(source_stamp, old['last_updated']):
+                report['series_skipped_by_timestamp'] += 1
+                continue
+
+            old_points = old['points'] if old else {}
+            added = [year for year in points if year not in old_points]
+            updated = [year for year in points if year in old_points and old_points[year] != points[year]]
+            removed = [year for year in old_points if year not in points] if prune_missing_years else []
+            if not added and not updated and not removed:
+                report['series_unchanged'] += 1
+                continue
+
+            changed_years = added + updated
+            conn.executemany(UPSERT_COUNTRY_DATA_SQL, [
+                (country_code, indicator_code, year, points[year], stamp) for year in changed_years
+            ])
+            if removed:
+                conn.executemany(
+                    "DELETE FROM country_data WHERE country_code = ? AND indicator_code = ? AND year = ?;",
+                    [(country_code, indicator_code, year) for year in removed]
+                )
+            report['series_changed'] += 1
+            report['rows_written'] += len(changed_years)
+            report['rows_deleted'] += len(removed)
+            report['changes'].append({
+                'country_code': country_code,
+                'indicator_code': indicator_code,
+                'added': sorted(added),
+                'updated': sorted(updated),
+                'removed': sorted(removed),
+            })
+
+def refresh_files(paths: Iterable[str], db: Optional[DatabaseManager] = None, workers: Optional[int] = None,
+                  prune_missing_years: bool = False) -> Dict[str, Any]:
+    """Cập nhật tăng dần: chỉ ghi lại các chuỗi (chỉ số, quốc gia) thay đổi, trong một transaction
+
+    prune_missing_years=True xóa các năm có trong database nhưng không còn trong file
+    (chỉ dùng khi mỗi file chứa trọn vẹn các chuỗi của nó).
+    """
+    db = db or db_manager
+    files = collect_files(paths)
+    started = time.perf_counter()
+    load_stamp = _utc_now()
+    report = {
+        'files': len(files),
+        'series_checked': 0,
+        'series_skipped_by_timestamp': 0,
+        'series_unchanged': 0,
+        'series_changed': 0,
+        'rows_written': 0,
+        'rows_deleted': 0,
+        'changes': [],
+    }
+    with db.write_transaction() as conn:
+        for dump in iter_parsed(files, workers):
+            refresh_dump(conn, dump, report, load_stamp, prune_missing_years)
+        refresh_country_series(conn, [(change['country_code'], change['indicator_code']) for change in report['changes']])
+        refresh_db_metadata_if_stale(conn)
+
+    report['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return report
+
+if __name__ == "__main__":
+    # python worldbank_ingest.py dumps/ API_NY.GDP.MKTP.CD_DS2_en_csv_v2.csv --workers 4
+    # python worldbank_ingest.py dumps/ --incremental
+    parser = argparse.ArgumentParser(description="Nap file dump World Bank (JSON API / CSV) vao worldbank.db")
+    parser.add_argument("paths", nargs="+", help="File hoac thu muc chua file .json / .csv")
+    parser.add_argument("--workers", type=int, default=None, help="So process doc file song song")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--bulk", action="store_true", default=None,
+                        help="Bo trigger country_latest khi nap va tinh lai mot lan o cuoi")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Chi ghi lai cac chuoi (chi so, quoc gia) da thay doi")
+    parser.add_argument("--prune", action="store_true",
+                        help="Khi --incremental: xoa cac nam khong con trong file")
+    args = parser.parse_args()
+    if args.incremental:
+        result = refresh_files(args.paths, workers=args.workers, prune_missing_years=args.prune)
+        changes = result.pop('changes')
+        print(f"Ket qua: {result}")
+        for change in changes[:50]:
+            print(f"  {change['country_code']} / {change['indicator_code']}: "
+                  f"+{len(change['added'])} ~{len(change['updated'])} -{len(change['removed'])}")
+        if len(changes) > 50:
+            print(f"  ... va {len(changes) - 50} chuoi khac")
+    else:
+        result = load_files(args.paths, workers=args.workers, batch_size=args.batch_size, bulk=args.bulk)
+        print(f"Ket qua: {result}")